@@ -1,21 +1,189 @@
+from __future__ import annotations
+
+import argparse
+import cProfile
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+import tracemalloc
 import warnings
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 warnings.filterwarnings("ignore",
                         category=UserWarning,
                         module="openpyxl.styles.stylesheet")
 
-import pandas as pd
-from openpyxl.utils import get_column_letter
 from tkinter import (
     Tk, filedialog, messagebox,
     Toplevel, Frame, Label, Entry, Listbox, Scrollbar, Button,
-    StringVar, END, SINGLE, BOTH, RIGHT, LEFT, Y, X
+    StringVar, BooleanVar, END, SINGLE, BOTH, RIGHT, LEFT, Y, X, ttk
 )
 
-from decimal import Decimal, ROUND_HALF_UP, getcontext
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation, getcontext
 getcontext().prec = 28  # 足够高的计算精度
 
 PIVOT_BUCKETS = ['Current','1-30','31-60','61-90','91-365','366-730','731+']
 DEC5 = Decimal("0.00001")  # 5位小数
+# Raw 表输出的总表列; None 表示全部列都输出。
+# 设为列表时, 读总表只保留 公司列 + Customer ID + 各桶 + 这些列
+RAW_SHEET_COLUMNS: list[str] | None = None
+# 附加的多层小计表: 表名 -> 由粗到细的层级, 每层是一列或几列(列表);
+# 'Company' 指总表的公司列, 缺少的列跳过; 最外层是公司的表在只有一家公司时不输出。
+# 这些表与 Pivot 都由同一次最细粒度分组逐层合并得到; 设为 {} 则只输出 Pivot
+ROLLUP_SHEETS: dict[str, list[str | list[str]]] = {
+    'By Customer': ['Salesman', ['Customer ID', 'Customer Name']],
+    'By Company': ['Company', 'Salesman'],
+}
+
+# ---------- 重依赖延迟导入 ----------
+# pandas/numpy/openpyxl 导入要 1~2 秒。作为脚本启动界面时放到后台线程导入,
+# 第一个文件对话框不必等它; 被其它脚本/子进程 import 时照常立即导入。
+np = pd = TextParser = Workbook = load_workbook = WriteOnlyCell = get_column_letter = None
+
+def load_heavy_modules():
+    """导入 pandas/numpy/openpyxl 到模块全局(可重复调用)"""
+    global np, pd, TextParser, Workbook, load_workbook, WriteOnlyCell, get_column_letter
+    import numpy as np
+    import pandas as pd
+    from openpyxl import Workbook, load_workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+    from pandas.io.parsers import TextParser
+
+if __name__ != "__main__":
+    load_heavy_modules()
+
+# ---------- 阶段性能记录(可选) ----------
+# AR_PROFILE=1 或 --profile 时, 记录每个阶段的墙钟/CPU 时间、峰值内存和行数,
+# 生成文件旁写出 <输出>.profile.json; 再加 AR_PROFILE_CPROFILE=1 / --profile-cprofile
+# 时对每个阶段跑 cProfile, 只保留最慢阶段的 <输出>.<阶段>.prof。
+def _peak_rss_mb() -> float | None:
+    """进程峰值常驻内存(MB); 取不到时返回 None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PMC(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        pmc = PMC(); pmc.cb = ctypes.sizeof(PMC)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(pmc), pmc.cb):
+            return pmc.PeakWorkingSetSize / (1024 * 1024)
+    except (ImportError, AttributeError, OSError):
+        pass
+    return None
+
+class StageProfiler:
+    """
+    按阶段记录 墙钟/CPU(当前线程) 时间、tracemalloc 峰值(及相对阶段开始的增量)、
+    进程峰值 RSS 与行数。tracemalloc 是整个进程的(后台并行读取时两个阶段会互相计入)。
+    阶段可以嵌套(read_master 里有 parse_rows 等): 外层的峰值包含内层的峰值;
+    cProfile 只在每个线程最外层的阶段开关(内层再 enable 会顶掉外层的 profiler)。
+    """
+
+    def __init__(self, enabled: bool = False, cprofile: bool = False):
+        self.enabled = enabled
+        self.cprofile = cprofile
+        self.reset()
+
+    def reset(self):
+        self.stages = []
+        self._hottest = None      # (墙钟, 阶段名, pstats 数据)
+        self._lock = threading.Lock()
+        self._local = threading.local()   # 各线程正在进行的阶段(由外到内)
+        self._t0 = time.perf_counter()
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, rows: int | None = None):
+        """with profiler.stage("merge") as rec: ...; rec["rows"] = n"""
+        rec = {"stage": name, "rows": rows}
+        if not self.enabled:
+            yield rec
+            return
+        active = self._local.__dict__.setdefault("active", [])
+        prof = None
+        if self.cprofile and not active:
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:    # 该线程已有别的 profiler
+                prof = None
+        # reset_peak 会清掉外层到目前为止的峰值: 先记到外层的阶段上
+        mem0, peak = tracemalloc.get_traced_memory()
+        if active:
+            active[-1]["peak"] = max(active[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        frame = {"peak": 0}
+        active.append(frame)
+        wall0, cpu0 = time.perf_counter(), time.thread_time()
+        try:
+            yield rec
+        finally:
+            wall = time.perf_counter() - wall0
+            if prof is not None:
+                prof.disable()
+            active.pop()
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            rec.update(
+                thread=threading.current_thread().name,
+                start_s=round(wall0 - self._t0, 4),
+                wall_s=round(wall, 4),
+                cpu_s=round(time.thread_time() - cpu0, 4),
+                tracemalloc_peak_mb=round(peak / (1024 * 1024), 2),
+                tracemalloc_growth_mb=round((peak - mem0) / (1024 * 1024), 2),
+                rss_peak_mb=_peak_rss_mb(),
+            )
+            with self._lock:
+                self.stages.append(rec)
+                if prof is not None and (self._hottest is None or wall > self._hottest[0]):
+                    self._hottest = (wall, name, prof)
+
+    def write(self, output_file: str, **extra) -> str | None:
+        """把报告写到 <output_file>.profile.json, 返回路径; 未启用时不写"""
+        if not self.enabled:
+            return None
+        report = {
+            "output": os.path.abspath(output_file),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "total_wall_s": round(time.perf_counter() - self._t0, 4),
+            "rss_peak_mb": _peak_rss_mb(),
+            **extra,
+            "stages": sorted(self.stages, key=lambda r: r["start_s"]),
+        }
+        if self._hottest is not None:
+            _, name, prof = self._hottest
+            prof_path = f"{output_file}.{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}.prof"
+            prof.dump_stats(prof_path)
+            report["cprofile"] = {"stage": name, "path": os.path.abspath(prof_path)}
+        path = output_file + ".profile.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return path
+
+PROFILER = StageProfiler(enabled=os.environ.get("AR_PROFILE") == "1",
+                         cprofile=os.environ.get("AR_PROFILE_CPROFILE") == "1")
+
+def profile_stage(name: str, rows: int | None = None):
+    return PROFILER.stage(name, rows)
 
 # ---------- Decimal 工具 ----------
 def to_dec5(x):
@@ -43,6 +211,410 @@ def sum_dec(series: pd.Series) -> Decimal:
             total += to_dec5(v)
     return total.quantize(DEC5, rounding=ROUND_HALF_UP)
 
+# ---------- 定点数工具(金额 × 10^5 存为整数) ----------
+# 与上面的 Decimal 路径逐位一致: 同样按 str(x) 的十进制值做 ROUND_HALF_UP,
+# 只是把大部分单元格的换算/求和变成 NumPy 向量运算。
+SCALE5 = 10 ** 5
+_DEC_LIMIT = 10 ** getcontext().prec    # 超过 Decimal 精度时 quantize 会报错, 这里保持一致
+_F64_EXACT = 2 ** 53                    # float64 能精确表示的整数上限
+
+def _is_plain_number(v) -> bool:
+    if isinstance(v, (bool, np.bool_)):
+        return False
+    if isinstance(v, (float, np.floating)):
+        return True
+    return isinstance(v, (int, np.integer)) and abs(int(v)) < _F64_EXACT
+
+def _fixed5_from_float(x: np.ndarray):
+    """
+    float64 向量 -> (定点整数, 是否需要逐个走 Decimal)。
+    |x|×10^5 离 .5 足够远时舍入方向不受二进制误差影响, 直接向量计算;
+    恰好在 .5 附近(如 0.000005)或数值过大的元素交给 Decimal 兜底。
+    """
+    nan = np.isnan(x)
+    y = np.abs(np.where(nan, 0.0, x)) * SCALE5
+    f = np.floor(y)
+    frac = y - f
+    ambiguous = ~nan & ~(np.abs(frac - 0.5) > y * 2.0 ** -45 + 2.0 ** -60)
+    k = f + (frac > 0.5)
+    k = np.where(x < 0, -k, k)
+    k[nan | ambiguous] = 0
+    return k.astype(np.int64), ambiguous
+
+def to_fixed5(values):
+    """
+    把一列金额转为 ×10^5 的定点整数, 舍入语义同 to_dec5; NaN/None -> 0。
+    返回 (整数数组, 负零标记); 负零标记用于还原 Decimal('-0.00000') -> -0.0。
+    任一值超出 int64 时整列改用 Python int(object)。
+    """
+    arr = np.asarray(values)
+    n = len(arr)
+    if arr.dtype.kind == "f":
+        x = arr.astype(np.float64)
+        fallback = np.zeros(n, dtype=bool)
+    elif arr.dtype.kind in "iu" and (n == 0 or np.abs(arr).max() < _F64_EXACT):
+        x = arr.astype(np.float64)
+        fallback = np.zeros(n, dtype=bool)
+    else:
+        num = np.fromiter((_is_plain_number(v) for v in arr), dtype=bool, count=n)
+        x = np.full(n, np.nan)
+        if num.any():
+            x[num] = np.array([float(v) for v in arr[num]])
+        fallback = ~num
+
+    k, ambiguous = _fixed5_from_float(x)
+    neg_zero = np.signbit(x) & ~np.isnan(x) & (k == 0)
+    fallback |= ambiguous
+    if not fallback.any():
+        return k, neg_zero
+
+    # 兜底: 逐个走 Decimal, 非法字符串等与 to_dec5 一样抛错
+    exact = {}
+    for i in np.flatnonzero(fallback):
+        q = to_dec5(arr[i])
+        exact[i] = int(q.scaleb(5))
+        neg_zero[i] = q.is_signed() and q.is_zero()
+    if all(abs(v) < _F64_EXACT for v in exact.values()):
+        for i, v in exact.items():
+            k[i] = v
+    else:
+        k = k.astype(object)
+        for i, v in exact.items():
+            k[i] = v
+    return k, neg_zero
+
+def fixed5_to_float(k, neg_zero=None) -> np.ndarray:
+    """定点整数 -> float, 与 float(Decimal) 一样取最近的 float64"""
+    k = np.asarray(k)
+    if k.dtype != object and (k.size == 0 or np.abs(k).max() < _F64_EXACT):
+        out = k.astype(np.float64) / SCALE5     # 整数可精确转 float, 一次除法即正确舍入
+    else:
+        out = np.array([int(v) / SCALE5 for v in k], dtype=np.float64)  # Python int 真除法正确舍入
+    if neg_zero is not None:
+        out[np.asarray(neg_zero, dtype=bool)] = -0.0
+    return out
+
+def _check_fixed5_range(df: pd.DataFrame):
+    for c in df.columns:
+        col = df[c]
+        if len(col) and max(abs(int(col.max())), abs(int(col.min()))) >= _DEC_LIMIT:
+            raise InvalidOperation(f"{c} 汇总金额超出精度范围")
+
+def group_fixed5(fixed: pd.DataFrame, by: list[str], cols: list[str]) -> pd.DataFrame:
+    """按 by 一次分组对定点整数列求和(缺失值单独成组), 结果以 by 为索引"""
+    n = len(fixed)
+    bound = max((int(np.abs(fixed[c]).max()) for c in cols if n), default=0)
+    if bound * max(n, 1) * (len(cols) + 1) >= 2 ** 63:
+        fixed = fixed.astype({c: object for c in cols})   # 可能溢出 int64 时用 Python int 精确求和
+    return fixed.groupby(by, dropna=False, observed=True)[cols].sum()
+
+def _add_total(out: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
+    out['Total'] = out[cols].sum(axis=1)
+    _check_fixed5_range(out[cols + ['Total']])
+    return out
+
+def pivot_fixed5(fixed: pd.DataFrame, by: str, cols: list[str]) -> pd.DataFrame:
+    """按 by 分组对定点整数列求和并加 Total 列, 结果仍为定点整数"""
+    return _add_total(group_fixed5(fixed, [by], cols), cols).reset_index()
+
+def _level_cols(level) -> list:
+    return list(level) if isinstance(level, (list, tuple)) else [level]
+
+def rollup_fixed5(fixed: pd.DataFrame, levels: list, cols: list[str]) -> pd.DataFrame:
+    """
+    层级小计表: levels 由粗到细, 每层一列或几列。按全部层级列分组的明细行,
+    每个上层分组之后跟一行小计(下一层首列写 'Subtotal'), 末尾一行 'Grand Total'。
+    各层小计只合并明细行, 不再扫描 fixed; 结果仍为定点整数, 含 Total 列。
+    """
+    levels = [_level_cols(lv) for lv in levels]
+    keys = [k for lv in levels for k in lv]
+    detail = group_fixed5(fixed, keys, cols).reset_index()
+    n, depth = len(detail), len(levels)
+    if n == 0:
+        return _add_total(detail, cols)
+
+    # 明细已按 keys 排好序, 同一前缀的行连续; 小计行排在所属分组最后一条明细之后,
+    # 更深一层的小计排在前面。排序位置 = 行号 × (层数+1) + 偏移
+    parts, order = [detail], [np.arange(n) * (depth + 1)]
+    new_group = np.zeros(n, dtype=bool)
+    new_group[0] = True
+    prefix = []
+    for d in range(1, depth):
+        for k in levels[d - 1]:
+            codes = pd.factorize(detail[k])[0]
+            new_group[1:] |= codes[1:] != codes[:-1]
+        prefix += levels[d - 1]
+        gid = np.cumsum(new_group) - 1
+        starts = np.flatnonzero(new_group)
+        ends = np.append(starts[1:], n) - 1
+        sub = detail[cols].groupby(gid).sum()
+        for k in prefix:
+            sub[k] = detail[k].to_numpy(dtype=object)[starts]
+        sub[levels[d][0]] = 'Subtotal'
+        parts.append(sub.reset_index(drop=True))
+        order.append(ends * (depth + 1) + (depth - d))
+
+    grand = detail[cols].sum().to_frame().T
+    grand[keys[0]] = 'Grand Total'
+    parts.append(grand)
+    order.append(np.array([n * (depth + 1)]))
+
+    out = pd.concat(parts, ignore_index=True)[keys + cols]
+    out = out.iloc[np.argsort(np.concatenate(order), kind="stable")].reset_index(drop=True)
+    return _add_total(out, cols)
+
+# ---------- 公司名搜索索引 ----------
+class CompanySearchIndex:
+    """
+    公司名搜索索引(不区分大小写):
+    - 前缀: casefold 后排序的数组 + bisect
+    - 子串: 3-gram 倒排索引(查询不足 3 个字符时对字符编码数组做向量扫描)
+    - 在上次查询后追加字符时, 若上次结果更少则直接在上次结果里细筛
+    search(q) 返回 (命中下标数组, 前缀命中数): 前缀命中在前, 再是包含命中, 各自按原顺序。
+    """
+    _SEP = "\x00"
+
+    def __init__(self, names: list[str]):
+        self.names = names
+        self.lower = [s.casefold() for s in names]
+        n = len(names)
+
+        # 前缀: 按 casefold 排序
+        order = sorted(range(n), key=self.lower.__getitem__)
+        self._sorted_lower = [self.lower[i] for i in order]
+        self._sorted_ids = np.array(order, dtype=np.int64)
+
+        # 所有名字拼成一个编码数组, 用 \0 分隔; _starts[i] 为第 i 个名字的起点
+        lengths = np.fromiter((len(s) for s in self.lower), dtype=np.int64, count=n)
+        self._starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1])) if n else np.zeros(0, np.int64)
+        joined = self._SEP.join(self.lower) + self._SEP
+        codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+        self._codes = codes.astype(np.uint16) if codes.size and codes.max() < 0x10000 else codes
+
+        # 3-gram 倒排: 每个 gram 一段按名字下标升序的 id
+        c = codes.astype(np.uint64)
+        if c.size >= 3:
+            keys = (c[:-2] << np.uint64(42)) | (c[1:-1] << np.uint64(21)) | c[2:]
+            valid = (codes[:-2] != 0) & (codes[1:-1] != 0) & (codes[2:] != 0)
+            pos = np.flatnonzero(valid)
+            keys = keys[pos]
+            ids = np.searchsorted(self._starts, pos, side="right") - 1
+            o = np.argsort(keys, kind="stable")
+            keys, ids = keys[o], ids[o]
+            keep = np.ones(len(keys), dtype=bool)
+            keep[1:] = (keys[1:] != keys[:-1]) | (ids[1:] != ids[:-1])
+            keys, ids = keys[keep], ids[keep]
+            self._gram_keys, first = np.unique(keys, return_index=True)
+            self._gram_offsets = np.append(first, len(keys))
+            self._gram_ids = ids.astype(np.int32)
+        else:
+            self._gram_keys = np.zeros(0, np.uint64)
+            self._gram_offsets = np.zeros(1, np.int64)
+            self._gram_ids = np.zeros(0, np.int32)
+
+        self._last = None  # (上次查询, 上次命中)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _prefix_ids(self, q: str) -> np.ndarray:
+        lo = bisect_left(self._sorted_lower, q)
+        hi = bisect_right(self._sorted_lower, q + "\U0010ffff")
+        return np.sort(self._sorted_ids[lo:hi])
+
+    def _posting(self, gram: str) -> np.ndarray:
+        a, b, c = (ord(ch) for ch in gram)
+        key = np.uint64((a << 42) | (b << 21) | c)
+        j = np.searchsorted(self._gram_keys, key)
+        if j == len(self._gram_keys) or self._gram_keys[j] != key:
+            return self._gram_ids[:0]
+        return self._gram_ids[self._gram_offsets[j]:self._gram_offsets[j + 1]]
+
+    def _scan_short(self, q: str) -> np.ndarray:
+        """1~2 个字符: 直接在编码数组上向量比较"""
+        qc = [ord(ch) for ch in q]
+        if max(qc) > np.iinfo(self._codes.dtype).max:
+            return np.zeros(0, np.int64)
+        m = self._codes == qc[0]
+        if len(qc) == 2:
+            m = m[:-1] & (self._codes[1:] == qc[1])
+        pos = np.flatnonzero(m)
+        return np.unique(np.searchsorted(self._starts, pos, side="right") - 1)
+
+    def _contains_candidates(self, q: str):
+        """返回 (候选下标, 是否已精确)"""
+        if len(q) < 3:
+            return self._scan_short(q), True
+        postings = sorted((self._posting(q[i:i + 3]) for i in range(len(q) - 2)), key=len)
+        cand = postings[0]
+        for p in postings[1:]:
+            if not len(cand):
+                break
+            cand = np.intersect1d(cand, p, assume_unique=True)
+        return cand.astype(np.int64), len(q) == 3
+
+    def _split(self, q: str, cand) -> tuple[list[int], list[int]]:
+        starts, contains = [], []
+        lower = self.lower
+        for i in cand:
+            s = lower[i]
+            if s.startswith(q):
+                starts.append(i)
+            elif q in s:
+                contains.append(i)
+        return starts, contains
+
+    def search(self, q: str):
+        q = q.casefold()
+        if not q:
+            self._last = None
+            return np.arange(len(self.names)), len(self.names)
+
+        last = self._last
+        if last is not None and q.startswith(last[0]) and len(last[1]) <= 20000:
+            # 追加字符: 新结果一定在上次结果里
+            starts, contains = self._split(q, np.sort(last[1]))
+            hits = np.array(starts + contains, dtype=np.int64)
+            n_prefix = len(starts)
+        else:
+            prefix = self._prefix_ids(q)
+            cand, exact = self._contains_candidates(q)
+            cand = np.setdiff1d(cand, prefix, assume_unique=True)
+            if not exact:
+                cand = np.array([i for i in cand if q in self.lower[i]], dtype=np.int64)
+            hits = np.concatenate((prefix, cand)).astype(np.int64)
+            n_prefix = len(prefix)
+
+        self._last = (q, hits)
+        return hits, n_prefix
+
+# ---------- 虚拟列表(只渲染可见行) ----------
+class VirtualListbox:
+    """
+    只把可见窗口(外加少量 overscan 行)的数据放进 Tk Listbox, 滚动按下标计算,
+    重绘成本与匹配数量无关。数据为 items + 下标数组 idxs(搜索结果)。
+    选中项按绝对下标记录, 支持 上下/翻页/Home/End、滚轮、单击、双击/回车确认。
+    """
+    OVERSCAN = 2
+
+    def __init__(self, master, items: list[str]):
+        self.items = items
+        self.idxs = np.zeros(0, dtype=np.int64)
+        self.top = 0          # 窗口第一行对应 idxs 的位置
+        self.sel = None       # 选中行对应 idxs 的位置
+        self._row_h = None    # 行高(像素), 首次渲染后测得
+        self._on_activate = None
+
+        self.sb = Scrollbar(master, command=self._yview)
+        self.sb.pack(side=RIGHT, fill=Y)
+        self.lb = Listbox(master, selectmode=SINGLE, activestyle="none", exportselection=False)
+        self.lb.pack(side=LEFT, fill=BOTH, expand=True)
+
+        lb = self.lb
+        lb.bind("<Configure>",   lambda e: self._redraw())
+        lb.bind("<Button-1>",    self._click)
+        lb.bind("<B1-Motion>",   lambda e: "break")
+        lb.bind("<Double-1>",    self._activate)
+        lb.bind("<Return>",      self._activate)
+        lb.bind("<Up>",          lambda e: self._move(-1))
+        lb.bind("<Down>",        lambda e: self._move(1))
+        lb.bind("<Prior>",       lambda e: self._move(-self._rows()))
+        lb.bind("<Next>",        lambda e: self._move(self._rows()))
+        lb.bind("<Home>",        lambda e: self._move(-len(self.idxs)))
+        lb.bind("<End>",         lambda e: self._move(len(self.idxs)))
+        lb.bind("<MouseWheel>",  lambda e: self._scroll(-1 if e.delta > 0 else 1, "units", 3))
+        lb.bind("<Button-4>",    lambda e: self._scroll(-1, "units", 3))
+        lb.bind("<Button-5>",    lambda e: self._scroll(1, "units", 3))
+
+    # --- 数据 ---
+    def set_indices(self, idxs):
+        """替换展示的下标数组; 默认选中第一项, 便于键盘回车快速确认"""
+        self.idxs = np.asarray(idxs, dtype=np.int64)
+        self.top = 0
+        self.sel = 0 if len(self.idxs) else None
+        self._redraw()
+
+    def selected(self) -> str | None:
+        if self.sel is None:
+            return None
+        return self.items[self.idxs[self.sel]]
+
+    def on_activate(self, callback):
+        self._on_activate = callback
+
+    # --- 视口 ---
+    def _rows(self) -> int:
+        """当前高度能完整显示的行数"""
+        if not self._row_h:
+            return 1
+        return max(1, self.lb.winfo_height() // self._row_h)
+
+    def _clamp_top(self, top: int) -> int:
+        return max(0, min(top, len(self.idxs) - self._rows()))
+
+    def _redraw(self):
+        lb = self.lb
+        n = len(self.idxs)
+        self.top = self._clamp_top(self.top)
+        window = self.idxs[self.top:self.top + self._rows() + self.OVERSCAN]
+        lb.delete(0, END)
+        if len(window):
+            lb.insert(END, *(self.items[i] for i in window))
+            if self._row_h is None and len(window) > 1:
+                b0, b1 = lb.bbox(0), lb.bbox(1)
+                if b0 and b1:
+                    self._row_h = max(1, b1[1] - b0[1])
+                    self._redraw()
+                    return
+            if self.sel is not None and self.top <= self.sel < self.top + len(window):
+                lb.selection_set(self.sel - self.top)
+        if n:
+            self.sb.set(self.top / n, min(1.0, (self.top + self._rows()) / n))
+        else:
+            self.sb.set(0.0, 1.0)
+
+    def _yview(self, *args):
+        n = len(self.idxs)
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * n)
+            self._redraw()
+        elif args[0] == "scroll":
+            self._scroll(int(args[1]), args[2])
+
+    def _scroll(self, step: int, what: str, units: int = 1):
+        self.top += step * (self._rows() if what == "pages" else units)
+        self._redraw()
+        return "break"
+
+    # --- 选择 ---
+    def _move(self, delta: int):
+        n = len(self.idxs)
+        if not n:
+            return "break"
+        cur = self.sel if self.sel is not None else 0
+        self.sel = max(0, min(n - 1, cur + delta))
+        rows = self._rows()
+        if self.sel < self.top:
+            self.top = self.sel
+        elif self.sel >= self.top + rows:
+            self.top = self.sel - rows + 1
+        self._redraw()
+        return "break"
+
+    def _click(self, event):
+        self.lb.focus_set()
+        if len(self.idxs):
+            pos = self.top + self.lb.nearest(event.y)
+            if pos < len(self.idxs):
+                self.sel = pos
+                self._redraw()
+        return "break"
+
+    def _activate(self, event=None):
+        if self._on_activate is not None:
+            self._on_activate()
+        return "break"
+
 # ---------- 带搜索框的选择器 ----------
 def choose_company_dialog(root, companies, title="选择公司"):
     win = Toplevel(root)
@@ -53,11 +625,7 @@ def choose_company_dialog(root, companies, title="选择公司"):
 
     # 归一 & 去重 & 排序
     uniq_companies = sorted({str(c).strip() for c in companies if str(c).strip()})
-    companies_lower = [c.casefold() for c in uniq_companies]
-
-    # 懒加载阈值
-    LAZY_THRESHOLD = 1000
-    lazy_mode = len(uniq_companies) > LAZY_THRESHOLD
+    index = CompanySearchIndex(uniq_companies)
 
     # 顶部: 搜索框
     top = Frame(win); top.pack(fill=X, padx=10, pady=(12, 6))
@@ -67,71 +635,36 @@ def choose_company_dialog(root, companies, title="选择公司"):
 
     # 提示/计数
     hint = StringVar()
-    if lazy_mode:
-        hint.set(f"共 {len(uniq_companies)} 家公司。为提速, 请先输入 ≥2 个字符再显示结果。")
-    else:
-        hint.set(f"共 {len(uniq_companies)} 家公司。可直接滚动或输入过滤。")
+    hint.set(f"共 {len(uniq_companies)} 家公司。可直接滚动或输入过滤。")
     Label(win, textvariable=hint, anchor="w").pack(fill=X, padx=12)
 
-    # 中部: 列表 + 滚动条
+    # 中部: 虚拟列表 + 滚动条(只渲染可见行, 全量展示也不卡)
     mid = Frame(win); mid.pack(fill=BOTH, expand=True, padx=10, pady=6)
-    sb = Scrollbar(mid); sb.pack(side=RIGHT, fill=Y)
-    lb = Listbox(mid, selectmode=SINGLE)
-    lb.pack(side=LEFT, fill=BOTH, expand=True)
-    lb.config(yscrollcommand=sb.set); sb.config(command=lb.yview)
+    vlist = VirtualListbox(mid, uniq_companies)
 
     # 状态
-    filtered_idx = list(range(len(uniq_companies)))  # 当前展示的索引列表
     last_query = {"text": None}
     pending_after = {"id": None}
 
-    def build_items_from_idx(idxs):
-        # 从索引构建原始字符串列表
-        return [uniq_companies[i] for i in idxs]
-
-    def listbox_fill(items):
-        lb.delete(0, END)
-        if items:
-            # 批量插入
-            lb.insert(END, *items)
-            # 选中第一项, 便于键盘回车快速确认
-            lb.selection_set(0); lb.see(0)
-
     def do_filter():
         # 读取并归一查询
         q = qvar.get().strip()
         q_norm = q.casefold()
-        if lazy_mode and len(q_norm) < 2:
-            # 懒加载: 要求至少 2 字符
-            listbox_fill([])
-            hint.set(f"共 {len(uniq_companies)} 家公司。请输入 ≥2 个字符进行搜索。")
-            return
 
         # 若与上次相同, 不必重算
         if q_norm == last_query["text"]:
             return
         last_query["text"] = q_norm
 
-        if not q_norm:
-            # 空查询: 展示全量(若非懒加载)
-            if lazy_mode:
-                listbox_fill([])
-                hint.set(f"共 {len(uniq_companies)} 家公司。请输入 ≥2 个字符进行搜索。")
-                return
-            filtered = list(range(len(uniq_companies)))
+        # 先前缀匹配, 再子串匹配(索引查询, 已去重); 空查询为全量。
+        # 原来前缀命中 ≥ 5000 时不再找子串命中(整表扫描太慢); 改成索引 + 虚拟列表后有意去掉了这个上限,
+        # 任何查询都给出全部命中
+        filtered, _ = index.search(q_norm)
+        vlist.set_indices(filtered)
+        if q_norm:
+            hint.set(f"匹配 {len(filtered)} / {len(uniq_companies)}")
         else:
-            # 先前缀匹配, 再子串匹配(去重)
-            starts = [i for i, s in enumerate(companies_lower) if s.startswith(q_norm)]
-            if len(starts) < 5000:  # 经验: 命中不太多时再做包含匹配
-                contains = [i for i, s in enumerate(companies_lower)
-                            if q_norm in s and not s.startswith(q_norm)]
-                filtered = starts + contains
-            else:
-                filtered = starts  # 减少额外包含匹配的成本
-
-        items = build_items_from_idx(filtered)
-        listbox_fill(items)
-        hint.set(f"匹配 {len(items)} / {len(uniq_companies)}")
+            hint.set(f"共 {len(uniq_companies)} 家公司。可直接滚动或输入过滤。")
 
     def schedule_filter():
         # 防抖: 取消上一次计划
@@ -145,8 +678,8 @@ def choose_company_dialog(root, companies, title="选择公司"):
         pending_after["id"] = win.after(120, do_filter)
 
     def confirm_selection():
-        sel = lb.curselection()
-        if not sel:
+        choice = vlist.selected()
+        if choice is None:
             # 如果没有选中但输入是全量匹配, 也允许直接确认
             q = qvar.get().strip()
             if q and q in uniq_companies:
@@ -154,8 +687,6 @@ def choose_company_dialog(root, companies, title="选择公司"):
             else:
                 messagebox.showwarning("未选择", "请从列表中选中一个公司。", parent=win)
                 return
-        else:
-            choice = lb.get(sel[0])
         win.grab_release()
         win.destroy()
         selected["value"] = choice
@@ -173,15 +704,12 @@ def choose_company_dialog(root, companies, title="选择公司"):
     # 事件绑定
     ent.bind("<KeyRelease>", lambda e: schedule_filter())
     ent.bind("<Return>",     lambda e: confirm_selection())
-    lb.bind("<Return>",      lambda e: confirm_selection())
-    lb.bind("<Double-1>",    lambda e: confirm_selection())
+    vlist.on_activate(confirm_selection)
     win.bind("<Escape>",     lambda e: cancel())
 
-    # 初始渲染(非懒加载时才显示全量)
-    if not lazy_mode:
-        listbox_fill(uniq_companies)
-    else:
-        listbox_fill([])
+    # 初始渲染: 全量展示
+    last_query["text"] = ""
+    vlist.set_indices(np.arange(len(uniq_companies)))
 
     # 渲染完再设为模态, 避免“白窗等渲染”的卡顿体感
     win.update_idletasks()
@@ -192,6 +720,107 @@ def choose_company_dialog(root, companies, title="选择公司"):
     win.wait_window()
     return selected["value"]
 
+# ---------- 后台任务 ----------
+class Cancelled(Exception):
+    """用户在进度窗点了取消"""
+
+def _no_progress(stage, done=None, total=None):
+    pass
+
+def wait_for(root, fut, text: str):
+    """在 Tk 线程等待后台任务: 未完成时显示提示窗并保持界面响应; 任务的异常原样抛出"""
+    if not fut.done():
+        win = Toplevel(root)
+        win.title("请稍候")
+        win.resizable(False, False)
+        Label(win, text=text).pack(padx=40, pady=20)
+        done = BooleanVar(win, value=False)
+
+        def poll():
+            if fut.done():
+                done.set(True)
+            else:
+                win.after(50, poll)
+        poll()
+        win.wait_variable(done)
+        win.destroy()
+    return fut.result()
+
+def _failed(fut) -> BaseException | None:
+    return fut.exception() if fut.done() else None
+
+def run_with_progress(root, title: str, job):
+    """
+    在工作线程执行 job(progress), Tk 线程显示进度窗(阶段 + 进度条 + 取消按钮)。
+    job 调用 progress(stage, done=None, total=None) 汇报进度; 点取消后下一次调用抛出 Cancelled。
+    返回 job 的结果; job 的异常(包括 Cancelled)在 Tk 线程原样抛出。
+    """
+    cancel = threading.Event()
+    state = {"stage": "准备中…", "done": None, "total": None}
+    lock = threading.Lock()
+
+    def progress(stage, done=None, total=None):
+        if cancel.is_set():
+            raise Cancelled()
+        with lock:
+            state.update(stage=stage, done=done, total=total)
+
+    fut = Future()
+
+    def target():
+        try:
+            fut.set_result(job(progress))
+        except BaseException as e:
+            fut.set_exception(e)
+
+    win = Toplevel(root)
+    win.title(title)
+    win.resizable(False, False)
+    stage_var = StringVar(win, value=state["stage"])
+    Label(win, textvariable=stage_var, anchor="w", width=48).pack(fill=X, padx=16, pady=(16, 6))
+    bar = ttk.Progressbar(win, length=360, mode="indeterminate")
+    bar.pack(padx=16, pady=6)
+    bar.start(15)
+
+    def request_cancel():
+        cancel.set()
+        stage_var.set("正在取消…")
+        btn.config(state="disabled")
+
+    btn = Button(win, text="取消", command=request_cancel)
+    btn.pack(pady=(6, 14))
+    win.protocol("WM_DELETE_WINDOW", request_cancel)
+
+    finished = BooleanVar(win, value=False)
+
+    def poll():
+        if fut.done():
+            finished.set(True)
+            return
+        if not cancel.is_set():
+            with lock:
+                stage, done, total = state["stage"], state["done"], state["total"]
+            if total:
+                if str(bar.cget("mode")) != "determinate":
+                    bar.stop()
+                    bar.config(mode="determinate", maximum=total)
+                bar.config(maximum=total, value=done)
+                stage_var.set(f"{stage}  {done}/{total}")
+            else:
+                if str(bar.cget("mode")) != "indeterminate":
+                    bar.config(mode="indeterminate", value=0)
+                    bar.start(15)
+                stage_var.set(stage)
+        win.after(100, poll)
+
+    threading.Thread(target=target, daemon=True).start()
+    win.grab_set()
+    poll()
+    win.wait_variable(finished)
+    win.grab_release()
+    win.destroy()
+    return fut.result()
+
 # ---------- 文件对话框 ----------
 def select_file(root, title):
     return filedialog.askopenfilename(
@@ -214,93 +843,826 @@ def validate_columns(df, required_cols, df_name):
         raise ValueError(f"{df_name} 缺少必要列: {', '.join(missing)}")
 
 # ---------- 自动探测表头并读取总表 ----------
+def _is_header_row(values) -> bool:
+    """同一行里同时出现 Customer 与 Current 即视为表头"""
+    s = [str(v).lower() for v in values]
+    return any("customer" in v for v in s) and any("current" in v for v in s)
+
 def _detect_header_row(df_no_header: pd.DataFrame) -> int:
-    for i, row in df_no_header.iterrows():
-        s = row.astype(str)
-        if s.str.contains("Customer", case=False, na=False).any() and \
-           s.str.contains("Current", case=False, na=False).any():
+    for i, row in enumerate(df_no_header.itertuples(index=False, name=None)):
+        if _is_header_row(row):
             return i
     return 0
 
-def read_master_raw(master_file: str, sheet_name: str | int | None = None) -> pd.DataFrame:
-    probe = pd.read_excel(master_file, sheet_name=sheet_name or 0, header=None)
-    header_idx = _detect_header_row(probe)
-    df = pd.read_excel(master_file, sheet_name=sheet_name or 0, header=header_idx)
-    return df
+def _convert_row(row) -> list:
+    """与 pandas openpyxl 读取器一致: None -> '', 整数值的 float -> int, 去掉行尾空单元格"""
+    vals = ["" if v is None else (int(v) if isinstance(v, float) and v.is_integer() else v)
+            for v in row]
+    while vals and vals[-1] == "":
+        vals.pop()
+    return vals
+
+# 数据行按块转成 DataFrame: 每块先按 row_filter 筛行, 保留行里的数字压成 float64, 相同的文字共用
+# 一个对象, 整表的单元格对象不必同时留在内存里。各列最后对整列推断一次类型(被筛掉的行里的非空值
+# 也参与), 与整表一次交给 TextParser 的结果相同。
+READ_CHUNK_ROWS = 2000
+
+def _share_strings(values: np.ndarray) -> np.ndarray:
+    """相同的文字共用一个 str 对象: 读取器给每个单元格各建一个 str, 公司/币种这类重复多的列按块留着很占内存"""
+    return np.fromiter((sys.intern(v) if type(v) is str else v for v in values), dtype=object, count=len(values))
+
+def _pack_values(values: np.ndarray):
+    """一块里某列保留行的原值 -> 数字(空值为 NaN)存成 float64, 其它值按位置另存; 其它值多时原样返回"""
+    num = np.fromiter((_is_plain_number(v) for v in values), dtype=bool, count=len(values))
+    other = np.flatnonzero(~num)
+    if len(other) * 4 > len(values):
+        return _share_strings(values)
+    nums = np.full(len(values), np.nan)
+    nums[num] = values[num].astype(np.float64)
+    return nums, other, _share_strings(values[other])
+
+def _unpack_values(packed) -> np.ndarray:
+    """_pack_values 的逆过程: 整数值还原成 int(_convert_row 已把整数值的 float 转成 int), 其它值放回原位"""
+    if not isinstance(packed, tuple):
+        return packed
+    nums, pos, others = packed
+    out = nums.astype(object)
+    whole = np.isfinite(nums) & (nums == np.trunc(nums))
+    out[whole] = nums[whole].astype(np.int64).astype(object)
+    out[pos] = others
+    return out
+
+def _parse_chunk(header: list, rows: list[list], row_filter) -> tuple[int, int, dict]:
+    """一块数据行 -> (保留的行数, 总行数, {列名: (保留行的紧凑值, 被筛掉行里的非空值, 被筛掉的行里有无空值)})"""
+    width = max([len(header), *map(len, rows)])
+    data = [v + [""] * (width - len(v)) if len(v) < width else v for v in [header, *rows]]
+    df = TextParser(data, header=0, skip_blank_lines=False, dtype=object).read()
+    del data
+    keep = np.ones(len(df), dtype=bool) if row_filter is None else np.asarray(row_filter(df), dtype=bool)
+    cols = {}
+    for c, s in df.items():
+        values = s.to_numpy(dtype=object)
+        dropped = values[~keep]
+        na = pd.isna(dropped)
+        cols[c] = (_pack_values(values[keep]), dropped[~na], bool(na.any()))
+    return int(keep.sum()), len(keep), cols
+
+_NA_KEY = object()
+
+def _value_key(v):
+    """类型推断时区分不同的值: 1 / 1.0 / True 各算一种, 空值只算一种"""
+    return _NA_KEY if isinstance(v, float) and v != v else (type(v), v)
+
+def _number_samples(nums: np.ndarray) -> list:
+    """一段 float64(_pack_values 的数字部分)里影响类型推断的代表值: 最小/最大整数、一个小数、±inf、空值"""
+    out = []
+    finite = nums[np.isfinite(nums)]
+    whole = finite == np.trunc(finite)
+    if whole.any():
+        out += [int(finite[whole].min()), int(finite[whole].max())]
+    if not whole.all():
+        out.append(float(finite[~whole][0]))
+    out += [float(v) for v in np.unique(nums[np.isinf(nums)])]
+    if np.isnan(nums).any():
+        out.append(np.nan)
+    return out
+
+def _combine_column(name, parts: list[tuple]) -> pd.Series:
+    """
+    各块的同一列 -> 整列, 与整列一起交给 TextParser 的结果相同。
+    TextParser 的类型推断只看出现过哪些 (类型, 值), 所以只把不同的值(含被筛掉行里的非空值、
+    数字段的代表值)解析一次, 再按值映射回各行; 数字段不必逐格装箱。
+    """
+    samples = {}
+    for packed, dropped, has_na in parts:
+        if isinstance(packed, tuple):
+            values = [*_number_samples(packed[0]), *packed[2]]
+        else:
+            values = packed
+        for v in [*values, *dropped, *([np.nan] if has_na else [])]:
+            samples.setdefault(_value_key(v), v)
+    if not samples:
+        return pd.Series([], dtype=object, name=name)
+    parser = TextParser([[v] for v in samples.values()], header=None, skip_blank_lines=False,
+                        dtype={0: object} if name == 'Customer ID' else None)
+    parsed = parser.read()[0]
+    if parsed.dtype == object or isinstance(parsed.dtype, pd.StringDtype):
+        # 没有转换: 各格就是原值(空值为 NaN)
+        values = [_unpack_values(p) for p, _, _ in parts]
+        col = pd.Series(np.concatenate(values) if values else [], dtype=parsed.dtype, name=name)
+        if name == 'Customer ID':
+            # 按原值读入(文字 '00123' 不转成 123), 整列(含被筛掉的行)都是数字时再转成数字列
+            inferred = pd.Series(list(samples.values()), dtype=object).infer_objects().dtype
+            col = col if inferred == object else col.astype(inferred)
+        return col
+
+    converted = dict(zip(samples, parsed.tolist()))
+    sizes = [len(p[0]) if isinstance(p, tuple) else len(p) for p, _, _ in parts]
+    out = np.empty(sum(sizes), dtype=parsed.dtype)
+    start = 0
+    for (packed, _, _), size in zip(parts, sizes):
+        seg = out[start:start + size]
+        if isinstance(packed, tuple):
+            nums, pos, others = packed
+            seg[:] = nums
+            seg[pos] = [converted[_value_key(v)] for v in others]
+        else:
+            seg[:] = [converted[_value_key(v)] for v in packed]
+        start += size
+    return pd.Series(out, name=name)
+
+def read_master_raw(master_file: str, sheet_name: str | int | None = None,
+                    usecols=None, is_header=_is_header_row, row_filter=None) -> pd.DataFrame:
+    """
+    单次流式读取总表: 边读边找表头(默认 Customer/Current), 找到后继续用同一次解析收集数据行。
+    usecols 可为表头名列表或 callable(表头) -> bool, 给定时只保留对应列。
+    is_header(一行的值) -> bool 判定表头行, 发票表等其它格式可以换掉。
+    row_filter(一块 DataFrame, 各列为原值) -> 布尔数组, 给定时只返回为 True 的行(行号重排),
+    读取时的峰值内存只与块大小和保留的行有关。
+    """
+    wb = load_workbook(master_file, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if isinstance(sheet_name, str) else wb.worksheets[sheet_name or 0]
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+
+        # 表头之前的说明区只缓存到找到表头为止; 整表都找不到则退回第 0 行
+        with profile_stage("detect_header") as st:
+            buffered = []
+            for row in rows:
+                buffered.append(_convert_row(row))
+                if is_header(buffered[-1]):
+                    buffered = buffered[-1:]
+                    break
+            st["rows"] = len(buffered)
+
+        header = buffered[0] if buffered else []
+        keep = None
+        if callable(usecols):
+            keep = [j for j, h in enumerate(header) if usecols(h)]
+        elif usecols is not None:
+            wanted = {str(c) for c in usecols}
+            keep = [j for j, h in enumerate(header) if str(h) in wanted]
+
+        def pick(vals):
+            if keep is None:
+                return vals
+            return [vals[j] if j < len(vals) else "" for j in keep]
+
+        def blank(vals) -> bool:
+            return not any(v != "" for v in vals)
+
+        with profile_stage("parse_rows") as st:
+            header = pick(header)
+            chunks, pending, n = [], [pick(v) for v in buffered[1:]], 0
+            for row in rows:
+                pending.append(pick(_convert_row(row)))
+                if len(pending) >= READ_CHUNK_ROWS:
+                    # 末尾的空行先留着: 若一直到表尾都是空行就不算数据
+                    cut = len(pending)
+                    while cut and blank(pending[cut - 1]):
+                        cut -= 1
+                    if cut:
+                        chunks.append(_parse_chunk(header, pending[:cut], row_filter))
+                        n += cut
+                        pending = pending[cut:]
+            while pending and blank(pending[-1]):
+                pending.pop()
+            if pending or not chunks:
+                chunks.append(_parse_chunk(header, pending, row_filter))
+                n += len(pending)
+            st["rows"] = n
+    finally:
+        wb.close()
+
+    if blank(header) and not n:
+        return pd.DataFrame()
+    with profile_stage("build_dataframe", rows=sum(k for k, _, _ in chunks)):
+        # 各块列名按位置一致, 窄的块缺少的末尾列都是空值
+        names = max((list(cols) for _, _, cols in chunks), key=len)
+        empty = np.zeros(0, dtype=np.int64)
+        out = {}
+        for name in names:
+            parts = [cols.pop(name) if name in cols else ((np.full(k, np.nan), empty, empty), [], total > k)
+                     for k, total, cols in chunks]
+            out[name] = _combine_column(name, parts)
+        # 不复制: 默认会把同类型的桶列合并成一整块再拷一份, 峰值多出整张表
+        return pd.DataFrame(out, columns=names, copy=False)
+
+# ---------- 紧凑数据模型(只留数据行, 文字列字典编码) ----------
+# 不同值个数不超过行数的这个比例时, 文字列转为 category(每行只存一个小整数编码)
+CATEGORY_MAX_RATIO = 0.5
+
+def to_category(s: pd.Series, any_type: bool = False) -> pd.Series:
+    """
+    重复值多的文字列转 category, 否则原样返回。
+    any_type=True 时数字/文字混合的 object 列也转(如 Customer ID); 值本身不变。
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s
+    if not (pd.api.types.is_string_dtype(s) or (any_type and s.dtype == object)):
+        return s
+    if len(s) and s.nunique() > len(s) * CATEGORY_MAX_RATIO:
+        return s
+    return s.astype("category")
+
+def drop_unused_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """切片后去掉用不到的类别, 避免把整张总表的字典带进子进程"""
+    return pd.DataFrame({c: s.cat.remove_unused_categories() if isinstance(s.dtype, pd.CategoricalDtype) else s
+                         for c, s in df.items()})
+
+def compact_master(df: pd.DataFrame, company_col: str) -> pd.DataFrame:
+    """
+    只保留数据行(data_row_mask 只算这一次), 公司列/Customer ID 及其它重复多的文字列转 category。
+    桶列保持原值, 定点数换算与原来逐位一致。
+    """
+    mask = data_row_mask(df).to_numpy()
+    everything = mask.all()         # 读取时已按 data_row_mask 筛过行: 不必再复制
+    cols = {}
+    for c, s in df.items():
+        # 逐列切片再编码, 临时内存只多出一列; 行号重排为 RangeIndex(不占内存)
+        s = s.reset_index(drop=True) if everything else pd.Series(s.array[mask], name=c)
+        cols[c] = s if c in PIVOT_BUCKETS else to_category(s, any_type=c in (company_col, 'Customer ID'))
+    return pd.DataFrame(cols)
+
+def company_keys(col: pd.Series) -> pd.Series:
+    """
+    公司列 -> 规范化公司名(转 str 并去首尾空白, 缺失仍为缺失), 结果为 category。
+    category 列只对各类别做一次字符串处理, 每行只是整数编码的查表。
+    """
+    if not isinstance(col.dtype, pd.CategoricalDtype):
+        col = col.astype("category")
+    keys = pd.Categorical(col.cat.categories.astype(str).str.strip())
+    lookup = np.append(keys.codes, -1)      # 编码 -1(缺失) 查到末尾的 -1
+    codes = lookup[col.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, keys.categories), index=col.index, name=col.name)
+
+def company_choices(keys: pd.Series) -> list[str]:
+    """规范化公司名 -> 去重排序的公司列表(去掉 All Companies)"""
+    codes = keys.cat.codes.to_numpy()
+    names = keys.cat.categories[np.unique(codes[codes >= 0])]
+    names = names[~names.str.fullmatch(r'(?i)all\s+companies')]
+    return sorted(names.tolist())
 
 # ---------- 从“数据行”提取公司列表(排除说明区 & All Companies) ----------
 def extract_companies_for_choice(df: pd.DataFrame, company_col: str) -> list[str]:
-    # aging 桶转数值, 标记至少一个桶非空/数字（仅用于判定数据行，不影响后续 Decimal 计算）
-    aging_num = df[PIVOT_BUCKETS].apply(pd.to_numeric, errors="coerce")
-    mask_data_row = df['Customer ID'].notna() & aging_num.notna().any(axis=1)
-    companies = (
-        df.loc[mask_data_row, company_col]
-          .dropna()
-          .astype(str).str.strip()
-    )
-    companies = companies[~companies.str.fullmatch(r'(?i)all\s+companies')]  # 去掉 All Companies
-    return sorted(companies.unique().tolist())
+    # 数据行: 有 Customer ID 且至少一个桶为数字（仅用于判定数据行，不影响后续计算）
+    return company_choices(company_keys(df.loc[data_row_mask(df), company_col]))
+
+# ---------- 解析结果缓存(按 路径 + 大小/修改时间/内容哈希) ----------
+# 解析后的 DataFrame 以 pickle 存到缓存目录: 总表的桶列常是数字/文字混合的 object 列,
+# pickle 能原样保存, 读回也只需几百毫秒。超过容量上限时按最近使用时间(LRU)淘汰。
+CACHE_VERSION = 4   # 2: 总表缓存改存 compact_master 之后的紧凑表; 3: 客户编号不再去掉前导零; 4: 客户表连同查找索引
+CACHE_DIR = os.environ.get("AR_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "ar_interpreter")
+CACHE_MAX_BYTES = int(os.environ.get("AR_CACHE_MAX_MB", "1024")) * 1024 * 1024
+CACHE_ENABLED = os.environ.get("AR_CACHE", "1") != "0"
+_CACHE_LOCK = threading.Lock()   # 后台预读时总表/客户表两个线程会同时更新索引
+
+@contextmanager
+def _cache_lock():
+    """
+    读改写 index.json 时持有: 线程锁 + 缓存目录下 index.lock 的文件锁
+    (趋势/批量模式的多个子进程会同时更新索引, 只用线程锁会丢掉别的进程写入的条目)。
+    """
+    with _CACHE_LOCK:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(os.path.join(CACHE_DIR, "index.lock"), "a+b") as f:
+            try:
+                import fcntl
+            except ImportError:
+                fcntl = None
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)      # 关闭文件时释放
+                yield
+                return
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)   # 等不到会在约 10 秒后抛 OSError
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _cache_index_path() -> str:
+    return os.path.join(CACHE_DIR, "index.json")
+
+def _load_cache_index() -> dict:
+    try:
+        with open(_cache_index_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache_index(index: dict):
+    tmp = f"{_cache_index_path()}.{os.getpid()}.tmp"   # 多个进程(趋势模式)可能同时写
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, _cache_index_path())
+
+def _evict_cache(index: dict):
+    """总大小超限时, 先删最久未使用的条目"""
+    total = sum(e["bytes"] for e in index.values())
+    for key in sorted(index, key=lambda k: index[k]["last_used"]):
+        if total <= CACHE_MAX_BYTES:
+            break
+        total -= index[key]["bytes"]
+        try:
+            os.remove(os.path.join(CACHE_DIR, index[key]["file"]))
+        except OSError:
+            pass
+        del index[key]
+
+def cached_read(path: str, kind: str, loader) -> pd.DataFrame | tuple:
+    """
+    带缓存地读取 path: 路径+大小+修改时间一致直接命中; 只有修改时间变了则比对内容哈希;
+    都不符合时调用 loader() 重新解析并写入缓存。kind 区分同一文件的不同读法(表名/列等)。
+    loader() 返回 DataFrame, 或连同索引等一起返回的元组(整个 pickle)。
+    """
+    if not CACHE_ENABLED:
+        return loader()
+
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    key = hashlib.sha1(f"{CACHE_VERSION}|{kind}|{path}".encode("utf-8")).hexdigest()[:20]
+    with _cache_lock():
+        index = _load_cache_index()
+        entry = index.get(key)
+
+        hit = False
+        if entry and entry["size"] == st.st_size:
+            if entry["mtime_ns"] == st.st_mtime_ns:
+                hit = True
+            elif entry["sha256"] == _file_sha256(path):
+                hit = True
+                entry["mtime_ns"] = st.st_mtime_ns
+        if hit:
+            try:
+                df = pd.read_pickle(os.path.join(CACHE_DIR, entry["file"]))
+                entry["last_used"] = time.time()
+                _save_cache_index(index)
+                return df
+            except Exception:
+                pass  # 缓存文件损坏/丢失: 当作未命中
+
+    # 解析不占锁, 总表和客户表可以同时在后台读取
+    df = loader()
+    fname = key + ".pkl"
+    tmp = os.path.join(CACHE_DIR, f"{fname}.{os.getpid()}.tmp")
+    pd.to_pickle(df, tmp)
+    sha = _file_sha256(path)
+    with _cache_lock():
+        os.replace(tmp, os.path.join(CACHE_DIR, fname))
+        index = _load_cache_index()
+        index[key] = {
+            "path": path, "kind": kind, "file": fname,
+            "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha,
+            "bytes": os.path.getsize(os.path.join(CACHE_DIR, fname)), "last_used": time.time(),
+        }
+        _evict_cache(index)
+        _save_cache_index(index)
+    return df
+
+def invalidate_cache(path: str | None = None) -> int:
+    """删除 path 的全部缓存条目; path 为 None 时清空缓存。返回删除的条目数"""
+    with _cache_lock():
+        return _invalidate_cache(path)
+
+def _invalidate_cache(path: str | None) -> int:
+    index = _load_cache_index()
+    target = os.path.abspath(path) if path else None
+    removed = [k for k, e in index.items() if target is None or e["path"] == target]
+    for key in removed:
+        try:
+            os.remove(os.path.join(CACHE_DIR, index[key]["file"]))
+        except OSError:
+            pass
+        del index[key]
+    if removed:
+        _save_cache_index(index)
+    return len(removed)
+
+# ---------- 客户映射(Customer ID → Salesman) ----------
+# 客户表与总表的编号类型常不一致(1001 / 1001.0 / '1001'), 两边都先规范成同一个字符串键。
+# 带前导零的文字编号('00123')是另一个客户, 不与 123 合并。
+# 客户表的规范化+去重结果连同排好序的查找索引随解析缓存保存, 文件变了才重新导入并排序;
+# 查找时对规范化键二分(np.searchsorted), 且只对 Customer ID 的不同值各查一次。
+_INT_TEXT = re.compile(r'(?:0|-?[1-9]\d*)(?:\.0+)?')   # 不带前导零/正号的整数文字
+
+def customer_key(v) -> str | None:
+    """
+    Customer ID / Number 的统一键: 整数值(1001、1001.0、' 1001 '、'1001.0')记为 '1001';
+    其余文字(含 '01001' 这类带前导零的编号)只去首尾空格, 原样作键; 空值为 None
+    """
+    if isinstance(v, str):
+        text = v.strip()
+    elif isinstance(v, (bool, np.bool_)):
+        return str(v)
+    elif isinstance(v, (int, np.integer)):
+        return str(int(v))
+    elif isinstance(v, (float, np.floating)):
+        if np.isnan(v):
+            return None
+        return str(int(v)) if float(v).is_integer() else repr(float(v))
+    elif v is None or v is pd.NA or v is pd.NaT:
+        return None
+    else:
+        text = str(v).strip()
+    if not text:
+        return None
+    if text[-1].isdigit() and _INT_TEXT.fullmatch(text):
+        return str(int(text.split('.')[0]))
+    return text
+
+def _unique_customer_keys(col: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """(逐行编号, 各不同值的键); 编号 -1 为空值"""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        codes, uniques = col.cat.codes.to_numpy(), col.cat.categories
+    else:
+        codes, uniques = pd.factorize(col)
+    if pd.api.types.is_integer_dtype(uniques.dtype):
+        return codes, np.asarray(uniques).astype(str).astype(object)   # 常见的纯整数编号: 整列转换
+    return codes, np.array([customer_key(v) for v in uniques], dtype=object)
+
+def customer_keys(col: pd.Series) -> np.ndarray:
+    """逐行的 customer_key(object 数组), 每个不同的值只算一次"""
+    codes, keys = _unique_customer_keys(col)
+    return np.append(keys, None)[codes]
+
+class SalesIndex:
+    """客户表的查找索引: 规范化键排好序, 连同各键在客户表里的行号"""
+
+    def __init__(self, keys: np.ndarray):
+        valid = np.flatnonzero(pd.notna(keys))
+        k = keys[valid].astype(str)
+        order = np.argsort(k, kind="stable")
+        self.keys = k[order]
+        self.rows = valid[order]
+
+    def positions(self, col: pd.Series) -> np.ndarray:
+        """col 各行在客户表里的行号, 匹配不到为 -1"""
+        codes, ukeys = _unique_customer_keys(col)
+        found = np.full(len(ukeys) + 1, -1, dtype=np.int64)   # 末位给空值(编号 -1)
+        ok = np.flatnonzero(pd.notna(ukeys))
+        if len(ok) and len(self.keys):
+            q = ukeys[ok].astype(str)
+            i = np.minimum(np.searchsorted(self.keys, q), len(self.keys) - 1)
+            hit = self.keys[i] == q
+            found[ok[hit]] = self.rows[i[hit]]
+        return found[codes]
+
+# 已建好的索引: id(客户表) -> (弱引用, 索引); 表被回收后自动移除
+_SALES_INDEXES: dict[int, tuple[weakref.ref, SalesIndex]] = {}
+
+def _register_sales_index(default_sales_df: pd.DataFrame, index: SalesIndex) -> SalesIndex:
+    key = id(default_sales_df)
+    ref = weakref.ref(default_sales_df, lambda _, key=key: _SALES_INDEXES.pop(key, None))
+    _SALES_INDEXES[key] = (ref, index)
+    return index
+
+def sales_index(default_sales_df: pd.DataFrame) -> SalesIndex:
+    """客户表的查找索引; 同一张表只建一次(子进程收到的副本各建一次)"""
+    hit = _SALES_INDEXES.get(id(default_sales_df))
+    if hit is not None and hit[0]() is default_sales_df:
+        return hit[1]
+    keys = customer_keys(default_sales_df['Number'])
+    return _register_sales_index(default_sales_df, SalesIndex(keys))
+
+def _read_sales_store(customer_file: str) -> tuple[pd.DataFrame, SalesIndex]:
+    """解析 export 表, 按规范化键去重(保留第一次出现), 连同规范化键的查找索引一起返回"""
+    # Number 按原值读入: 默认推断会把文字 '00123' 转成数字 123, 与真正的 123 撞在一起
+    df = pd.read_excel(customer_file, sheet_name='export', dtype={'Number': object})
+    validate_columns(df, ['Number', 'Salesman'], 'Customer sheet (export)')
+    df = df[['Number', 'Name', 'Salesman']].assign(Number=lambda d: d['Number'].infer_objects())
+    keys = customer_keys(df['Number'])
+    first = ~pd.Series(keys).duplicated().to_numpy()
+    return df.loc[first], SalesIndex(keys[first])
+
+def unmatched_customers(raw_df: pd.DataFrame, default_sales_df: pd.DataFrame) -> pd.DataFrame:
+    """会记为 Unassigned 的 Customer ID(客户表里没有, 或 Salesman 为空)及行数, 按行数降序"""
+    pos = sales_index(default_sales_df).positions(raw_df['Customer ID'])
+    salesman = default_sales_df['Salesman'].array.take(pos, allow_fill=True)
+    ids = raw_df['Customer ID'].to_numpy()[pd.isna(salesman)]
+    counts = pd.Series(ids, dtype=object).value_counts(dropna=False)
+    return pd.DataFrame({'Customer ID': counts.index, 'Rows': counts.to_numpy()})
+
+def describe_unmatched(unmatched: pd.DataFrame, limit: int = 10) -> str:
+    shown = ', '.join(str(v) for v in unmatched['Customer ID'][:limit])
+    more = f" 等 {len(unmatched)} 个" if len(unmatched) > limit else ""
+    return (f"{len(unmatched)} 个 Customer ID 在客户表中匹配不到 Salesman(共 {unmatched['Rows'].sum()} 行, "
+            f"记为 Unassigned): {shown}{more}")
 
 # ---------- 导出 ----------
-def export_xlsx_multi(sheets: dict[str, pd.DataFrame], path: str):
+EXPORT_DATETIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+EXPORT_DATE_FORMAT = "YYYY-MM-DD"
+EXPORT_CHUNK_ROWS = 20000
+
+def _column_widths(out: pd.DataFrame) -> list[float]:
+    """列宽: 前 1000 行 str 长度的最大值与列名长度取大 + 2, 上限 80(None 记为空串)"""
+    head = out.iloc[:1000]
+    widths = []
+    for col in out.columns:
+        vals = head[col].to_numpy(dtype=object)
+        lens = np.char.str_len(vals.astype(str)) if len(vals) else np.zeros(0, dtype=int)
+        lens[np.equal(vals, None)] = 0
+        maxlen = max(int(lens.max()) if len(lens) else 0, len(str(col))) + 2
+        widths.append(min(maxlen, 80))
+    return widths
+
+def _may_hold_dates(s: pd.Series) -> bool:
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return True
+    return s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) in ("datetime", "date", "mixed")
+
+def _stream_sheet(wb: Workbook, sheet_name: str, out: pd.DataFrame, progress=_no_progress):
+    """按块把 DataFrame 追加到只写工作表; 内存只与块大小有关"""
+    ws = wb.create_sheet(sheet_name)
+    # 冻结首行; 只写模式下列宽必须在写行之前设置
+    ws.freeze_panes = "A2"
+    if out is None or out.empty:
+        return
+
+    for j, w in enumerate(_column_widths(out), start=1):
+        ws.column_dimensions[get_column_letter(j)].width = w
+    ws.append(list(out.columns))
+
+    date_cols = [j for j, c in enumerate(out.columns) if _may_hold_dates(out[c])]
+    float_cols = [j for j, c in enumerate(out.columns) if pd.api.types.is_float_dtype(out[c])]
+    for start in range(0, len(out), EXPORT_CHUNK_ROWS):
+        progress(f"写出 {sheet_name}", start, len(out))
+        chunk = out.iloc[start:start + EXPORT_CHUNK_ROWS]
+        vals = chunk.astype(object).where(chunk.notna(), None).to_numpy()
+        for j in float_cols:
+            col = chunk.iloc[:, j].to_numpy()
+            inf = np.isinf(col)
+            if inf.any():
+                vals[inf, j] = np.where(col[inf] > 0, "inf", "-inf")  # 与 pandas 的 inf_rep 一致
+        rows = vals.tolist()
+        for row in rows:
+            for j in date_cols:
+                v = row[j]
+                if isinstance(v, (datetime, date)):
+                    cell = WriteOnlyCell(ws, value=v)
+                    cell.number_format = EXPORT_DATETIME_FORMAT if isinstance(v, datetime) else EXPORT_DATE_FORMAT
+                    row[j] = cell
+            ws.append(row)
+
+def export_xlsx_multi(sheets: dict[str, pd.DataFrame], path: str, streaming: bool = True,
+                      progress=_no_progress):
+    """
+    导出多张表: 默认用 openpyxl 只写模式逐块流式写出(内存恒定);
+    streaming=False 时走 pandas ExcelWriter(整本工作簿在内存中构建)。
+    先写到 path.part, 完成后再替换 path; 失败或取消时删除半成品, 原有的 path 不受影响。
+    """
+    part = path + ".part"
+    wb = None
     try:
-        with pd.ExcelWriter(path, engine="openpyxl", datetime_format="yyyy-mm-dd hh:mm:ss") as xw:
+        if not streaming:
+            progress("写出…")
+            _export_xlsx_pandas(sheets, part)
+        else:
+            wb = Workbook(write_only=True)
             for sheet_name, out in sheets.items():
-                if out is None or out.empty:
-                    pd.DataFrame().to_excel(xw, index=False, sheet_name=sheet_name)
-                    ws = xw.sheets[sheet_name]
-                    ws.freeze_panes = "A2"
-                    continue
+                _stream_sheet(wb, sheet_name, out, progress)
+            progress("保存文件…")
+            wb.save(part)
+            wb = None
+        progress("保存文件…")   # 保存期间点了取消: 这里抛出 Cancelled, 不替换目标文件
+        os.replace(part, path)
+    except Cancelled:
+        raise
+    except Exception as ex:
+        raise RuntimeError(f"Failed to save Excel: {ex}") from ex
+    finally:
+        if wb is not None:
+            # 中途放弃: 关掉只写表的临时文件写入器
+            for ws in wb.worksheets:
+                try:
+                    ws.close()
+                except Exception:
+                    pass
+        if os.path.exists(part):
+            os.remove(part)
 
-                out.to_excel(xw, index=False, sheet_name=sheet_name)
+def _export_xlsx_pandas(sheets: dict[str, pd.DataFrame], path: str):
+    # 目标是 .part 临时文件, ExcelWriter 按扩展名认不出格式, 所以传文件对象并指定引擎
+    with open(path, "wb") as f, pd.ExcelWriter(f, engine="openpyxl", datetime_format=EXPORT_DATETIME_FORMAT) as xw:
+        for sheet_name, out in sheets.items():
+            if out is None or out.empty:
+                pd.DataFrame().to_excel(xw, index=False, sheet_name=sheet_name)
                 ws = xw.sheets[sheet_name]
-
-                # 冻结首行
                 ws.freeze_panes = "A2"
-                # 自动调整列宽
-                for j, col in enumerate(out.columns, start=1):
-                    values = out[col].tolist()[:1000]
-                    maxlen = 0
-                    for v in values:
-                        if v is None:
-                            s = ""
-                        else:
-                            s = str(v)
-                        l = len(s)
-                        if l > maxlen:
-                            maxlen = l
-                    maxlen = max(maxlen, len(str(col))) + 2
-                    ws.column_dimensions[get_column_letter(j)].width = min(maxlen, 80)
-    except Exception as ex:
-        raise RuntimeError(f"Failed to save Excel: {ex}") from ex
+                continue
+
+            out.to_excel(xw, index=False, sheet_name=sheet_name)
+            ws = xw.sheets[sheet_name]
+
+            # 冻结首行
+            ws.freeze_panes = "A2"
+            # 自动调整列宽
+            for j, col in enumerate(out.columns, start=1):
+                values = out[col].tolist()[:1000]
+                maxlen = 0
+                for v in values:
+                    if v is None:
+                        s = ""
+                    else:
+                        s = str(v)
+                    l = len(s)
+                    if l > maxlen:
+                        maxlen = l
+                maxlen = max(maxlen, len(str(col))) + 2
+                ws.column_dimensions[get_column_letter(j)].width = min(maxlen, 80)
 
 # ---------- 主逻辑 ----------
-def generate_pivot(master_file: str, customer_file: str, output_file: str, root: Tk):
-    master_df = read_master_raw(master_file)
+def _master_columns() -> set[str] | None:
+    if RAW_SHEET_COLUMNS is None:
+        return None
+    return {'Customer ID', *PIVOT_BUCKETS, *RAW_SHEET_COLUMNS,
+            *(k for levels in ROLLUP_SHEETS.values() for level in levels for k in _level_cols(level))}
 
-    # 找到 Company 列
-    company_col = None
+def master_usecols():
+    """generate_pivot 实际需要的总表列(供 read_master_raw 的 usecols 使用)"""
+    wanted = _master_columns()
+    if wanted is None:
+        return None
+    return lambda h: str(h) in wanted or 'company' in str(h).lower()
+
+def find_company_col(master_df: pd.DataFrame):
+    """找到 Company 列: 优先精确匹配 company, 其次唯一一个包含 company 的列"""
     for c in master_df.columns:
         if str(c).strip().lower() == 'company':
-            company_col = c; break
-    if company_col is None:
-        candidates = [c for c in master_df.columns if 'company' in str(c).lower()]
-        if len(candidates) == 1:
-            company_col = candidates[0]
-    if company_col is None:
-        raise ValueError("未找到 Company 列, 请确认总表包含公司列。")
+            return c
+    candidates = [c for c in master_df.columns if 'company' in str(c).lower()]
+    if len(candidates) == 1:
+        return candidates[0]
+    raise ValueError("未找到 Company 列, 请确认总表包含公司列。")
+
+def read_default_sales(customer_file: str) -> pd.DataFrame:
+    """读取客户-业务员映射(export 表), 按规范化的 Number 去重; 查找索引随缓存一起恢复"""
+    load_heavy_modules()
+    with profile_stage("read_customer") as st:
+        default_sales_df, index = cached_read(customer_file, "export|index",
+                                              lambda: _read_sales_store(customer_file))
+        st["rows"] = len(default_sales_df)
+    _register_sales_index(default_sales_df, index)
+    return default_sales_df
 
+def _read_master_compact(master_file: str) -> pd.DataFrame:
+    # 说明区/空行/合计行在读取时就按块筛掉, 不再整表留在内存里
+    master_df = read_master_raw(master_file, usecols=master_usecols(), row_filter=_data_rows_or_all)
+    company_col = find_company_col(master_df)
     # 校验必要列(在“真正数据列”层面)
     validate_columns(master_df, [company_col, 'Customer ID'] + PIVOT_BUCKETS, 'Master sheet')
+    with profile_stage("compact_master", rows=len(master_df)):
+        return compact_master(master_df, company_col)
+
+def load_master(master_file: str):
+    """
+    读取并校验总表, 返回 (master_df, company_col, companies)。
+    master_df 已是 compact_master 之后的紧凑表: 只含数据行, 公司列等为 category。
+    """
+    load_heavy_modules()
+    with profile_stage("read_master") as st:
+        master_df = cached_read(master_file, f"master|{sorted(_master_columns() or [])}",
+                                lambda: _read_master_compact(master_file))
+        st["rows"] = len(master_df)
+    company_col = find_company_col(master_df)
+
+    # 公司列表直接取自 category 的类别, 不再逐行处理
+    with profile_stage("extract_companies", rows=len(master_df)):
+        companies = company_choices(company_keys(master_df[company_col]))
+    return master_df, company_col, companies
+
+def load_inputs(master_file: str, customer_file: str):
+    """读取并校验总表与客户表, 返回 (master_df, company_col, companies, default_sales_df)"""
+    return (*load_master(master_file), read_default_sales(customer_file))
+
+def data_row_mask(df: pd.DataFrame) -> pd.Series:
+    """数据行: 有 Customer ID 且至少一个桶为数字(只做判定, 桶列原值不变)"""
+    any_num = np.zeros(len(df), dtype=bool)
+    for bucket in PIVOT_BUCKETS:    # 逐列判定, 不生成整块数值副本
+        any_num |= pd.to_numeric(df[bucket], errors="coerce").notna().to_numpy()
+    return df['Customer ID'].notna() & any_num
+
+def _data_rows_or_all(df: pd.DataFrame) -> np.ndarray:
+    """分块读取总表时的 row_filter; 缺必要列时整块保留, 由之后的 validate_columns 报错"""
+    if 'Customer ID' not in df.columns or any(b not in df.columns for b in PIVOT_BUCKETS):
+        return np.ones(len(df), dtype=bool)
+    return data_row_mask(df).to_numpy()
+
+def attach_salesman(raw_df: pd.DataFrame, default_sales_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    按 Customer ID 匹配客户表的 Salesman(追加为最后一列), 匹配不到的记为 Unassigned。
+    两边编号先按 customer_key 规范化, 1001 与 '1001' 视为同一客户。
+    """
+    pos = sales_index(default_sales_df).positions(raw_df['Customer ID'])
+    merged = raw_df.reset_index(drop=True)
+    salesman = pd.Series(default_sales_df['Salesman'].array.take(pos, allow_fill=True), name='Salesman')
+    merged['Salesman'] = to_category(salesman.fillna('Unassigned'))
+    return merged
+
+def rollup_sheet_levels(columns, company_col: str | None) -> dict[str, list[list[str]]]:
+    """ROLLUP_SHEETS 中各表实际的层级: 'Company' 换成公司列, columns 中没有的列(及因此变空的层)跳过"""
+    columns = set(columns)
+    out = {}
+    for name, levels in ROLLUP_SHEETS.items():
+        kept = []
+        for level in levels:
+            cols = [company_col if k == 'Company' else k for k in _level_cols(level)]
+            cols = [c for c in cols if c is not None and c in columns]
+            if cols:
+                kept.append(cols)
+        if kept:
+            out[name] = kept
+    return out
+
+def pivot_group_keys(rollups: dict[str, list[list[str]]]) -> list[str]:
+    """最细一层的分组列: Salesman + 各小计表用到的全部列"""
+    return list(dict.fromkeys(['Salesman', *(k for levels in rollups.values()
+                                             for level in levels for k in level)]))
+
+def pivot_sheets(finest: pd.DataFrame, rollups: dict[str, list[list[str]]],
+                 company_col: str | None = None) -> dict[str, pd.DataFrame]:
+    """
+    由最细粒度的定点汇总合并出 Pivot 与各小计表, 并转成 float。
+    只有一家公司时, 最外层按公司分层的小计表跳过(只是 Pivot 多一行小计)。
+    """
+    tables = {'Pivot': pivot_fixed5(finest, 'Salesman', PIVOT_BUCKETS)}
+    for name, levels in rollups.items():
+        if company_col is not None and levels[0] == [company_col] and finest[company_col].nunique() <= 1:
+            continue
+        tables[name] = rollup_fixed5(finest, levels, PIVOT_BUCKETS)
+
+    # ======= 导出前：转成 float（Excel 里可继续运算；显示位数交给 Excel）=======
+    for table in tables.values():
+        for c in PIVOT_BUCKETS + ['Total']:
+            table[c] = fixed5_to_float(table[c])
+    return tables
+
+def build_company_sheets(raw_df: pd.DataFrame, default_sales_df: pd.DataFrame,
+                         progress=_no_progress, company_col: str | None = None) -> dict[str, pd.DataFrame]:
+    """
+    对单个公司的数据行匹配 Salesman 并汇总, 返回 Pivot / ROLLUP_SHEETS 各小计表 / Default Sales / Raw。
+    company_col 不传时自动查找; 找不到则按公司分层的小计表跳过公司列。
+    """
+    if company_col is None:
+        try:
+            company_col = find_company_col(raw_df)
+        except ValueError:
+            pass
+    # 匹配 Salesman
+    progress("匹配 Salesman…")
+    with profile_stage("merge_salesman", rows=len(raw_df)):
+        merged_raw_df = attach_salesman(raw_df, default_sales_df)
+
+    # ======= 关键：金额桶列按 5 位小数定点整数(×10^5)参与运算, 与 Decimal 逐位一致 =======
+    rollups = rollup_sheet_levels(merged_raw_df.columns, company_col)
+    group_keys = pivot_group_keys(rollups)
+    with profile_stage("to_fixed5", rows=len(merged_raw_df)):
+        fixed = pd.DataFrame({k: merged_raw_df[k] for k in group_keys})
+        for i, bucket in enumerate(PIVOT_BUCKETS):
+            progress("汇总账龄…", i, len(PIVOT_BUCKETS))
+            k, neg_zero = to_fixed5(merged_raw_df[bucket])
+            fixed[bucket] = k
+            merged_raw_df[bucket] = fixed5_to_float(k, neg_zero)
+
+    # 透视/汇总 + Total（整数求和, 无浮点误差）
+    # 原始行只按全部分组列分组一次; Pivot 和各小计表都从这份最细的明细合并, 与桶数/层数无关
+    with profile_stage("aggregate", rows=len(fixed)):
+        finest = group_fixed5(fixed, group_keys, PIVOT_BUCKETS).reset_index()
+        tables = pivot_sheets(finest, rollups, company_col)
 
-    # 读取客户-业务员映射
-    default_sales_df = pd.read_excel(customer_file, sheet_name='export')
-    validate_columns(default_sales_df, ['Number', 'Salesman'], 'Customer sheet (export)')
-    default_sales_df = default_sales_df[['Number', 'Name', 'Salesman']].drop_duplicates(subset=['Number'])
+    return {
+        **tables,
+        'Default Sales': default_sales_df,
+        'Raw': merged_raw_df
+    }
+
+def generate_pivot(master_file: str, customer_file: str, output_file: str, root: Tk,
+                   master_future=None, sales_future=None):
+    """master_future / sales_future 为后台预读任务(load_master / read_default_sales); 不传则当场读取"""
+    if master_future is not None:
+        master_df, company_col, companies = wait_for(root, master_future, "正在读取总表…")
+    else:
+        master_df, company_col, companies = load_master(master_file)
+    if sales_future is not None:
+        default_sales_df = wait_for(root, sales_future, "正在读取 Customer 文件…")
+    else:
+        default_sales_df = read_default_sales(customer_file)
 
-    # 仅从“数据行”提取公司列表
-    # （这里只是识别哪些是有效数据行，不改变原值）
-    companies = extract_companies_for_choice(master_df, company_col)
     if not companies:
         raise ValueError("未识别到可用公司。请确认总表的数据区(非说明区)中存在公司名称。")
 
@@ -310,92 +1672,829 @@ def generate_pivot(master_file: str, customer_file: str, output_file: str, root:
         messagebox.showwarning("取消", "未选择公司, 程序已退出。", parent=root)
         return False
 
-    # 过滤出所选公司的数据行
-    # 注意：这里不要把桶列转 numeric，不然会提前进 float
-    aging_num_probe = master_df[PIVOT_BUCKETS].apply(pd.to_numeric, errors="coerce")
-    mask_data_row = master_df['Customer ID'].notna() & aging_num_probe.notna().any(axis=1)
-    raw_df = master_df.loc[
-        mask_data_row & (master_df[company_col].astype(str).str.strip() == chosen_company),
-    ].copy()
+    unmatched = []
 
-    if raw_df.empty:
-        raise ValueError(f"公司 {chosen_company} 在数据区没有记录。")
+    def job(progress):
+        if INCREMENTAL_ENABLED:
+            # 与上次同一总表的状态比对, 只重算变化的行
+            progress("增量比对…")
+            inc, _ = load_incremental(master_file, master_df, company_col, default_sales_df)
+            sheets = inc.company_sheets(chosen_company, default_sales_df)
+        else:
+            # 过滤出所选公司的数据行
+            progress("筛选数据行…")
+            with profile_stage("filter_company", rows=len(master_df)):
+                raw_df = master_df.loc[company_keys(master_df[company_col]) == chosen_company]
 
-    # 匹配 Salesman
-    merged_raw_df = raw_df.merge(
-        default_sales_df[['Number','Salesman']],
-        how='left',
-        left_on='Customer ID',
-        right_on='Number'
-    ).drop(columns=['Number'])
-    merged_raw_df['Salesman'] = merged_raw_df['Salesman'].fillna('Unassigned')
-
-    # ======= 关键：把金额桶列转为 Decimal(5位) 再参与运算 =======
-    merged_raw_df = df_to_dec5(merged_raw_df, PIVOT_BUCKETS)
-
-    # 透视/汇总（对每个桶列做 Decimal 求和）
-    gb = merged_raw_df.groupby('Salesman', dropna=False)
-    pivot_data = {}
+            if raw_df.empty:
+                raise ValueError(f"公司 {chosen_company} 在数据区没有记录。")
+
+            sheets = build_company_sheets(raw_df, default_sales_df, progress, company_col)
+        unmatched.append(unmatched_customers(sheets['Raw'], default_sales_df))
+
+        # 输出; 保存失败交回 Tk 线程提示
+        try:
+            with profile_stage("export", rows=sum(len(df) for df in sheets.values())):
+                export_xlsx_multi(sheets, output_file, progress=progress)
+        except RuntimeError as e:
+            return e
+        PROFILER.write(output_file, company=chosen_company)
+        return None
+
+    # 计算与写出放到工作线程, 界面显示进度并可取消
+    try:
+        save_error = run_with_progress(root, f"生成 {chosen_company}", job)
+    except Cancelled:
+        messagebox.showwarning("取消", "已取消, 未生成文件。", parent=root)
+        return False
+    if save_error is not None:
+        messagebox.showerror("错误", f"保存Excel失败：\n{save_error}", parent=root)
+        return False
+    if len(unmatched[0]):
+        messagebox.showwarning("提示", describe_unmatched(unmatched[0]), parent=root)
+
+    return True
+
+# ---------- 增量汇总(总表每日重导出, 只处理变化的行) ----------
+# 状态文件(按总表路径存放在缓存目录下)保存: 上次每一数据行的内容指纹及其换算结果
+# (规范化公司名、分组列、Salesman、各桶定点整数), 以及按 公司 × 分组列 的定点汇总。
+# 再次运行时按指纹比对, 只对新增/删除/改动的行匹配 Salesman、换算金额并增减汇总;
+# 表头(列)、分组配置或客户表的 Number/Salesman 变化时整体重建。
+INCREMENTAL_VERSION = 1
+INCREMENTAL_ENABLED = os.environ.get("AR_INCREMENTAL") == "1"
+_COMPANY_KEY = '_company'   # 规范化公司名
+_NEG_COL = '_neg'           # 各桶负零标记, 第 i 位对应 PIVOT_BUCKETS[i]
+_ROWS_COL = 'rows'          # 汇总里每组的行数, 减到 0 的组删除
+
+def row_fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """
+    逐行内容指纹(uint64, 含 Customer ID 在内的全部列)。
+    object 值按 repr 参与哈希, 1 / 1.0 / '1' 不会被当成同一行; category 列只对类别算一次。
+    """
+    hashed = {}
+    for c, col in df.items():
+        col = col.reset_index(drop=True)
+        if isinstance(col.dtype, pd.CategoricalDtype) and col.cat.categories.dtype == object:
+            lookup = pd.util.hash_array(np.array([repr(v) for v in col.cat.categories], dtype=object))
+            col = pd.Series(np.append(lookup, np.uint64(0))[col.cat.codes.to_numpy()])
+        elif col.dtype == object:
+            col = col.map(repr)
+        hashed[c] = col
+    return pd.util.hash_pandas_object(pd.DataFrame(hashed), index=False).to_numpy()
+
+def _match_rows(old_fp: np.ndarray, new_fp: np.ndarray):
+    """按指纹配对新旧行(相同内容的多行按出现顺序一一配对), 返回 (旧行号, 新行号)"""
+    old = pd.DataFrame({'fp': old_fp})
+    old['n'] = old.groupby('fp').cumcount()
+    new = pd.DataFrame({'fp': new_fp})
+    new['n'] = new.groupby('fp').cumcount()
+    m = new.reset_index().merge(old.reset_index(), on=['fp', 'n'], suffixes=('_new', '_old'))
+    return m['index_old'].to_numpy(), m['index_new'].to_numpy()
+
+def _unmatched(n: int, matched: np.ndarray) -> np.ndarray:
+    """0..n-1 中没有配对上的行号"""
+    keep = np.ones(n, dtype=bool)
+    keep[matched] = False
+    return np.flatnonzero(keep)
+
+def _compare_signature(old: dict | None, new: dict) -> str | None:
+    """状态不能沿用的原因; 可以沿用返回 None"""
+    if old is None:
+        return "没有上次的状态"
+    names = {'columns': "总表表头", 'company_col': "公司列", 'group_keys': "分组配置", 'sales': "客户表映射"}
+    changed = [label for key, label in names.items() if old.get(key) != new.get(key)]
+    return f"{'/'.join(changed)}有变化" if changed else None
+
+class IncrementalPivot:
+    """
+    增量汇总状态。update() 与新的紧凑总表比对并只处理变化的行;
+    company_sheets() 直接由汇总和逐行换算结果生成与 build_company_sheets 相同的各表。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.signature = None
+        self.fingerprints = np.zeros(0, dtype=np.uint64)
+        self.rows = None        # 与总表数据行逐行对齐的换算结果
+        self.finest = None      # 公司 × 分组列 的定点汇总(含行数)
+        self.rollups = {}
+        self.company_col = None
+        self.master_df = None   # 本次的总表(不保存)
+
+    @classmethod
+    def for_master(cls, master_file: str) -> IncrementalPivot:
+        key = hashlib.sha1(os.path.abspath(master_file).encode("utf-8")).hexdigest()[:20]
+        inc = cls(os.path.join(CACHE_DIR, "incremental", key + ".pkl"))
+        inc.load()
+        return inc
+
+    def load(self):
+        try:
+            state = pd.read_pickle(self.path)
+        except Exception:
+            return  # 没有/损坏的状态文件: 下次 update 整体重建
+        if state.get("version") == INCREMENTAL_VERSION:
+            self.signature, self.fingerprints = state["signature"], state["fingerprints"]
+            self.rows, self.finest = state["rows"], state["finest"]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        pd.to_pickle({"version": INCREMENTAL_VERSION, "signature": self.signature,
+                      "fingerprints": self.fingerprints, "rows": self.rows, "finest": self.finest}, tmp)
+        os.replace(tmp, self.path)
+
+    def _row_table(self, df: pd.DataFrame, company_col: str, default_sales_df: pd.DataFrame,
+                   group_keys: list[str]) -> pd.DataFrame:
+        """对若干数据行匹配 Salesman 并换算定点金额(与 build_company_sheets 同一套函数)"""
+        merged = attach_salesman(df, default_sales_df)
+        rows = pd.DataFrame({_COMPANY_KEY: company_keys(merged[company_col])})
+        for k in group_keys:
+            rows[k] = merged[k]
+        neg = np.zeros(len(merged), dtype=np.uint8)
+        for i, bucket in enumerate(PIVOT_BUCKETS):
+            k, neg_zero = to_fixed5(merged[bucket])
+            rows[bucket] = k
+            neg |= neg_zero.astype(np.uint8) << i
+        rows[_NEG_COL] = neg
+        return rows
+
+    def _grouped(self, rows: pd.DataFrame, keys: list[str], sign: int = 1) -> pd.DataFrame:
+        fixed = rows[keys + PIVOT_BUCKETS].assign(**{_ROWS_COL: 1})
+        out = group_fixed5(fixed, keys, PIVOT_BUCKETS + [_ROWS_COL]).reset_index()
+        if sign < 0:
+            out[PIVOT_BUCKETS + [_ROWS_COL]] = -out[PIVOT_BUCKETS + [_ROWS_COL]]
+        return out
+
+    def update(self, master_df: pd.DataFrame, company_col: str, default_sales_df: pd.DataFrame) -> dict:
+        """
+        与上次状态比对并更新(不写盘, 见 save)。
+        返回 {'mode': 'incremental'/'full', 'reason', 'added', 'removed', 'unchanged'}
+        """
+        self.master_df, self.company_col = master_df, company_col
+        self.rollups = rollup_sheet_levels([*master_df.columns, 'Salesman'], company_col)
+        group_keys = pivot_group_keys(self.rollups)
+        keys = [_COMPANY_KEY] + group_keys
+        signature = {
+            'columns': [repr(c) for c in master_df.columns],
+            'company_col': repr(company_col),
+            'group_keys': repr(group_keys),
+            'sales': hashlib.sha1(row_fingerprints(default_sales_df[['Number', 'Salesman']]).tobytes()).hexdigest(),
+        }
+        with profile_stage("fingerprint", rows=len(master_df)):
+            fp = row_fingerprints(master_df)
+
+        reason = _compare_signature(self.signature, signature) if self.rows is not None else "没有上次的状态"
+        if reason is None:
+            old_pos, new_pos = _match_rows(self.fingerprints, fp)
+            removed = _unmatched(len(self.fingerprints), old_pos)
+        else:
+            old_pos = new_pos = removed = np.zeros(0, dtype=np.int64)
+        added = _unmatched(len(fp), new_pos)
+
+        with profile_stage("changed_rows", rows=len(added)):
+            new_rows = self._row_table(master_df.iloc[added], company_col, default_sales_df, group_keys)
+
+        with profile_stage("apply_delta", rows=len(added) + len(removed)):
+            parts = [self._grouped(new_rows, keys)]
+            if reason is None:
+                parts.append(self.finest)
+                if len(removed):
+                    parts.append(self._grouped(self.rows.iloc[removed], keys, sign=-1))
+            finest = group_fixed5(pd.concat(parts, ignore_index=True), keys,
+                                  PIVOT_BUCKETS + [_ROWS_COL]).reset_index()
+            self.finest = finest.loc[finest[_ROWS_COL] != 0].reset_index(drop=True)
+
+            # 逐行表按新总表的行序排列: 未变的行沿用上次的换算结果
+            kept = self.rows.iloc[old_pos] if reason is None else new_rows.iloc[:0]
+            rows = pd.concat([kept, new_rows], ignore_index=True)
+            rows = rows.iloc[np.argsort(np.concatenate([new_pos, added]), kind="stable")]
+            self.rows = pd.DataFrame({c: to_category(col, any_type=True) if c in keys else col
+                                      for c, col in rows.reset_index(drop=True).items()})
+
+        self.signature, self.fingerprints = signature, fp
+        self._index_companies()
+        return {'mode': 'full' if reason else 'incremental', 'reason': reason,
+                'added': len(added), 'removed': len(removed), 'unchanged': len(new_pos)}
+
+    def _index_companies(self):
+        """各公司在逐行表/汇总里的位置, 批量生成时不必每家公司都扫一遍"""
+        self._row_pos = self.rows.groupby(_COMPANY_KEY, observed=True).indices
+        self._finest_pos = self.finest.groupby(_COMPANY_KEY, observed=True).indices
+
+    def company_sheets(self, company: str, default_sales_df: pd.DataFrame) -> dict[str, pd.DataFrame]:
+        """单个公司的 Pivot / 小计表 / Default Sales / Raw, 结果与 build_company_sheets 相同"""
+        sel = self._row_pos.get(company)
+        if sel is None:
+            raise ValueError(f"公司 {company} 在数据区没有记录。")
+        finest = self.finest.iloc[self._finest_pos[company]].drop(columns=[_COMPANY_KEY, _ROWS_COL])
+        tables = pivot_sheets(finest, self.rollups, self.company_col)
+
+        raw = self.master_df.iloc[sel].reset_index(drop=True)
+        rows = self.rows.iloc[sel].reset_index(drop=True)
+        neg = rows[_NEG_COL].to_numpy()
+        for i, bucket in enumerate(PIVOT_BUCKETS):
+            raw[bucket] = fixed5_to_float(rows[bucket].to_numpy(), (neg >> i) & 1)
+        raw['Salesman'] = rows['Salesman']
+        return {**tables, 'Default Sales': default_sales_df, 'Raw': raw}
+
+def load_incremental(master_file: str, master_df: pd.DataFrame, company_col: str,
+                     default_sales_df: pd.DataFrame) -> tuple[IncrementalPivot, dict]:
+    """读入该总表的增量状态, 与本次总表比对更新并写回, 返回 (状态, 比对统计)"""
+    inc = IncrementalPivot.for_master(master_file)
+    stats = inc.update(master_df, company_col, default_sales_df)
+    inc.save()
+    return inc, stats
+
+def describe_incremental(stats: dict) -> str:
+    if stats['mode'] == 'full':
+        return f"整体重建({stats['reason']}): {stats['added']} 行"
+    return f"增量更新: 新增/改动 {stats['added']} 行, 删除/改动前 {stats['removed']} 行, 未变 {stats['unchanged']} 行"
+
+# ---------- 批量模式(无界面, 多进程) ----------
+def _safe_filename(name: str) -> str:
+    return re.sub(r'[\\/:*?"<>|]+', '_', name).strip() or '_'
+
+def _plan_outputs(out_dir: str, names: dict) -> dict:
+    """
+    {任务: 文件名} -> {任务: (输出路径, 错误或 None)}。去掉非法字符后 "A/B" 与 "A:B" 会变成同名,
+    Windows/macOS 上只差大小写的也是同一个文件, 所以不区分大小写比较; 重名的后者记为错误, 不写出。
+    """
+    planned, taken = {}, set()
+    for key, name in names.items():
+        output = os.path.join(out_dir, _safe_filename(name))
+        folded = os.path.normcase(os.path.abspath(output)).casefold()
+        planned[key] = (output, f"输出文件重名: {output}" if folded in taken else None)
+        taken.add(folded)
+    return planned
+
+def _batch_worker(raw_df: pd.DataFrame, default_sales_df: pd.DataFrame, output_file: str):
+    """子进程: 单个公司汇总 + 写出, 返回 (行数, 计算耗时, 写出耗时)"""
+    PROFILER.reset()
+    t0 = time.perf_counter()
+    sheets = build_company_sheets(raw_df, default_sales_df)
+    t1 = time.perf_counter()
+    with profile_stage("export", rows=sum(len(df) for df in sheets.values())):
+        export_xlsx_multi(sheets, output_file)
+    PROFILER.write(output_file)
+    return len(raw_df), t1 - t0, time.perf_counter() - t1
+
+def _export_worker(sheets: dict[str, pd.DataFrame], output_file: str, rows: int, compute_s: float):
+    """子进程: 只写出主进程(增量模式)已生成的各表, 返回值同 _batch_worker"""
+    PROFILER.reset()
+    t0 = time.perf_counter()
+    with profile_stage("export", rows=sum(len(df) for df in sheets.values())):
+        export_xlsx_multi(sheets, output_file)
+    PROFILER.write(output_file)
+    return rows, compute_s, time.perf_counter() - t0
+
+def _pick_companies(all_companies: list[str], companies: list[str] | None):
+    """返回 (要生成的公司, 数据区里没有的公司对应的失败结果)"""
+    if not companies:
+        return all_companies, []
+    known = set(all_companies)
+    missing = [{'company': c, 'output': None, 'rows': 0, 'compute_s': 0.0,
+                'write_s': 0.0, 'error': "公司在数据区没有记录"} for c in companies if c not in known]
+    return [c for c in companies if c in known], missing
+
+def _report_unmatched(master_df: pd.DataFrame, default_sales_df: pd.DataFrame, out_dir: str):
+    unmatched = unmatched_customers(master_df, default_sales_df)
+    if len(unmatched):
+        os.makedirs(out_dir, exist_ok=True)
+        report = os.path.join(out_dir, "Unassigned Customers.csv")
+        unmatched.to_csv(report, index=False, encoding="utf-8-sig")
+        print(f"{describe_unmatched(unmatched)}\n明细见 {report}")
+
+def run_batch(master_file: str, customer_file: str, out_dir: str,
+              companies: list[str] | None = None, workers: int | None = None,
+              name_template: str = "{company}.xlsx", incremental: bool = False) -> list[dict]:
+    """
+    只读一次总表与客户表, 为每个公司(或 companies 指定的子集)各生成一个工作簿。
+    各公司的汇总与写出分发到进程池; 单个公司失败不影响其它公司。
+    incremental: 与上次同一总表的状态比对, 只重算变化的行, 各表在主进程生成, 进程池只负责写出
+    (与全量重算逐格一致, 见 tests/test_incremental.py)。
+    返回每个公司的结果 dict(company/output/rows/compute_s/write_s/error)。
+    """
+    t0 = time.perf_counter()
+    master_df, company_col, all_companies, default_sales_df = load_inputs(master_file, customer_file)
+    print(f"读取完成: {len(master_df)} 行, {len(all_companies)} 家公司, 用时 {time.perf_counter() - t0:.2f}s")
+
+    targets, results = _pick_companies(all_companies, companies)
+    _report_unmatched(master_df, default_sales_df, out_dir)
+
+    if incremental:
+        t1 = time.perf_counter()
+        inc, stats = load_incremental(master_file, master_df, company_col, default_sales_df)
+        print(f"{describe_incremental(stats)}, 用时 {time.perf_counter() - t1:.2f}s")
+    else:
+        # 一次性按公司切分数据行(master_df 已只含数据行), 子进程只收到本公司的行
+        groups = dict(tuple(master_df.groupby(company_keys(master_df[company_col]), sort=False, observed=True)))
+
+    os.makedirs(out_dir, exist_ok=True)
+    planned = _plan_outputs(out_dir, {c: name_template.format(company=c) for c in targets})
+    jobs = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for company in targets:
+            output_file, error = planned[company]
+            if error:
+                results.append({'company': company, 'output': None, 'rows': 0, 'compute_s': 0.0,
+                                'write_s': 0.0, 'error': error})
+                continue
+            if not incremental:
+                fut = pool.submit(_batch_worker, drop_unused_categories(groups[company]), default_sales_df, output_file)
+                jobs[fut] = (company, output_file)
+                continue
+            t1 = time.perf_counter()
+            sheets = inc.company_sheets(company, default_sales_df)
+            compute_s = time.perf_counter() - t1
+            fut = pool.submit(_export_worker, sheets, output_file, len(sheets['Raw']), compute_s)
+            jobs[fut] = (company, output_file)
+        for fut in as_completed(jobs):
+            company, output_file = jobs[fut]
+            res = {'company': company, 'output': output_file, 'rows': 0,
+                   'compute_s': 0.0, 'write_s': 0.0, 'error': None}
+            try:
+                res['rows'], res['compute_s'], res['write_s'] = fut.result()
+            except Exception as e:
+                res['error'] = f"{type(e).__name__}: {e}"
+            results.append(res)
+
+    results.sort(key=lambda r: r['company'])
+    print_batch_summary(results, time.perf_counter() - t0)
+    PROFILER.write(os.path.join(out_dir, "batch"), results=results)
+    return results
+
+def print_batch_summary(results: list[dict], total_s: float):
+    failed = [r for r in results if r['error']]
+    print(f"\n{'公司':<30} {'行数':>8} {'计算(s)':>9} {'写出(s)':>9}  状态")
+    for r in results:
+        status = f"失败: {r['error']}" if r['error'] else "OK"
+        name = f"{r['as_of']} {r['company']}" if r.get('as_of') else r['company']
+        print(f"{name[:30]:<30} {r['rows']:>8} {r['compute_s']:>9.2f} {r['write_s']:>9.2f}  {status}")
+    print(f"\n共 {len(results)} 家, 成功 {len(results) - len(failed)}, 失败 {len(failed)}, 总用时 {total_s:.2f}s")
+
+# ---------- 多期趋势汇总(无界面, 多进程) ----------
+# 文件名里的 年-月(如 AR_2025-03.xlsx / AR 202503.xlsx) 作为期间; 取不到时用文件名本身
+PERIOD_PATTERN = re.compile(r'(?<!\d)(20\d{2})[-_. ]?(0[1-9]|1[0-2])(?!\d)')
+MASTER_SUFFIXES = ('.xlsx', '.xlsm')
+
+def period_of(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    m = PERIOD_PATTERN.search(stem)
+    return f"{m.group(1)}-{m.group(2)}" if m else stem
+
+def expand_master_paths(paths: list[str]) -> list[str]:
+    """文件原样保留; 目录展开为其中的 xlsx/xlsm(跳过 Excel 的 ~$ 临时文件)"""
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out.extend(os.path.join(p, f) for f in sorted(os.listdir(p))
+                       if f.lower().endswith(MASTER_SUFFIXES) and not f.startswith('~$'))
+        else:
+            out.append(p)
+    return out
+
+def _period_worker(master_file: str, default_sales_df: pd.DataFrame, companies: list[str] | None):
+    """
+    子进程: 读一期总表(表头探测/缓存同 load_master), 按 公司 × Salesman 汇总各桶(定点整数)。
+    只把汇总结果传回主进程, 原始行不出子进程。返回 (汇总表, 数据行数)
+    """
+    master_df, company_col, all_companies = load_master(master_file)
+    keys = company_keys(master_df[company_col])
+    sel = keys.isin(companies or all_companies).to_numpy()
+    slim = pd.DataFrame({'Company': keys[sel].to_numpy(),
+                         **{c: master_df[c].to_numpy()[sel] for c in ['Customer ID'] + PIVOT_BUCKETS}})
+    merged = attach_salesman(slim, default_sales_df)
+    fixed = pd.DataFrame({'Company': merged['Company'], 'Salesman': merged['Salesman']})
     for bucket in PIVOT_BUCKETS:
-        pivot_data[bucket] = gb[bucket].apply(sum_dec)
+        fixed[bucket] = to_fixed5(merged[bucket])[0]
+    return group_fixed5(fixed, ['Company', 'Salesman'], PIVOT_BUCKETS).reset_index(), len(slim)
 
-    pivot_table = pd.DataFrame(pivot_data).reset_index()
+def _period_sort_key(period: str):
+    """年-月 期间按时间排在前, 其余(文件名)按名称排在后"""
+    return (re.fullmatch(r'\d{4}-\d{2}', period) is None, period)
 
-    # Total = 各桶列逐行 Decimal 求和（保持 5 位）
-    pivot_table['Total'] = pivot_table[PIVOT_BUCKETS].apply(
-        lambda row: sum((v if isinstance(v, Decimal) else to_dec5(v)) for v in row).quantize(DEC5, rounding=ROUND_HALF_UP),
-        axis=1
-    )
+def build_trend_sheets(periods: pd.DataFrame, by_company: bool = True) -> dict[str, pd.DataFrame]:
+    """
+    periods: 各期的 Period/Company/Salesman/各桶 定点汇总。
+    每个桶(及 Total)一张趋势表: 行为(公司,)Salesman, 列为各期间, 末行为各期合计;
+    另附长表 By Period(每期每行一个 Salesman)。
+    """
+    keys = ['Company', 'Salesman'] if by_company else ['Salesman']
+    order = sorted(periods['Period'].unique(), key=_period_sort_key)
+    long = periods.groupby(['Period'] + keys, observed=True)[PIVOT_BUCKETS].sum()
+    long = _add_total(long, PIVOT_BUCKETS).reset_index()
+    rank = long['Period'].map({p: i for i, p in enumerate(order)}).to_numpy()
+    long = long.iloc[np.argsort(rank, kind="stable")].reset_index(drop=True)
+
+    sheets = {}
+    grand = ('Grand Total',) + ('',) * (len(keys) - 1)
+    for c in PIVOT_BUCKETS + ['Total']:
+        # 用 Python int 展开, 缺的期间补 0, 合计行也是精确整数求和
+        wide = long.set_index(keys + ['Period'])[c].astype(object).unstack('Period')
+        wide = wide.reindex(columns=order).fillna(0)
+        wide.loc[grand if by_company else grand[0], :] = wide.sum()
+        out = wide.reset_index()
+        for p in order:
+            out[p] = fixed5_to_float(out[p].to_numpy())
+        out.columns = [str(col) for col in out.columns]
+        sheets[f"Trend {c}"] = out
+    for c in PIVOT_BUCKETS + ['Total']:
+        long[c] = fixed5_to_float(long[c])
+    sheets['By Period'] = long
+    return sheets
+
+def run_trend(master_files: list[str], customer_file: str, output_file: str,
+              companies: list[str] | None = None, workers: int | None = None) -> list[dict]:
+    """
+    多期趋势: 各期总表分发到进程池并发读取, 每期在子进程内就汇总成 公司 × Salesman 的小表,
+    主进程按到达顺序收集汇总结果(内存只与汇总行数有关), 最后写出各桶的跨期趋势表。
+    单个文件失败不影响其它期间。返回每个文件的结果 dict(file/period/rows/seconds/error)。
+    """
+    t0 = time.perf_counter()
+    files = expand_master_paths(master_files)
+    by_period = {}
+    for f in files:
+        by_period.setdefault(period_of(f), []).append(f)
+    dup = {p: fs for p, fs in by_period.items() if len(fs) > 1}
+    if dup:
+        raise ValueError("多个文件对应同一期间: " + "; ".join(f"{p}: {', '.join(fs)}" for p, fs in dup.items()))
+    if not files:
+        raise ValueError("没有找到总表文件。")
+    # 先建好输出目录, 免得各期读完汇总完才在写出时失败
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    default_sales_df = read_default_sales(customer_file)
+
+    results, parts = [], []
+    with ProcessPoolExecutor(max_workers=workers or min(len(files), os.cpu_count() or 1)) as pool:
+        jobs = {pool.submit(_period_worker, f, default_sales_df, companies): (f, time.perf_counter()) for f in files}
+        for fut in as_completed(jobs):
+            f, started = jobs[fut]
+            res = {'file': f, 'period': period_of(f), 'rows': 0, 'seconds': 0.0, 'error': None}
+            try:
+                agg, res['rows'] = fut.result()
+                agg.insert(0, 'Period', res['period'])
+                parts.append(agg)
+            except Exception as e:
+                res['error'] = f"{type(e).__name__}: {e}"
+            res['seconds'] = time.perf_counter() - started
+            print(f"  {res['period']:<12} {res['rows']:>8} 行  {res['error'] or 'OK'}", flush=True)
+            results.append(res)
+
+    results.sort(key=lambda r: r['period'])
+    if parts:
+        periods = pd.concat(parts, ignore_index=True)
+        sheets = build_trend_sheets(periods, by_company=not (companies and len(companies) == 1))
+        export_xlsx_multi(sheets, output_file)
+        print(f"已写出 {output_file}")
+    failed = sum(1 for r in results if r['error'])
+    print(f"共 {len(results)} 期, 成功 {len(results) - failed}, 失败 {failed}, 总用时 {time.perf_counter() - t0:.2f}s")
+    return results
+
+# ---------- 发票级账龄(按到期日计算各桶, 多个截止日一次读入) ----------
+# 默认的发票表列名, 可用 --amount-col / --due-col 覆盖; 公司列与 Customer ID 同总表
+INVOICE_AMOUNT_COL = 'Amount'
+INVOICE_DUE_COL = 'Due Date'
+# 各桶的逾期天数上限(含), 与 PIVOT_BUCKETS 对应: 未逾期(≤0)为 Current, 1-30 … 366-730, 其余为 731+
+AGING_DAYS = [0, 30, 60, 90, 365, 730]
+EXCEL_EPOCH = '1899-12-30'      # Excel 日期序列号 0 对应的日期(1900 日期系统)
+EXCEL_MAX_SERIAL = 2958466      # 9999-12-31 之后
+_DUE_DAY = '_due_day'           # 缓存表里的到期日天序号列
+_NO_DUE = -2 ** 63              # NaT 的整数值: 认不出的到期日
+# 文字到期日的日/月顺序须与发票表一致(--date-order), 不去猜 03/04/2024 是 3 月还是 4 月。
+# 年份在前的写法没有歧义, 各顺序都认; 其余写法只按指定的顺序解析, 解析不了的计为失败。
+DATE_ORDERS = {
+    'ymd': [],
+    'dmy': ['%d/%m/%Y', '%d.%m.%Y', '%d-%m-%Y'],
+    'mdy': ['%m/%d/%Y', '%m.%d.%Y', '%m-%d-%Y'],
+}
+INVOICE_DATE_ORDER = 'ymd'
+_YMD_FORMATS = ['%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d']
+
+def invoice_header(due_col: str):
+    """发票表的表头: 同一行里同时出现 Customer 与到期日列名"""
+    due = due_col.strip().lower()
+    def is_header(values) -> bool:
+        s = [str(v).strip().lower() for v in values]
+        return any("customer" in v for v in s) and due in s
+    return is_header
+
+def day_number(d: date) -> int:
+    """日期 -> 1970-01-01 起的天数"""
+    return int(np.datetime64(d, 'D').astype(np.int64))
+
+def _parse_date_text(text: pd.Series, date_order: str) -> np.ndarray:
+    """文字日期 -> 天序号, 按 date_order 对应的格式逐个尝试(可带时间部分, 只取日期); 认不出的为 _NO_DUE"""
+    text = text.str.strip().str.split(r'[ T]', n=1, regex=True).str[0]
+    days = np.full(len(text), _NO_DUE, dtype=np.int64)
+    todo = np.arange(len(text))
+    for fmt in _YMD_FORMATS + DATE_ORDERS[date_order]:
+        if not len(todo):
+            break
+        parsed = pd.to_datetime(text.iloc[todo], format=fmt, errors='coerce').to_numpy()
+        ok = ~np.isnat(parsed)
+        days[todo[ok]] = parsed[ok].astype('datetime64[D]').astype(np.int64)
+        todo = todo[~ok]
+    return days
+
+def due_day_numbers(col: pd.Series, date_order: str = INVOICE_DATE_ORDER) -> np.ndarray:
+    """
+    到期日列 -> 1970-01-01 起的天数(int64), 认不出的为 _NO_DUE。
+    日期时间只取日期; 数字按 Excel 日期序列号(单元格没设日期格式时);
+    文字只按年在前或 date_order 指定的日/月顺序解析, 其它写法不猜。
+    """
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col.to_numpy().astype('datetime64[D]').astype(np.int64)
+    vals = np.asarray(col, dtype=object)
+    days = np.full(len(vals), _NO_DUE, dtype=np.int64)
+    num = np.fromiter((_is_plain_number(v) for v in vals), dtype=bool, count=len(vals))
+    if num.any():
+        serial = np.array([float(v) for v in vals[num]])
+        ok = (serial >= 1) & (serial < EXCEL_MAX_SERIAL)
+        days[np.flatnonzero(num)[ok]] = np.floor(serial[ok]).astype(np.int64) + day_number(date.fromisoformat(EXCEL_EPOCH))
+    stamp = np.fromiter((isinstance(v, (date, np.datetime64)) for v in vals), dtype=bool, count=len(vals))
+    if stamp.any():
+        days[stamp] = pd.to_datetime(pd.Series(vals[stamp])).to_numpy().astype('datetime64[D]').astype(np.int64)
+    text = np.fromiter((isinstance(v, str) for v in vals), dtype=bool, count=len(vals))
+    if text.any():
+        days[text] = _parse_date_text(pd.Series(vals[text], dtype=object), date_order)
+    return days
+
+def _read_invoices_compact(invoice_file: str, amount_col: str, due_col: str,
+                           date_order: str = INVOICE_DATE_ORDER) -> pd.DataFrame:
+    wanted = master_usecols()
+    usecols = None if wanted is None else (lambda h: wanted(h) or str(h) in (amount_col, due_col))
+
+    def invoice_rows(df: pd.DataFrame) -> np.ndarray:
+        """数据行: 有 Customer ID 且金额为数字; 缺列时整块保留, 由 validate_columns 报错"""
+        if 'Customer ID' not in df.columns or amount_col not in df.columns:
+            return np.ones(len(df), dtype=bool)
+        return (df['Customer ID'].notna() & pd.to_numeric(df[amount_col], errors="coerce").notna()).to_numpy()
+
+    inv_df = read_master_raw(invoice_file, usecols=usecols, is_header=invoice_header(due_col),
+                             row_filter=invoice_rows)
+    company_col = find_company_col(inv_df)
+    validate_columns(inv_df, [company_col, 'Customer ID', amount_col, due_col], 'Invoice sheet')
+
+    # 这些行的到期日必须认得出, 否则金额会漏算
+    mask = invoice_rows(inv_df)
+    due = due_day_numbers(inv_df[due_col], date_order)
+    bad = np.flatnonzero(mask & (due == _NO_DUE))
+    if len(bad):
+        sample = ", ".join(f"{inv_df['Customer ID'].iat[i]}: {inv_df[due_col].iat[i]!r}" for i in bad[:5])
+        raise ValueError(f"Invoice sheet 有 {len(bad)} 行 {due_col} 解析不了(文字日期按 {date_order} 顺序, "
+                         f"可用 --date-order 指定)。Customer ID: 值 = {sample}")
+
+    with profile_stage("compact_invoices", rows=len(inv_df)):
+        cols = {}
+        for c, s in inv_df.items():
+            s = pd.Series(s.array[mask], name=c)
+            cols[c] = s if c == amount_col else to_category(s, any_type=c in (company_col, 'Customer ID'))
+        cols[_DUE_DAY] = due[mask]
+        return pd.DataFrame(cols)
+
+def load_invoices(invoice_file: str, amount_col: str = INVOICE_AMOUNT_COL, due_col: str = INVOICE_DUE_COL,
+                  date_order: str = INVOICE_DATE_ORDER):
+    """
+    读取并校验发票级明细, 返回 (inv_df, company_col, companies)。
+    inv_df 只含数据行, 另有 _DUE_DAY 列(到期日的天序号); 解析结果与总表一样走缓存。
+    """
+    load_heavy_modules()
+    with profile_stage("read_invoices") as st:
+        inv_df = cached_read(invoice_file,
+                             f"invoices|{amount_col}|{due_col}|{date_order}|{sorted(_master_columns() or [])}",
+                             lambda: _read_invoices_compact(invoice_file, amount_col, due_col, date_order))
+        st["rows"] = len(inv_df)
+    company_col = find_company_col(inv_df)
+    with profile_stage("extract_companies", rows=len(inv_df)):
+        companies = company_choices(company_keys(inv_df[company_col]))
+    return inv_df, company_col, companies
+
+def aging_buckets(due_days: np.ndarray, as_of_days) -> np.ndarray:
+    """
+    到期日天序号 × 各截止日 -> 桶下标矩阵(截止日数 × 行数), 值为 PIVOT_BUCKETS 的下标。
+    逾期天数对 AGING_DAYS 做一次 searchsorted: 恰好等于上限的归入该桶。
+    """
+    overdue = np.asarray(as_of_days, dtype=np.int64)[:, None] - np.asarray(due_days, dtype=np.int64)[None, :]
+    return np.searchsorted(AGING_DAYS, overdue, side='left').astype(np.int8)
 
-    # ======= 导出前：将 Decimal 转成 float（Excel 里可继续运算；显示位数交给 Excel）=======
-    def dec_to_float_df(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
-        for c in cols:
-            if c in df.columns:
-                df[c] = df[c].apply(lambda v: float(v) if isinstance(v, Decimal) else v)
-        return df
+def aged_master(inv_df: pd.DataFrame, buckets: np.ndarray, amounts: np.ndarray) -> pd.DataFrame:
+    """发票行 + 各桶列(金额放在所属的桶, 其余为空), 与 compact_master 之后的总表同形"""
+    out = inv_df.drop(columns=[_DUE_DAY])
+    for i, bucket in enumerate(PIVOT_BUCKETS):
+        out[bucket] = np.where(buckets == i, amounts, np.nan)
+    return out
 
-    pivot_table = dec_to_float_df(pivot_table, PIVOT_BUCKETS + ['Total'])
-    merged_raw_df = dec_to_float_df(merged_raw_df, PIVOT_BUCKETS)
+def aging_snapshots(keys: pd.Series, salesman: pd.Series, fixed: np.ndarray, buckets: np.ndarray,
+                    labels: list[str]) -> pd.DataFrame:
+    """
+    各截止日的 公司 × Salesman 定点汇总(Period 列为截止日), 供 build_trend_sheets 对比。
+    金额只换算一次定点整数, 每个截止日只是按桶下标把同一列金额分到各桶。
+    """
+    parts = []
+    for label, row in zip(labels, buckets):
+        snap = pd.DataFrame({'Company': keys, 'Salesman': salesman})
+        for i, bucket in enumerate(PIVOT_BUCKETS):
+            snap[bucket] = np.where(row == i, fixed, 0)
+        agg = group_fixed5(snap, ['Company', 'Salesman'], PIVOT_BUCKETS).reset_index()
+        agg.insert(0, 'Period', label)
+        parts.append(agg)
+    return pd.concat(parts, ignore_index=True)
 
-    # 输出
+def run_aging(invoice_file: str, customer_file: str, out_dir: str, as_of_dates: list[date],
+              companies: list[str] | None = None, workers: int | None = None,
+              name_template: str = "{company} {as_of}.xlsx", compare_file: str | None = None,
+              amount_col: str = INVOICE_AMOUNT_COL, due_col: str = INVOICE_DUE_COL,
+              date_order: str = INVOICE_DATE_ORDER) -> list[dict]:
+    """
+    发票级账龄: 只读一次发票表与客户表, 对每个截止日按到期日把金额分到 PIVOT_BUCKETS,
+    再按公司走与批量模式相同的 Salesman 汇总与写出(每个 截止日 × 公司 一个工作簿)。
+    截止日多于一个时另写出 compare_file(默认 <out_dir>/AR Aging Compare.xlsx): 各桶跨截止日的对比表。
+    返回每个工作簿的结果 dict(company/as_of/output/rows/compute_s/write_s/error)。
+    """
+    t0 = time.perf_counter()
+    as_of_dates = sorted(set(as_of_dates))
+    labels = [d.isoformat() for d in as_of_dates]
+    if len(labels) > 1 and "{as_of}" not in name_template:
+        raise ValueError("有多个截止日时文件名模板必须包含 {as_of}")
+    inv_df, company_col, all_companies = load_invoices(invoice_file, amount_col, due_col, date_order)
+    default_sales_df = read_default_sales(customer_file)
+    print(f"读取完成: {len(inv_df)} 张发票, {len(all_companies)} 家公司, 用时 {time.perf_counter() - t0:.2f}s")
+
+    targets, missing = _pick_companies(all_companies, companies)
+    _report_unmatched(inv_df, default_sales_df, out_dir)
+
+    # 金额只换算一次; 全部截止日的桶下标一次算出
+    with profile_stage("aging_buckets", rows=len(inv_df) * len(labels)):
+        fixed, neg_zero = to_fixed5(inv_df[amount_col])
+        amounts = fixed5_to_float(fixed, neg_zero)
+        buckets = aging_buckets(inv_df[_DUE_DAY].to_numpy(), [day_number(d) for d in as_of_dates])
+    keys = company_keys(inv_df[company_col])
+    rows_of = keys.groupby(keys, sort=False, observed=True).indices
+
+    os.makedirs(out_dir, exist_ok=True)
+    results = [{**r, 'as_of': label} for label in labels for r in missing]
+    planned = _plan_outputs(out_dir, {(c, label): name_template.format(company=c, as_of=label)
+                                      for label in labels for c in targets})
+    jobs = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for label, row in zip(labels, buckets):
+            aged = aged_master(inv_df, row, amounts)
+            for company in targets:
+                output_file, error = planned[company, label]
+                if error:
+                    results.append({'company': company, 'as_of': label, 'output': None, 'rows': 0,
+                                    'compute_s': 0.0, 'write_s': 0.0, 'error': error})
+                    continue
+                part = drop_unused_categories(aged.take(rows_of[company]).reset_index(drop=True))
+                jobs[pool.submit(_batch_worker, part, default_sales_df, output_file)] = (company, label, output_file)
+            aged = None
+        for fut in as_completed(jobs):
+            company, label, output_file = jobs[fut]
+            res = {'company': company, 'as_of': label, 'output': output_file, 'rows': 0,
+                   'compute_s': 0.0, 'write_s': 0.0, 'error': None}
+            try:
+                res['rows'], res['compute_s'], res['write_s'] = fut.result()
+            except Exception as e:
+                res['error'] = f"{type(e).__name__}: {e}"
+            results.append(res)
+
+    if len(labels) > 1 and targets:
+        sel = keys.isin(targets).to_numpy()
+        slim = pd.DataFrame({'Customer ID': inv_df['Customer ID'].to_numpy()[sel]})
+        salesman = attach_salesman(slim, default_sales_df)['Salesman']
+        with profile_stage("aging_compare", rows=int(sel.sum()) * len(labels)):
+            snapshots = aging_snapshots(keys[sel].reset_index(drop=True), salesman, fixed[sel], buckets[:, sel], labels)
+            sheets = build_trend_sheets(snapshots, by_company=len(targets) > 1)
+        compare_file = compare_file or os.path.join(out_dir, "AR Aging Compare.xlsx")
+        export_xlsx_multi(sheets, compare_file)
+        print(f"已写出 {compare_file}")
+
+    results.sort(key=lambda r: (r['as_of'], r['company']))
+    print_batch_summary(results, time.perf_counter() - t0)
+    PROFILER.write(os.path.join(out_dir, "aging"), results=results)
+    return results
+
+def parse_as_of(text: str) -> date:
+    """--as-of 的值: YYYY-MM-DD"""
     try:
-        export_xlsx_multi(
-            {
-                'Pivot': pivot_table,
-                'Default Sales': default_sales_df,
-                'Raw': merged_raw_df
-            },
-            output_file
-        )
-    except Exception as e:
-        messagebox.showerror("错误", f"保存Excel失败：\n{e}", parent=root)
-        return False
+        return date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"截止日应为 YYYY-MM-DD: {text}")
 
-    return True
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="AR 账龄透视: 不带参数时启动界面, 带 --batch / --trend / --aging 时无界面运行")
+    ap.add_argument("--batch", action="store_true", help="无界面批量模式")
+    ap.add_argument("--trend", action="store_true", help="多期趋势模式: 汇总 --masters 的各期总表")
+    ap.add_argument("--aging", action="store_true", help="发票级账龄模式: 按 --invoices 的到期日计算各桶")
+    ap.add_argument("--master", help="总表路径")
+    ap.add_argument("--masters", nargs="+", help="趋势模式的各期总表, 可以是文件或目录")
+    ap.add_argument("--invoices", help="账龄模式的发票明细(Company/Customer ID/金额/到期日)")
+    ap.add_argument("--as-of", action="append", type=parse_as_of, dest="as_of",
+                    help="账龄模式的截止日 YYYY-MM-DD, 可重复(一次读入算出多个截止日); 默认今天")
+    ap.add_argument("--amount-col", default=INVOICE_AMOUNT_COL, help=f"发票表的金额列, 默认 {INVOICE_AMOUNT_COL}")
+    ap.add_argument("--due-col", default=INVOICE_DUE_COL, help=f"发票表的到期日列, 默认 {INVOICE_DUE_COL}")
+    ap.add_argument("--date-order", choices=list(DATE_ORDERS), default=INVOICE_DATE_ORDER,
+                    help="文字到期日的年/月/日顺序: ymd(默认, 只认年在前的写法)、dmy(31/12/2024)、mdy(12/31/2024)")
+    ap.add_argument("--out", default=None,
+                    help="趋势模式的输出文件(默认 <out-dir>/AR Trend.xlsx); "
+                         "账龄模式的截止日对比表(默认 <out-dir>/AR Aging Compare.xlsx)")
+    ap.add_argument("--customer", help="Customer 文件路径(export 表)")
+    ap.add_argument("--out-dir", default=".", help="输出目录, 默认当前目录")
+    ap.add_argument("--company", action="append", help="只生成指定公司, 可重复; 默认全部公司")
+    ap.add_argument("--workers", type=int, default=None, help="进程数, 默认 CPU 核数")
+    ap.add_argument("--name", default=None,
+                    help='输出文件名模板, 如 "AR_{company}.xlsx"; 账龄模式默认 "{company} {as_of}.xlsx"')
+    ap.add_argument("--incremental", action="store_true", help="与上次同一总表的结果比对, 只重算变化的行")
+    ap.add_argument("--no-cache", action="store_true", help="本次不读写解析缓存")
+    ap.add_argument("--clear-cache", action="store_true", help="启动前清空解析缓存")
+    ap.add_argument("--profile", action="store_true", help="记录各阶段耗时/内存, 写出 <输出>.profile.json")
+    ap.add_argument("--profile-cprofile", action="store_true", help="同时对最慢阶段写出 cProfile 数据(.prof)")
+    args = ap.parse_args(argv)
+    if args.batch and not (args.master and args.customer):
+        ap.error("--batch 需要同时指定 --master 和 --customer")
+    if args.trend and not (args.masters and args.customer):
+        ap.error("--trend 需要同时指定 --masters 和 --customer")
+    if args.aging and not (args.invoices and args.customer):
+        ap.error("--aging 需要同时指定 --invoices 和 --customer")
+    return args
 
-def main():
+def main_gui():
+    # 重依赖在后台导入, 同时弹出第一个对话框
+    threading.Thread(target=load_heavy_modules, daemon=True).start()
     root = Tk(); root.withdraw()
+    # 选完总表就开始在后台读取/识别表头/提取公司, 选完客户文件再读 export 表
+    pool = ThreadPoolExecutor(max_workers=2)
 
-    master_file = select_file(root, "选择总表(包含所有公司的明细)")
-    if not master_file:
-        messagebox.showwarning("取消", "未选择总表, 程序已退出。", parent=root); return
+    try:
+        master_file = select_file(root, "选择总表(包含所有公司的明细)")
+        if not master_file:
+            messagebox.showwarning("取消", "未选择总表, 程序已退出。", parent=root); return
+        master_future = pool.submit(load_master, master_file)
 
-    customer_file = select_file(root, "选择 Customer 文件(export: Number/Name/Salesman)")
-    if not customer_file:
-        messagebox.showwarning("取消", "未选择客户文件, 程序已退出。", parent=root); return
+        customer_file = select_file(root, "选择 Customer 文件(export: Number/Name/Salesman)")
+        if not customer_file:
+            messagebox.showwarning("取消", "未选择客户文件, 程序已退出。", parent=root); return
+        sales_future = pool.submit(read_default_sales, customer_file)
 
-    output_file = select_save_path(root)
-    if not output_file:
-        messagebox.showwarning("取消", "未选择保存路径, 程序已退出。", parent=root); return
+        # 后台读取已失败就不再让用户选保存路径
+        for fut, name in ((master_future, "总表"), (sales_future, "Customer 文件")):
+            err = _failed(fut)
+            if err is not None:
+                messagebox.showerror("错误", f"读取{name}失败: \n{err}", parent=root); return
 
-    try:
-        ok = generate_pivot(master_file, customer_file, output_file, root)
-        if ok:
-            messagebox.showinfo("完成", f"文件已成功生成：\n{output_file}", parent=root)
-        else:
-            pass
-    except Exception as e:
-        messagebox.showerror("错误", f"发生错误: \n{e}", parent=root)
+        output_file = select_save_path(root)
+        if not output_file:
+            messagebox.showwarning("取消", "未选择保存路径, 程序已退出。", parent=root); return
+
+        try:
+            ok = generate_pivot(master_file, customer_file, output_file, root,
+                                master_future=master_future, sales_future=sales_future)
+            if ok:
+                messagebox.showinfo("完成", f"文件已成功生成：\n{output_file}", parent=root)
+            else:
+                pass
+        except Exception as e:
+            messagebox.showerror("错误", f"发生错误: \n{e}", parent=root)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def main(argv=None):
+    global CACHE_ENABLED, INCREMENTAL_ENABLED
+    args = parse_args(argv)
+    if args.clear_cache:
+        print(f"已清除 {invalidate_cache()} 条解析缓存")
+    if args.no_cache:
+        CACHE_ENABLED = False
+        os.environ["AR_CACHE"] = "0"   # 趋势模式的子进程也不用缓存
+    if args.profile or args.profile_cprofile:
+        # 写进环境变量, 批量模式的子进程也会开启
+        os.environ["AR_PROFILE"] = "1"
+        if args.profile_cprofile:
+            os.environ["AR_PROFILE_CPROFILE"] = "1"
+        PROFILER.enabled, PROFILER.cprofile = True, args.profile_cprofile
+        PROFILER.reset()
+    if args.incremental:
+        INCREMENTAL_ENABLED = True   # 界面模式的 generate_pivot 也走增量
+        os.environ["AR_INCREMENTAL"] = "1"
+    if not (args.batch or args.trend or args.aging):
+        main_gui(); return
+    load_heavy_modules()
+    if args.aging:
+        results = run_aging(args.invoices, args.customer, args.out_dir, args.as_of or [date.today()],
+                            companies=args.company, workers=args.workers,
+                            name_template=args.name or "{company} {as_of}.xlsx", compare_file=args.out,
+                            amount_col=args.amount_col, due_col=args.due_col, date_order=args.date_order)
+        sys.exit(1 if any(r['error'] for r in results) else 0)
+    if args.trend:
+        output_file = args.out or os.path.join(args.out_dir, "AR Trend.xlsx")
+        results = run_trend(args.masters, args.customer, output_file,
+                            companies=args.company, workers=args.workers)
+        sys.exit(1 if any(r['error'] for r in results) else 0)
+    results = run_batch(args.master, args.customer, args.out_dir,
+                        companies=args.company, workers=args.workers, name_template=args.name or "{company}.xlsx",
+                        incremental=args.incremental)
+    sys.exit(1 if any(r['error'] for r in results) else 0)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,597 @@
+"""
+AR Interpreter / ExcelDuplicator 的合成数据基准测试(无界面)。
+
+    python Benchmark.py                          # 默认 1k/10k/100k 行
+    python Benchmark.py --sizes 1000000          # 1M 行需显式指定(生成数据和读表都要几分钟)
+    python Benchmark.py --sizes 1000,10000 --repeat 3
+    python Benchmark.py --compare bench_results/旧结果.json
+
+旧实现的对照项(两遍读表、pandas 导出、线性搜索等)只在不超过 --legacy-max-rows 时运行;
+整本载入 + 逐格复制的 ExcelDuplicator 旧路径(行复制是平方级)只在不超过 --full-load-max-rows 时运行,
+超过的记为 skipped。内存: Linux 上记录计时那次运行的 RSS 峰值增量(rss_mb, 不额外再跑);
+--tracemalloc 时再单独跑一次记录 Python 分配峰值(peak_mb)。
+
+合成数据缓存在 --data-dir(默认 bench_data/), 同样的行数不会重复生成;
+结果写到 --out(默认 bench_results/<时间>.json), 可用 --compare 与旧结果对比。
+"""
+import argparse
+import copy
+import ctypes
+import gc
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP
+
+os.environ.setdefault("AR_CACHE", "0")  # 基准测的是解析本身, 不走解析缓存
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def load_tool(filename: str, name: str):
+    """按文件路径导入工具脚本(文件名带空格, 不能直接 import)"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+ar = load_tool("AR Interpreter.py", "ar_interpreter")
+ed = load_tool("ExcelDuplicator.py", "excel_duplicator")
+
+# ---------- 合成数据 ----------
+WORDS = ["Hong Kong", "Pacific", "Global", "Asia", "Trading", "Tech", "Holdings",
+         "深圳", "科技", "贸易", "Industrial", "Electronics", "Logistics"]
+SUFFIX = ["Ltd", "Limited", "Co., Ltd", "Inc", "有限公司", "Group"]
+
+def _company_names(n: int, rnd: random.Random) -> list[str]:
+    names = set()
+    while len(names) < n:
+        names.add(f"{rnd.choice(WORDS)} {rnd.choice(WORDS)} {rnd.choice(SUFFIX)} {len(names):03d}")
+    return sorted(names)
+
+def _bucket_value(rnd: random.Random):
+    r = rnd.random()
+    if r < 0.35:
+        return None                                  # 空
+    if r < 0.92:
+        return round(rnd.uniform(-5e4, 2e6), rnd.choice((0, 2, 2, 2, 5)))
+    if r < 0.96:
+        return rnd.randrange(-1000, 100000)          # 整数
+    return f"{rnd.uniform(-1e3, 1e5):.2f}"           # 以文本形式存储的数字
+
+def make_ar_master(path: str, rows: int, n_companies: int, n_customers: int, seed: int = 1):
+    """AR 总表: 表头前有说明区, 末尾有 All Companies 汇总行; 桶列数字/文字/空混合"""
+    rnd = random.Random(seed)
+    companies = _company_names(n_companies, rnd)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("AR Aging")
+    ws.append(["Accounts Receivable Aging Report"])
+    ws.append(["As of", "2025-01-31"])
+    ws.append([])
+    ws.append(["注: 金额单位 HKD, 本表由系统导出"])
+    ws.append([])
+    ws.append(["Company", "Customer ID", "Customer Name", "Currency", *ar.PIVOT_BUCKETS, "Remark"])
+    for i in range(rows):
+        cid = rnd.randrange(1, n_customers + 1)
+        ws.append([
+            companies[min(int(rnd.paretovariate(1.2)) - 1, n_companies - 1)],  # 少数公司占大头
+            cid if rnd.random() < 0.97 else f"C{cid}",
+            f"Customer {cid}",
+            "HKD",
+            *(_bucket_value(rnd) for _ in ar.PIVOT_BUCKETS),
+            "follow up" if rnd.random() < 0.05 else None,
+        ])
+    ws.append([])
+    ws.append(["All Companies", None, None, None, *([0.0] * len(ar.PIVOT_BUCKETS)), None])
+    wb.save(path)
+
+def make_invoice_file(path: str, rows: int, n_companies: int, n_customers: int, seed: int = 4):
+    """发票明细: 到期日多为日期, 也有 Excel 序列号和文字; 金额含贷项(负数)"""
+    rnd = random.Random(seed)
+    companies = _company_names(n_companies, rnd)
+    base = date(2025, 1, 31)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Invoices")
+    ws.append(["Open Invoices"])
+    ws.append([])
+    ws.append(["Company", "Customer ID", "Invoice No", "Amount", "Due Date"])
+    for i in range(rows):
+        due = base + timedelta(days=rnd.randint(-900, 120))
+        r = rnd.random()
+        if r < 0.8:
+            due_value = datetime(due.year, due.month, due.day)
+        elif r < 0.9:
+            due_value = (due - date(1899, 12, 30)).days             # 没设日期格式的序列号
+        else:
+            due_value = due.isoformat()                              # 文字日期
+        ws.append([
+            companies[min(int(rnd.paretovariate(1.2)) - 1, n_companies - 1)],
+            rnd.randrange(1, n_customers + 1),
+            f"INV{i:07d}",
+            round(rnd.uniform(-2e3, 5e4), 2) if rnd.random() < 0.97 else rnd.randrange(1, 5000),
+            due_value,
+        ])
+    wb.save(path)
+
+def make_customer_export(path: str, n_customers: int, seed: int = 2):
+    """Customer 文件的 export 表: Number/Name/Salesman, 部分客户未分配, 个别重复"""
+    rnd = random.Random(seed)
+    salesmen = [f"Sales {i:02d}" for i in range(25)]
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("export")
+    ws.append(["Number", "Name", "Salesman"])
+    for cid in range(1, n_customers + 1):
+        if rnd.random() < 0.1:
+            continue
+        ws.append([cid, f"Customer {cid}", rnd.choice(salesmen)])
+        if rnd.random() < 0.01:
+            ws.append([cid, f"Customer {cid} (dup)", rnd.choice(salesmen)])
+    wb.save(path)
+
+RED = Font(color="FFFF0000")
+BOLD = Font(bold=True)
+FILL = PatternFill("solid", fgColor="FFFFF2CC")
+WRAP = Alignment(wrap_text=True)
+THIN = Border(bottom=Side(style="thin"))
+
+def make_styled_sheet(path: str, rows: int, cols: int = 10, red_col: int = 3, seed: int = 3):
+    """ExcelDuplicator 用的带格式工作簿: red_col 列约 10% 行为红字, 其它单元格少量加粗/填充/边框"""
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Data")
+    ws.append([f"Col {j}" for j in range(1, cols + 1)])
+    for i in range(2, rows + 2):
+        row = []
+        for j in range(1, cols + 1):
+            v = rnd.randrange(100000) if j % 2 else f"R{i}C{j}"
+            r = rnd.random()
+            if j == red_col and r < 0.10:
+                cell = WriteOnlyCell(ws, value=v); cell.font = RED
+            elif r < 0.03:
+                cell = WriteOnlyCell(ws, value=v); cell.font = BOLD; cell.fill = FILL
+            elif r < 0.05:
+                cell = WriteOnlyCell(ws, value=v); cell.alignment = WRAP; cell.border = THIN
+            else:
+                cell = v
+            row.append(cell)
+        ws.append(row)
+    wb.save(path)
+
+def ensure_inputs(data_dir: str, rows: int) -> dict[str, str]:
+    """生成(或复用已生成的)某个行数的全部输入文件"""
+    os.makedirs(data_dir, exist_ok=True)
+    paths = {
+        "master": os.path.join(data_dir, f"ar_master_{rows}.xlsx"),
+        "customer": os.path.join(data_dir, f"customer_{rows}.xlsx"),
+        "styled": os.path.join(data_dir, f"styled_{rows}.xlsx"),
+        "invoices": os.path.join(data_dir, f"invoices_{rows}.xlsx"),
+    }
+    n_customers = max(100, rows // 10)
+    if not os.path.exists(paths["master"]):
+        print(f"  生成 AR 总表 {rows} 行…", flush=True)
+        make_ar_master(paths["master"], rows, n_companies=max(5, min(2000, rows // 200)), n_customers=n_customers)
+    if not os.path.exists(paths["customer"]):
+        make_customer_export(paths["customer"], n_customers)
+    if not os.path.exists(paths["invoices"]):
+        print(f"  生成发票明细 {rows} 行…", flush=True)
+        make_invoice_file(paths["invoices"], rows, n_companies=max(5, min(2000, rows // 200)), n_customers=n_customers)
+    if not os.path.exists(paths["styled"]):
+        print(f"  生成带格式工作簿 {rows} 行…", flush=True)
+        make_styled_sheet(paths["styled"], rows)
+    return paths
+
+# ---------- 旧实现(对照用, 与改动前的代码一致) ----------
+def legacy_read_master_raw(master_file: str) -> pd.DataFrame:
+    """改动前的读法: 先整表 header=None 读一遍逐行找表头, 再按表头整表重读"""
+    probe = pd.read_excel(master_file, header=None)
+    header_idx = 0
+    for i, row in probe.iterrows():
+        s = row.astype(str)
+        if s.str.contains("Customer", case=False, na=False).any() and \
+           s.str.contains("Current", case=False, na=False).any():
+            header_idx = i
+            break
+    return pd.read_excel(master_file, header=header_idx)
+
+def _legacy_data_rows(master_df: pd.DataFrame) -> pd.Series:
+    aging_num = master_df[ar.PIVOT_BUCKETS].apply(pd.to_numeric, errors="coerce")
+    return master_df['Customer ID'].notna() & aging_num.notna().any(axis=1)
+
+def legacy_load_master(master_file: str):
+    """改动前 generate_pivot 的载入: 两遍 read_excel 读整表, 找公司列并校验, 从数据行提取公司列表; 整表留在内存"""
+    master_df = legacy_read_master_raw(master_file)
+    company_col = ar.find_company_col(master_df)
+    ar.validate_columns(master_df, [company_col, 'Customer ID'] + ar.PIVOT_BUCKETS, 'Master sheet')
+    companies = master_df.loc[_legacy_data_rows(master_df), company_col].dropna().astype(str).str.strip()
+    companies = companies[~companies.str.fullmatch(r'(?i)all\s+companies')]
+    return master_df, company_col, sorted(companies.unique().tolist())
+
+def legacy_pivot_company(master_file: str, customer_file: str, company: str) -> dict[str, pd.DataFrame]:
+    """改动前 generate_pivot 去掉对话框和写出: 载入 + 读客户表 + 筛行 .copy() + merge + 逐格 Decimal 汇总"""
+    master_df, company_col, _ = legacy_load_master(master_file)
+    sales = pd.read_excel(customer_file, sheet_name='export')
+    ar.validate_columns(sales, ['Number', 'Salesman'], 'Customer sheet (export)')
+    sales = sales[['Number', 'Name', 'Salesman']].drop_duplicates(subset=['Number'])
+    mask = _legacy_data_rows(master_df) & (master_df[company_col].astype(str).str.strip() == company)
+    raw_df = master_df.loc[mask].copy()
+    merged = raw_df.merge(sales[['Number', 'Salesman']], how='left', left_on='Customer ID',
+                          right_on='Number').drop(columns=['Number'])
+    merged['Salesman'] = merged['Salesman'].fillna('Unassigned')
+    merged = ar.df_to_dec5(merged, ar.PIVOT_BUCKETS)
+    gb = merged.groupby('Salesman', dropna=False)
+    pivot = pd.DataFrame({b: gb[b].apply(ar.sum_dec) for b in ar.PIVOT_BUCKETS}).reset_index()
+    pivot['Total'] = pivot[ar.PIVOT_BUCKETS].apply(
+        lambda row: sum(row).quantize(ar.DEC5, rounding=ROUND_HALF_UP), axis=1)
+    for df, cols in ((pivot, ar.PIVOT_BUCKETS + ['Total']), (merged, ar.PIVOT_BUCKETS)):
+        for c in cols:
+            df[c] = df[c].apply(float)
+    return {'Pivot': pivot, 'Default Sales': sales, 'Raw': merged}
+
+def pivot_company(master_file: str, customer_file: str, company: str) -> dict[str, pd.DataFrame]:
+    """现在的同一流程(不走缓存): load_master + read_default_sales + 按公司筛行 + build_company_sheets"""
+    master_df, company_col, _ = ar.load_master(master_file)
+    sales = ar.read_default_sales(customer_file)
+    raw_df = master_df.loc[ar.company_keys(master_df[company_col]) == company]
+    return ar.build_company_sheets(raw_df, sales)
+
+def legacy_company_filter(companies_lower: list[str], q_norm: str) -> list[int]:
+    """改动前 choose_company_dialog 的 do_filter: 两次全表线性扫描(前缀, 再子串)"""
+    starts = [i for i, s in enumerate(companies_lower) if s.startswith(q_norm)]
+    if len(starts) < 5000:
+        contains = [i for i, s in enumerate(companies_lower)
+                    if q_norm in s and not s.startswith(q_norm)]
+        return starts + contains
+    return starts
+
+def legacy_find_rows_with_red_font(sheet, target_col: int) -> list[int]:
+    """改动前 ExcelDuplicator 的红字筛选: 整本载入后逐格读 cell.font, 只认 rgb 写法的 FF0000"""
+    red_rows = []
+    for row in range(1, sheet.max_row + 1):
+        font_color = sheet.cell(row=row, column=target_col).font.color
+        if font_color is None:
+            continue
+        rgb = None
+        if hasattr(font_color, 'rgb') and isinstance(font_color.rgb, str):
+            rgb = font_color.rgb.upper()
+        elif getattr(font_color, 'type', None) == 'rgb' and isinstance(font_color.value, str):
+            rgb = font_color.value.upper()
+        if rgb in ("FF0000", "FFFF0000"):
+            red_rows.append(row)
+    return red_rows
+
+def _legacy_copy_style(src_cell, dst_cell) -> None:
+    dst_cell.font = copy.copy(src_cell.font)
+    dst_cell.fill = copy.copy(src_cell.fill)
+    dst_cell.alignment = copy.copy(src_cell.alignment)
+    dst_cell.border = copy.copy(src_cell.border)
+    dst_cell.number_format = src_cell.number_format
+
+def legacy_copy_selected_cells(sheet, selected_rows, selected_cols, save_path: str, keep_style=False) -> None:
+    """改动前 ExcelDuplicator 的 copy_selected_cells(保存对话框换成 save_path): 逐格读写, 逐格复制样式对象"""
+    new_wb = Workbook()
+    new_sheet = new_wb.active
+    for new_i, row in enumerate(selected_rows, start=1):
+        for new_j, col in enumerate(selected_cols, start=1):
+            src_cell = sheet.cell(row=row, column=col)
+            dst_cell = new_sheet.cell(row=new_i, column=new_j, value=src_cell.value)
+            if keep_style:
+                _legacy_copy_style(src_cell, dst_cell)
+    new_wb.save(save_path)
+
+def legacy_copy_rows_or_cols(sheet, indices, mode, save_path: str, keep_style=False) -> None:
+    """改动前 ExcelDuplicator 的 copy_rows_or_cols(保存对话框换成 save_path); sheet[row_num] 每次都扫整表, 行复制是平方级"""
+    new_wb = Workbook()
+    new_sheet = new_wb.active
+    if mode == "row":
+        for new_i, row_num in enumerate(indices, start=1):
+            for j, src_cell in enumerate(sheet[row_num], start=1):
+                dst_cell = new_sheet.cell(row=new_i, column=j, value=src_cell.value)
+                if keep_style:
+                    _legacy_copy_style(src_cell, dst_cell)
+    elif mode == "col":
+        for new_j, col_num in enumerate(indices, start=1):
+            for i in range(1, sheet.max_row + 1):
+                src_cell = sheet.cell(row=i, column=col_num)
+                dst_cell = new_sheet.cell(row=i, column=new_j, value=src_cell.value)
+                if keep_style:
+                    _legacy_copy_style(src_cell, dst_cell)
+    new_wb.save(save_path)
+
+# 逐字输入的查询; 旧对话框在公司多于 1000 家时不到 2 个字符不搜索, 两边都从第 2 个字符算起
+SEARCH_QUERIES = ["pacific trading", "深圳科技", "hong kong tech ltd 01", "group 12", "xyz"]
+
+def _keystrokes(search, queries: list[str]) -> list[float]:
+    """依次模拟每次按键的查询, 返回每次的耗时(秒)"""
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        search(q)
+        times.append(time.perf_counter() - t0)
+    return times
+
+# ---------- 计时 ----------
+def _proc_status_kb(key: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(key + ":"):
+                return int(line.split()[1])
+    raise KeyError(key)
+
+try:
+    _malloc_trim = ctypes.CDLL("libc.so.6").malloc_trim
+except (OSError, AttributeError):
+    _malloc_trim = None
+
+def _reset_peak_rss() -> int | None:
+    """
+    把本进程的 RSS 峰值(VmHWM)重置为当前 RSS 并返回当前 RSS(KB); 非 Linux 返回 None。
+    先让 glibc 把空闲堆内存还给系统, 否则之前各项释放的内存会被复用, 增量偏小。
+    """
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return _proc_status_kb("VmRSS")
+    except (OSError, KeyError):
+        return None
+
+def measure(fn, repeat: int = 1, trace: bool = False) -> dict:
+    """
+    最短耗时(repeat 次); 同时记录这几次运行里 RSS 峰值的最大增量(包括 C 扩展/lxml 等非 Python 分配)。
+    trace=True 时再单独跑一次记录 tracemalloc 峰值(追踪开销大, 不与计时混在一起)。
+    """
+    times, rss = [], []
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        start = _reset_peak_rss()
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+        if start is not None:
+            rss.append(_proc_status_kb("VmHWM") - start)
+    rec = {"seconds": round(min(times), 4), "runs": [round(t, 4) for t in times]}
+    if rss:
+        rec["rss_mb"] = round(max(rss) / 1024, 1)
+    if trace:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            rec["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        finally:
+            tracemalloc.stop()
+    return rec, result
+
+def run_size(rows: int, paths: dict[str, str], out_dir: str, repeat: int, trace: bool,
+             legacy_max_rows: int, full_load_max_rows: int) -> list[dict]:
+    results = []
+
+    def bench(name, fn, limit=None, **info):
+        """limit: 行数超过它时不运行, 记为 skipped(返回 None)"""
+        print(f"  {name:<32}", end="", flush=True)
+        if limit is not None and rows > limit:
+            results.append({"bench": name, "rows": rows, "skipped": f"rows > {limit}"})
+            print(f"{'跳过':>9}   (行数 > {limit})", flush=True)
+            return None
+        rec, res = measure(fn, repeat, trace)
+        rec.update(bench=name, rows=rows, **info)
+        results.append(rec)
+        mem = "".join(f"{rec[k]:>9.1f} MB" for k in ("rss_mb", "peak_mb") if k in rec)
+        print(f"{rec['seconds']:>9.3f} s {mem}", flush=True)
+        return res
+
+    # --- AR Interpreter ---
+    bench("ar.read_master_raw[two-pass]", lambda: legacy_read_master_raw(paths["master"]), limit=legacy_max_rows)
+    raw_master = bench("ar.read_master_raw", lambda: ar.read_master_raw(paths["master"]))
+    # RAW_SHEET_COLUMNS = [] 时的读法: 只留公司列 + Customer ID + 各桶
+    bench("ar.read_master_raw[usecols]",
+          lambda: ar.read_master_raw(paths["master"], usecols=["Company", "Customer ID", *ar.PIVOT_BUCKETS]))
+    # 冷启动(不走缓存)的整个载入; 对照项为改动前的两遍 read_excel(整表留在内存)
+    bench("ar.load_master[baseline]", lambda: legacy_load_master(paths["master"]), limit=legacy_max_rows)
+    bench("ar.load_master", lambda: ar.load_master(paths["master"]))
+    company_col = ar.find_company_col(raw_master)
+    bench("ar.extract_companies_for_choice", lambda: ar.extract_companies_for_choice(raw_master, company_col))
+    master_df = bench("ar.compact_master", lambda: ar.compact_master(raw_master, company_col),
+                      raw_frame_mb=_frame_mb(raw_master))
+    results[-1]["frame_mb"] = _frame_mb(master_df)
+    raw_master = None   # 之后和工具一样只持有紧凑表
+    default_sales_df = ar.read_default_sales(paths["customer"])
+    bench("ar.attach_salesman", lambda: ar.attach_salesman(master_df, default_sales_df),
+          customers=len(default_sales_df))
+
+    company_key = ar.company_keys(master_df[company_col])
+    biggest = company_key.value_counts().index[0]
+    raw_df = bench("ar.select_company",
+                   lambda: master_df.loc[ar.company_keys(master_df[company_col]) == biggest])
+    sheets = bench("ar.build_company_sheets", lambda: ar.build_company_sheets(raw_df, default_sales_df),
+                   company_rows=len(raw_df))
+    # 单个公司从读表到汇总(不含对话框和写出): 改动前 两遍读表 + .copy() + merge + Decimal vs 现在
+    bench("ar.pivot_company[baseline]",
+          lambda: legacy_pivot_company(paths["master"], paths["customer"], biggest), limit=legacy_max_rows)
+    bench("ar.pivot_company", lambda: pivot_company(paths["master"], paths["customer"], biggest))
+    # 导出: 原来的 pandas ExcelWriter(整本在内存) vs 只写模式流式写出
+    out_xlsx = os.path.join(out_dir, f"ar_out_{rows}.xlsx")
+    for mode, streaming, limit in (("pandas", False, legacy_max_rows), ("streaming", True, None)):
+        bench(f"ar.export_xlsx_multi[{mode}]", lambda: ar.export_xlsx_multi(sheets, out_xlsx, streaming=streaming),
+              limit=limit, sheet_rows=sum(len(df) for df in sheets.values()))
+        if "seconds" in results[-1]:
+            results[-1]["out_kb"] = round(os.path.getsize(out_xlsx) / 1024, 1)
+
+    # 公司搜索: 公司数 = 行数, 逐字输入每个查询, 记录每次按键的平均/最长耗时
+    names = _company_names(rows, random.Random(5))
+    lower = [s.casefold() for s in names]
+    typed = [q[:i] for q in SEARCH_QUERIES for i in range(2, len(q) + 1)]
+    index = bench("ar.CompanySearchIndex[build]", lambda: ar.CompanySearchIndex(names), companies=rows)
+    for name, search, limit in (("ar.company_search[linear]", lambda q: legacy_company_filter(lower, q.casefold()),
+                                 legacy_max_rows), ("ar.company_search[index]", index.search, None)):
+        per_key = bench(name, lambda: _keystrokes(search, typed), limit=limit, companies=rows, keystrokes=len(typed))
+        if per_key is None:
+            continue
+        results[-1]["ms_per_key"] = round(1000 * sum(per_key) / len(per_key), 3)
+        results[-1]["max_ms_per_key"] = round(1000 * max(per_key), 3)
+    names = lower = index = None
+
+    # 发票级账龄: 读一次, 4 个截止日的桶一次算出; 对照逐行 bisect
+    inv_df, inv_company_col, _ = bench("ar.load_invoices", lambda: ar.load_invoices(paths["invoices"]))
+    due_days = inv_df[ar._DUE_DAY].to_numpy()
+    as_of = [ar.day_number(d) for d in (date(2024, 12, 31), date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31))]
+    bench("ar.aging_buckets[loop]",
+          lambda: [[bisect_left(ar.AGING_DAYS, d - x) for x in due_days.tolist()] for d in as_of],
+          limit=legacy_max_rows, as_of=len(as_of))
+    buckets = bench("ar.aging_buckets", lambda: ar.aging_buckets(due_days, as_of), as_of=len(as_of))
+    inv_keys = ar.company_keys(inv_df[inv_company_col])
+    inv_salesman = ar.attach_salesman(inv_df[['Customer ID']], default_sales_df)['Salesman']
+    inv_fixed = ar.to_fixed5(inv_df['Amount'])[0]
+    bench("ar.aging_snapshots", lambda: ar.aging_snapshots(inv_keys, inv_salesman, inv_fixed, buckets,
+                                                           [str(d) for d in as_of]), as_of=len(as_of))
+
+    # --- ExcelDuplicator ---
+    # 直接读 XML, 不需要 load_workbook; 对应下面 load_workbook + find_rows_with_red_font 两项之和
+    red_rows = bench("ed.scan_font_rows", lambda: ed.scan_font_rows(paths["styled"], None, [3]))
+    results[-1]["selected"] = len(red_rows)
+
+    # 整本载入 + 逐格复制的旧路径(改动前的实现, 见 legacy_copy_rows_or_cols)
+    copy_out = os.path.join(out_dir, f"ed_copy_{rows}.xlsx")
+    full_load = ["ed.load_workbook", "ed.find_rows_with_red_font", "ed.copy_rows_or_cols[row]",
+                 "ed.copy_rows_or_cols[col]", "ed.copy_rows_or_cols[col,style]", "ed.copy_selected_cells[all,style]"]
+    if rows > full_load_max_rows:
+        for name in full_load:
+            bench(name, None, limit=full_load_max_rows)
+    else:
+        wb = bench("ed.load_workbook", lambda: openpyxl.load_workbook(paths["styled"]))
+        sheet = wb.active
+        bench("ed.find_rows_with_red_font", lambda: legacy_find_rows_with_red_font(sheet, 3))
+        bench("ed.copy_rows_or_cols[row]",
+              lambda: legacy_copy_rows_or_cols(sheet, red_rows, "row", copy_out), selected=len(red_rows))
+        bench("ed.copy_rows_or_cols[col]",
+              lambda: legacy_copy_rows_or_cols(sheet, [3, 1, 5], "col", copy_out))
+        bench("ed.copy_rows_or_cols[col,style]",
+              lambda: legacy_copy_rows_or_cols(sheet, [3, 1, 5], "col", copy_out, keep_style=True))
+        all_rows, all_cols = list(range(1, sheet.max_row + 1)), list(range(1, sheet.max_column + 1))
+        bench("ed.copy_selected_cells[all,style]",
+              lambda: legacy_copy_selected_cells(sheet, all_rows, all_cols, copy_out, keep_style=True),
+              cells=len(all_rows) * len(all_cols))
+        results[-1]["out_kb"] = round(os.path.getsize(copy_out) / 1024, 1)
+        wb = sheet = None
+
+    # 流式复制: 计时包含只读打开, 对应上面的 load_workbook + copy_rows_or_cols
+    def ed_stream(indices, mode, keep_style=False):
+        src = openpyxl.load_workbook(paths["styled"], read_only=True)
+        try:
+            layout = ed.read_sheet_layout(paths["styled"], src.active.title) if keep_style else None
+            ed.stream_rows_or_cols(src.active, indices, mode, keep_style, layout=layout).save(copy_out)
+        finally:
+            src.close()
+
+    bench("ed.stream_rows_or_cols[row]", lambda: ed_stream(red_rows, "row"), selected=len(red_rows))
+    bench("ed.stream_rows_or_cols[col]", lambda: ed_stream([3, 1, 5], "col"))
+    bench("ed.stream_rows_or_cols[col,style]", lambda: ed_stream([3, 1, 5], "col", keep_style=True))
+    bench("ed.stream_rows_or_cols[all,style]", lambda: ed_stream(None, "row", keep_style=True))
+    results[-1]["out_kb"] = round(os.path.getsize(copy_out) / 1024, 1)
+
+    # 条件筛选: 只读用到的列再整列判断 vs 只读模式逐行逐格用 Python 判断同样的条件; 都包含读表
+    def loop_filter():
+        src = openpyxl.load_workbook(paths["styled"], read_only=True)
+        try:
+            rows = [1]
+            for i, row in enumerate(src.active.iter_rows(min_row=2, values_only=True), start=2):
+                v7, v2 = row[6], row[1]
+                if type(v7) in (int, float) and v7 > 50000 and isinstance(v2, str) and v2.startswith("R1"):
+                    rows.append(i)
+            return rows
+        finally:
+            src.close()
+
+    where = '$7 > 50000 and $2 startswith "R1"'
+    bench("ed.filter_rows[loop]", loop_filter, limit=legacy_max_rows)
+    selected = bench("ed.filter_rows", lambda: ed.filter_rows(paths["styled"], None, where))
+    results[-1]["selected"] = len(selected) - 1   # 含表头行
+
+    # 去重: 整行(合成数据没有重复) / 只按第 3 列(有重复)
+    bench("ed.find_duplicates[all]", lambda: ed.find_duplicates(paths["styled"], None))
+    _, dups, _ = bench("ed.find_duplicates[key]", lambda: ed.find_duplicates(paths["styled"], None, [3]))
+    results[-1]["duplicates"] = len(dups)
+    return results
+
+def _frame_mb(df) -> float:
+    return round(df.memory_usage(deep=True).sum() / (1024 * 1024), 2)
+
+# ---------- 结果 ----------
+def compare(old_path: str, new: dict):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    before = {(r["bench"], r["rows"]): r for r in old["results"]}
+    print(f"\n与 {old_path} 对比 (耗时比 新/旧, <1 为变快):")
+    for r in new["results"]:
+        o = before.get((r["bench"], r["rows"]))
+        if o is None or "seconds" not in r or "seconds" not in o:
+            continue
+        ratio = r["seconds"] / o["seconds"] if o["seconds"] else float("nan")
+        mem = ""
+        for k in ("rss_mb", "peak_mb"):
+            if k in r and o.get(k):
+                mem = f"  内存 {o[k]:.1f} -> {r[k]:.1f} MB"
+                break
+        print(f"  {r['bench']:<32} {r['rows']:>8}  {o['seconds']:>8.3f} -> {r['seconds']:>8.3f} s  x{ratio:.2f}{mem}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="AR Interpreter / ExcelDuplicator 合成数据基准测试")
+    ap.add_argument("--sizes", default="1000,10000,100000", help="行数列表, 逗号分隔; 1000000 需显式指定")
+    ap.add_argument("--repeat", type=int, default=1, help="每项计时次数(取最短)")
+    ap.add_argument("--tracemalloc", action="store_true", help="每项再单独跑一次, 记录 tracemalloc 峰值")
+    ap.add_argument("--legacy-max-rows", type=int, default=100000,
+                    help="旧实现对照项(两遍读表/pandas 导出/线性搜索/逐行循环)的行数上限, 默认 100000")
+    ap.add_argument("--full-load-max-rows", type=int, default=10000,
+                    help="ExcelDuplicator 整本载入 + 逐格复制各项的行数上限(行复制是平方级), 默认 10000")
+    ap.add_argument("--data-dir", default=os.path.join(HERE, "bench_data"), help="合成数据目录")
+    ap.add_argument("--out", default=None, help="结果 JSON 路径, 默认 bench_results/<时间>.json")
+    ap.add_argument("--compare", default=None, help="与此前的结果 JSON 对比")
+    args = ap.parse_args(argv)
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    out = args.out or os.path.join(HERE, "bench_results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    work_dir = os.path.join(args.data_dir, "out")
+    os.makedirs(work_dir, exist_ok=True)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "versions": {"pandas": pd.__version__, "numpy": np.__version__, "openpyxl": openpyxl.__version__},
+        "repeat": args.repeat,
+        "legacy_max_rows": args.legacy_max_rows,
+        "full_load_max_rows": args.full_load_max_rows,
+        "results": [],
+    }
+    for rows in sizes:
+        print(f"\n== {rows} 行 ==", flush=True)
+        paths = ensure_inputs(args.data_dir, rows)
+        report["results"].extend(run_size(rows, paths, work_dir, args.repeat, args.tracemalloc,
+                                          args.legacy_max_rows, args.full_load_max_rows))
+        # 每个规模跑完就落盘, 大规模中途中断也保留已有结果
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n结果已写入 {out}")
+    if args.compare:
+        compare(args.compare, report)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,31 @@
 import openpyxl
+import numpy as np
+import argparse
+import array
+import colorsys
 import copy
+import glob
+import hashlib
+import html
+import json
+import os
+import posixpath
+import re
+import sys
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.read_only import EMPTY_CELL
+from openpyxl.cell.text import Text
+from openpyxl.reader.strings import read_string_table
+from openpyxl.styles.colors import COLOR_INDEX
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils import column_index_from_string, get_column_letter, range_boundaries
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel, from_ISO8601
+from openpyxl.worksheet.cell_range import CellRange
 from tkinter import filedialog, Tk
 
 def select_file():
@@ -29,9 +54,10 @@ def choose_sheet(wb):
             print("请输入有效的数字编号。")
 
 def display_column_headers(sheet):
+    # 只读模式下逐个 sheet.cell() 每次都要重新解析, 改为只读首行
     print("\n首行(通常为列名): ")
-    for col in range(1, sheet.max_column + 1):
-        value = sheet.cell(row=1, column=col).value
+    first_row = next(sheet.iter_rows(max_row=1, values_only=True), ())
+    for col, value in enumerate(first_row, start=1):
         print(f"列 {col}: {value}")
 
 def display_row_headers(sheet):
@@ -40,44 +66,194 @@ def display_row_headers(sheet):
         value = sheet.cell(row=row, column=1).value
         print(f"行 {row}: {value}")
 
-def find_rows_with_red_font(sheet, target_col):
-    red_rows = []
-    for row in range(1, sheet.max_row + 1):
-        cell = sheet.cell(row=row, column=target_col)
-        font_color = cell.font.color
+# ---------- 按字体颜色筛选行(直接读样式表与工作表 XML) ----------
+# 每个单元格只带一个样式编号(cellXfs 的下标)。先按样式表把每个样式的字体颜色
+# (rgb / theme / indexed + tint)解析成 RRGGBB 并判定一次, 扫描时只查表, 不建单元格对象。
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+DRAWING_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+# 主题色编号 0..11 对应的 clrScheme 元素(0/1、2/3 与文件里的顺序相反)
+HLS_MAX = 240
+THEME_ORDER = ["lt1", "dk1", "lt2", "dk2", "accent1", "accent2", "accent3",
+               "accent4", "accent5", "accent6", "hlink", "folHlink"]
 
-        if font_color is None:
-            continue
+def normalize_rgb(color):
+    # 'FFFF0000' / '#ff0000' / 'FF0000' -> 'FF0000'(忽略透明度)
+    color = color.strip().lstrip("#").upper()
+    return color[-6:] if len(color) in (6, 8) else None
+
+def apply_tint(rgb, tint):
+    # Excel 的 tint: 在 HLS 空间(各分量取 0-240 整数, 同 Windows 的 ColorRGBToHLS)调亮度,
+    # 负值变暗, 正值变亮
+    if not tint:
+        return rgb
+    r, g, b = (int(rgb[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    h, l, s = (round(x * HLS_MAX) for x in colorsys.rgb_to_hls(r, g, b))
+    l = l * (1 + tint) if tint < 0 else l * (1 - tint) + HLS_MAX * tint
+    r, g, b = colorsys.hls_to_rgb(h / HLS_MAX, round(l) / HLS_MAX, s / HLS_MAX)
+    return "".join(f"{round(x * 255):02X}" for x in (r, g, b))
+
+def rgb_in(*colors):
+    # 颜色为其中之一
+    wanted = {normalize_rgb(c) for c in colors}
+    return lambda rgb: rgb in wanted
+
+def rgb_near(color, tolerance):
+    # 每个通道与 color 相差不超过 tolerance(0-255)
+    target = [int(normalize_rgb(color)[i:i + 2], 16) for i in (0, 2, 4)]
+    def match(rgb):
+        return rgb is not None and all(abs(int(rgb[i:i + 2], 16) - t) <= tolerance
+                                       for i, t in zip((0, 2, 4), target))
+    return match
+
+IS_RED = rgb_in("FF0000")
+
+def _read_xml(zf, name):
+    try:
+        return ET.fromstring(zf.read(name))
+    except KeyError:
+        return None
 
-        rgb = None
-        # If color is RGB type (like 'FFFF0000')
-        if hasattr(font_color, 'rgb') and isinstance(font_color.rgb, str):
-            rgb = font_color.rgb.upper()
-        # If it's a Color object with type='rgb' and value is string
-        elif getattr(font_color, 'type', None) == 'rgb' and isinstance(font_color.value, str):
-            rgb = font_color.value.upper()
+def _part_path(base, target):
+    # 关系里的 Target 可以是绝对路径(/xl/...)或相对 base 所在目录
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
 
-        if rgb in ("FF0000", "FFFF0000"):  # Red in common formats
-            red_rows.append(row)
+def _workbook_parts(zf, kind="theme"):
+    # 工作表名 -> 工作表 XML 路径, 以及 kind(theme / sharedStrings / styles)部件的路径
+    wb_xml = _read_xml(zf, "xl/workbook.xml")
+    rels = _read_xml(zf, "xl/_rels/workbook.xml.rels")
+    targets = {r.get("Id"): (r.get("Type", ""), _part_path("xl/workbook.xml", r.get("Target")))
+               for r in rels.iter(PKG_REL_NS + "Relationship")}
+    sheets = {sh.get("name"): targets[sh.get(REL_NS + "id")][1] for sh in wb_xml.iter(MAIN_NS + "sheet")}
+    part = next((path for rel, path in targets.values() if rel.endswith("/" + kind)), None)
+    return sheets, part
+
+def _theme_colors(zf, theme_path):
+    root = _read_xml(zf, theme_path) if theme_path else None
+    scheme = root.find(f".//{DRAWING_NS}clrScheme") if root is not None else None
+    if scheme is None:
+        return []
+    colors = {}
+    for el in scheme:
+        value = el.find(DRAWING_NS + "srgbClr")
+        if value is not None:
+            colors[el.tag[len(DRAWING_NS):]] = normalize_rgb(value.get("val"))
+        else:
+            value = el.find(DRAWING_NS + "sysClr")
+            colors[el.tag[len(DRAWING_NS):]] = normalize_rgb(value.get("lastClr", "")) if value is not None else None
+    return [colors.get(name) for name in THEME_ORDER]
+
+def resolve_color(el, theme, indexed):
+    # <color rgb|theme|indexed|auto tint> -> 'RRGGBB'; 自动色/无法解析的返回 None
+    if el is None:
+        return None
+    if el.get("rgb"):
+        rgb = normalize_rgb(el.get("rgb"))
+    elif el.get("theme") is not None:
+        i = int(el.get("theme"))
+        rgb = theme[i] if i < len(theme) else None
+    elif el.get("indexed") is not None:
+        i = int(el.get("indexed"))
+        rgb = normalize_rgb(indexed[i]) if i < len(indexed) else None   # 64/65 为系统前景/背景色
+    else:
+        return None
+    if rgb is None:
+        return None
+    return apply_tint(rgb, float(el.get("tint", 0)))
+
+def style_font_colors(zf, theme_path=None):
+    # 每个单元格样式(cellXfs 下标)的字体颜色 RRGGBB / None
+    root = _read_xml(zf, "xl/styles.xml")
+    if root is None:
+        return [None]
+    theme = _theme_colors(zf, theme_path)
+    indexed = list(COLOR_INDEX[:64])
+    custom = root.find(f"{MAIN_NS}colors/{MAIN_NS}indexedColors")
+    if custom is not None:
+        indexed = [c.get("rgb") for c in custom.iter(MAIN_NS + "rgbColor")]
+    fonts = [resolve_color(font.find(MAIN_NS + "color"), theme, indexed)
+             for font in root.iterfind(f"{MAIN_NS}fonts/{MAIN_NS}font")]
+    xfs = root.find(MAIN_NS + "cellXfs")
+    if xfs is None:
+        return [None]
+    out = []
+    for xf in xfs.iterfind(MAIN_NS + "xf"):
+        font_id = int(xf.get("fontId", 0))
+        out.append(fonts[font_id] if font_id < len(fonts) else None)
+    return out
+
+# 工作表 XML 里的 <row ...> / <c ...> 开始标签(可带命名空间前缀), 及其 r / s 属性
+ROW_OR_CELL_TAG = re.compile(rb'<(?:\w+:)?(row|c)\b([^>]*)>')
+REF_ATTR = re.compile(rb'\br\s*=\s*["\']([A-Z]*)(\d*)["\']')
+STYLE_ATTR = re.compile(rb'\bs\s*=\s*["\'](\d+)["\']')
+
+def _iter_tags(src, pattern=ROW_OR_CELL_TAG, chunk_size=1 << 20):
+    # 分块读取, 末尾不完整的标签留到下一块
+    tail = b""
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        data = tail + chunk
+        cut = data.rfind(b"<")
+        if cut < 0:
+            tail = b""
+            continue
+        tail = data[cut:]
+        yield from pattern.finditer(data, 0, cut)
+    yield from pattern.finditer(tail)
 
-    return red_rows
+def scan_font_rows(file_path, sheet_name, cols, predicate=IS_RED, require_all=False):
+    """
+    流式读取工作表 XML, 返回 cols 中任一列(require_all=True 时为全部列)字体颜色满足
+    predicate 的行号(升序)。predicate 接收 'RRGGBB' 或 None(自动色), 见 rgb_in / rgb_near。
+    sheet_name 为 None 时取第一个工作表。只解析目标列单元格的属性, 耗时与文件大小成正比。
+    """
+    cols = set(cols)
+    rows = []
+    with zipfile.ZipFile(file_path) as zf:
+        sheets, theme_path = _workbook_parts(zf)
+        sheet_path = sheets[sheet_name] if sheet_name is not None else next(iter(sheets.values()))
+        matched = [bool(predicate(rgb)) for rgb in style_font_colors(zf, theme_path)]
+        letters = {}    # 列字母 -> 列号
 
-def copy_selected_cells(sheet, selected_rows, selected_cols, keep_style=False):
-    new_wb = Workbook()
-    new_sheet = new_wb.active
+        row = col = 0
+        hits = set()
 
-    for new_i, row in enumerate(selected_rows, start=1):
-        for new_j, col in enumerate(selected_cols, start=1):
-            src_cell = sheet.cell(row=row, column=col)
-            dst_cell = new_sheet.cell(row=new_i, column=new_j, value=src_cell.value)
+        def flush():
+            if hits and (not require_all or hits == cols):
+                rows.append(row)
 
-            if keep_style:
-                dst_cell.font = copy.copy(src_cell.font)
-                dst_cell.fill = copy.copy(src_cell.fill)
-                dst_cell.alignment = copy.copy(src_cell.alignment)
-                dst_cell.border = copy.copy(src_cell.border)
-                dst_cell.number_format = src_cell.number_format
+        with zf.open(sheet_path) as src:
+            for m in _iter_tags(src):
+                attrs = m.group(2)
+                if m.group(1) == b"row":
+                    flush()
+                    ref = REF_ATTR.search(attrs)
+                    row = int(ref.group(2)) if ref else row + 1
+                    col = 0
+                    hits = set()
+                    continue
+                ref = REF_ATTR.search(attrs)
+                if ref:
+                    letter = ref.group(1)
+                    col = letters.get(letter)
+                    if col is None:
+                        col = letters[letter] = column_index_from_string(letter.decode())
+                else:
+                    col += 1
+                if col in cols:
+                    style = STYLE_ATTR.search(attrs)
+                    style = int(style.group(1)) if style else 0
+                    if style < len(matched) and matched[style]:
+                        hits.add(col)
+            flush()
+    return rows
 
+def save_new_workbook(new_wb):
     save_path = select_save_path()
     if save_path:
         new_wb.save(save_path)
@@ -85,68 +261,888 @@ def copy_selected_cells(sheet, selected_rows, selected_cols, keep_style=False):
     else:
         print("未选择保存路径，操作已取消。")
 
-def copy_rows_or_cols(sheet, indices, mode, keep_style=False):
-    new_wb = Workbook()
-    new_sheet = new_wb.active
+# ---------- 保留格式: 样式去重, 列宽/行高/合并单元格 ----------
+class StyleCache:
+    """
+    源单元格的每种样式组合(字体/填充/对齐/边框/数字格式)只在目标工作簿登记一次,
+    之后同样式的单元格直接引用登记好的样式, 不再逐格复制样式对象。
+    """
+
+    def __init__(self):
+        self.styles = {}
+
+    def apply(self, src_cell, dst_cell):
+        if not getattr(src_cell, "has_style", False):    # EMPTY_CELL 没有样式
+            return
+        # 只读单元格直接用源样式编号, 普通单元格用样式数组
+        key = getattr(src_cell, "_style_id", None)
+        if key is None:
+            key = tuple(src_cell._style)
+        style = self.styles.get(key)
+        if style is None:
+            dst_cell.font = copy.copy(src_cell.font)
+            dst_cell.fill = copy.copy(src_cell.fill)
+            dst_cell.alignment = copy.copy(src_cell.alignment)
+            dst_cell.border = copy.copy(src_cell.border)
+            dst_cell.number_format = src_cell.number_format
+            self.styles[key] = copy.copy(dst_cell._style)
+        else:
+            dst_cell._style = copy.copy(style)
+
+LAYOUT_TAG = re.compile(rb'<(?:\w+:)?(col|row|mergeCell)\b([^>]*)>')
+XML_ATTR = re.compile(rb'(\w+)\s*=\s*["\']([^"\']*)["\']')
+
+def read_sheet_layout(file_path, sheet_name):
+    """
+    只读模式拿不到列宽/行高/合并单元格, 直接扫工作表 XML 取出:
+    {'widths': {列号: 宽}, 'heights': {行号: 高}, 'merged': [(首行, 首列, 末行, 末列)]}
+    """
+    layout = {"widths": {}, "heights": {}, "merged": []}
+    with zipfile.ZipFile(file_path) as zf:
+        sheets, _ = _workbook_parts(zf)
+        sheet_path = sheets[sheet_name] if sheet_name is not None else next(iter(sheets.values()))
+        row = 0
+        with zf.open(sheet_path) as src:
+            for m in _iter_tags(src, LAYOUT_TAG):
+                kind, raw = m.group(1), m.group(2)
+                attrs = {k.decode(): v.decode() for k, v in XML_ATTR.findall(raw)}
+                if kind == b"row":
+                    row = int(attrs["r"]) if "r" in attrs else row + 1    # 没有 r 时按顺序
+                    if "ht" in attrs:
+                        layout["heights"][row] = float(attrs["ht"])
+                elif kind == b"col":
+                    if attrs.get("width"):
+                        for c in range(int(attrs["min"]), int(attrs["max"]) + 1):
+                            layout["widths"][c] = float(attrs["width"])
+                elif "ref" in attrs:
+                    min_col, min_row, max_col, max_row = range_boundaries(attrs["ref"])
+                    layout["merged"].append((min_row, min_col, max_row, max_col))
+    return layout
+
+def sheet_layout(sheet):
+    # 完整模式打开的工作表, 格式同 read_sheet_layout
+    widths = {}
+    for dim in sheet.column_dimensions.values():
+        if dim.width and dim.min:
+            for c in range(dim.min, (dim.max or dim.min) + 1):
+                widths[c] = dim.width
+    heights = {r: dim.height for r, dim in sheet.row_dimensions.items() if dim.height}
+    merged = [(rng.min_row, rng.min_col, rng.max_row, rng.max_col) for rng in sheet.merged_cells.ranges]
+    return {"widths": widths, "heights": heights, "merged": merged}
+
+def _positions(mapping):
+    # 目标序号(1 起) <- 源编号的列表 -> {源编号: 第一次出现的目标序号}; None 表示同号
+    if mapping is None:
+        return None
+    pos = {}
+    for k, src in enumerate(mapping, start=1):
+        pos.setdefault(src, k)
+    return pos
+
+def _mapped_span(lo, hi, pos):
+    # 源 lo..hi 在目标里仍连续且同序时返回目标范围, 否则 None
+    if pos is None:
+        return lo, hi
+    start = pos.get(lo)
+    if start is None or any(pos.get(src) != start + k for k, src in enumerate(range(lo, hi + 1))):
+        return None
+    return start, start + hi - lo
+
+def apply_layout(new_sheet, layout, row_map=None, col_map=None):
+    """
+    row_map / col_map 为目标第 1, 2, ... 行(列)对应的源行(列)号, None 表示同号。
+    列宽、行高照搬; 合并区域的行列都被选中且在目标里仍连续、同序时才合并。
+    write-only 工作表要在写入第一行之前调用。
+    """
+    widths, heights = layout["widths"], layout["heights"]
+    for j, c in (((c, c) for c in widths) if col_map is None else enumerate(col_map, start=1)):
+        if c in widths:
+            new_sheet.column_dimensions[get_column_letter(j)].width = widths[c]
+    for i, r in (((r, r) for r in heights) if row_map is None else enumerate(row_map, start=1)):
+        if r in heights:
+            new_sheet.row_dimensions[i].height = heights[r]
+
+    row_pos, col_pos = _positions(row_map), _positions(col_map)
+    for min_row, min_col, max_row, max_col in layout["merged"]:
+        rows = _mapped_span(min_row, max_row, row_pos)
+        cols = _mapped_span(min_col, max_col, col_pos)
+        if rows is None or cols is None:
+            continue
+        rng = CellRange(min_row=rows[0], min_col=cols[0], max_row=rows[1], max_col=cols[1])
+        if hasattr(new_sheet, "merge_cells"):
+            new_sheet.merge_cells(rng.coord)
+        else:
+            new_sheet.merged_cells.add(rng)    # write-only 工作表只记录区域
+
+def check_indices(indices):
+    if indices is not None and any(i < 1 for i in indices):
+        raise ValueError("行/列编号从 1 开始")
+
+def _picked(values, cols, empty=None):
+    # 按 cols 的顺序取值, 超出该行长度的补 empty
+    n = len(values)
+    return [values[c - 1] if c <= n else empty for c in cols]
+
+def _styled_cells(new_sheet, cells, styles):
+    # 只读单元格 -> 带同样格式的 write-only 单元格
+    out = []
+    for src_cell in cells:
+        dst_cell = WriteOnlyCell(new_sheet, value=src_cell.value)
+        styles.apply(src_cell, dst_cell)
+        out.append(dst_cell)
+    return out
+
+def stream_rows_or_cols(sheet, indices, mode, keep_style=False, cols=None, layout=None, stats=None):
+    """
+    sheet 为只读模式(read_only=True)打开的工作表。一次 iter_rows 取出所需的行/列,
+    按 indices 的顺序(如 3,1,5)写进 write-only 工作簿并返回; indices 为 None 表示全部。
+    col 模式逐行写出, 内存与表大小无关; row 模式只缓存选中的行(顺序递增时也不缓存)。
+    row 模式下 cols 给出时只取这些列(按 cols 的顺序)。
+    keep_style 时 layout(read_sheet_layout 的结果)给出则一并带上列宽/行高/合并单元格。
+    stats(dict)给出时记下读到的源表行数 rows 与写出行数 out_rows(只读表可能没有 max_row)。
+    """
+    check_indices(indices)
+    check_indices(cols)
+    sheet.reset_dimensions()    # 文件里的 <dimension> 可能过期, 按它读会截掉行/列
+    new_wb = Workbook(write_only=True)
+    new_sheet = new_wb.create_sheet()
+    if indices is not None and not indices:
+        return new_wb
+
+    read = 0
+    empty = EMPTY_CELL if keep_style else None
+    styles = StyleCache()
+    if keep_style and layout is not None:
+        row_map, col_map = (indices, cols) if mode == "row" else (None, indices)
+        apply_layout(new_sheet, layout, row_map, col_map)
+
+    def out_row(row):
+        if cols is not None:
+            row = _picked(row, cols, empty)
+        if keep_style:
+            return _styled_cells(new_sheet, row, styles)
+        return list(row)
 
     if mode == "row":
-        for new_i, row_num in enumerate(indices, start=1):
-            for j, src_cell in enumerate(sheet[row_num], start=1):
-                dst_cell = new_sheet.cell(row=new_i, column=j, value=src_cell.value)
-                if keep_style:
-                    dst_cell.font = copy.copy(src_cell.font)
-                    dst_cell.fill = copy.copy(src_cell.fill)
-                    dst_cell.alignment = copy.copy(src_cell.alignment)
-                    dst_cell.border = copy.copy(src_cell.border)
-                    dst_cell.number_format = src_cell.number_format
+        if indices is None or all(a < b for a, b in zip(indices, indices[1:])):
+            # 全部或递增: 边读边写
+            wanted = None if indices is None else set(indices)
+            last = None if indices is None else indices[-1]
+            written = 0
+            for read, row in enumerate(sheet.iter_rows(max_row=last, values_only=not keep_style), start=1):
+                if wanted is None or read in wanted:
+                    new_sheet.append(out_row(row))
+                    written += 1
+            if indices is not None:
+                for _ in range(len(indices) - written):   # 超出表尾的行写成空行
+                    new_sheet.append([])
+        else:
+            wanted = set(indices)
+            picked = {}
+            for read, row in enumerate(sheet.iter_rows(min_row=min(wanted), max_row=max(wanted),
+                                                       values_only=not keep_style), start=min(wanted)):
+                if read in wanted:
+                    picked[read] = row
+            for i in indices:
+                new_sheet.append(out_row(picked[i]) if i in picked else [])
     elif mode == "col":
-        for new_j, col_num in enumerate(indices, start=1):
-            for i in range(1, sheet.max_row + 1):
-                src_cell = sheet.cell(row=i, column=col_num)
-                dst_cell = new_sheet.cell(row=i, column=new_j, value=src_cell.value)
-                if keep_style:
-                    dst_cell.font = copy.copy(src_cell.font)
-                    dst_cell.fill = copy.copy(src_cell.fill)
-                    dst_cell.alignment = copy.copy(src_cell.alignment)
-                    dst_cell.border = copy.copy(src_cell.border)
-                    dst_cell.number_format = src_cell.number_format
+        for read, row in enumerate(sheet.iter_rows(values_only=not keep_style), start=1):
+            new_sheet.append(out_row(row if indices is None else _picked(row, indices, empty)))
+    if stats is not None:
+        stats["rows"] = read
+        stats["out_rows"] = len(indices) if mode == "row" and indices is not None else read
+    return new_wb
 
-    save_path = select_save_path()
-    if save_path:
-        new_wb.save(save_path)
-        print(f"\n已保存到: {save_path}")
+# ---------- 按条件筛选行(条件编译成整列运算) ----------
+# 条件写法: $7 > 10000 and ($2 startswith "HK" or $B in ("SG", "MY"))
+#   列: $7 或 $G; 比较: = != < <= > >=; between a and b(含两端); in (...);
+#   startswith / endswith / contains / matches(正则); is empty / is not empty; and / or / not / 括号。
+# 数字与数值单元格比较, 文本/空/布尔单元格不满足任何数值比较(包括 !=);
+# 字符串按单元格文本比较(空单元格为 "", 日期为 "2025-03-01 00:00:00" 这样的文本);
+# 公式单元格按文件里缓存的计算结果判断。
+FILTER_TOKEN = re.compile(r"""\s*(?:
+    (?P<col>\$(?:\d+|[A-Za-z]+))
+  | (?P<num>[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<str>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<op><=|>=|!=|==|=|<|>|\(|\)|,)
+  | (?P<word>[A-Za-z_]+))""", re.X)
+TEXT_OPS = ("startswith", "endswith", "contains", "matches")
+
+class ColumnData:
+    """一次流式读出的若干列(按行顺序), 数值/文本视图按需生成并缓存"""
+
+    def __init__(self, values, n):
+        self.values = values    # {列号: 值列表}
+        self.n = n
+        self._num, self._text, self._uniq = {}, {}, {}
+
+    def numeric(self, col):
+        # 数值单元格 -> float, 其它(文本/空/布尔)-> nan
+        if col not in self._num:
+            self._num[col] = np.fromiter(
+                (v if type(v) in (int, float) else np.nan for v in self.values[col]), float, self.n)
+        return self._num[col]
+
+    def text(self, col):
+        # 文本视图用 object 数组: 定长的 unicode 数组按最长的一格给每格分配空间, 一格长备注就会撑爆内存
+        if col not in self._text:
+            out = np.empty(self.n, dtype=object)
+            out[:] = ["" if v is None else v if type(v) is str else str(v) for v in self.values[col]]
+            self._text[col] = out
+        return self._text[col]
+
+    def by_unique(self, col, test):
+        # 前缀/包含/正则等逐个字符串判断的条件: 只对不同的值各判断一次, 再按编号展开
+        if col not in self._uniq:
+            self._uniq[col] = np.unique(self.text(col), return_inverse=True)
+        uniq, inverse = self._uniq[col]
+        return np.fromiter((bool(test(u)) for u in uniq), bool, len(uniq))[inverse]
+
+# 工作表 XML 里的 <row ...> 与完整的 <c ...>...</c>(可带命名空间前缀)
+ROW_OR_CELL = re.compile(rb'<(?:\w+:)?row\b([^>]*)>|<(?:\w+:)?c\b([^>]*?)(?:/>|>(.*?)</(?:\w+:)?c>)', re.S)
+TYPE_ATTR = re.compile(rb'\bt\s*=\s*["\'](\w+)["\']')
+VALUE_TAG = re.compile(rb'<(?:\w+:)?v>([^<]*)</(?:\w+:)?v>')
+PLAIN_INLINE = re.compile(rb'<(?:\w+:)?is><(?:\w+:)?t(?:\s[^>]*)?>([^<]*)</(?:\w+:)?t></(?:\w+:)?is>')
+
+def _iter_cells(src, chunk_size=1 << 20):
+    # 分块读取, 在最后一个 "row>"(</row> 或无属性的 <row>)处切开, 单元格不会被截断
+    tail = b""
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        data = tail + chunk
+        cut = data.rfind(b"row>")
+        if cut < 0:
+            tail = data
+            continue
+        cut += 4
+        tail = data[cut:]
+        yield from ROW_OR_CELL.finditer(data, 0, cut)
+    yield from ROW_OR_CELL.finditer(tail)
+
+def _text(raw):
+    text = raw.decode("utf-8")
+    return html.unescape(text) if "&" in text else text
+
+class CellDecoder:
+    """按 openpyxl 的规则把 <c> 的类型与内容转成值; 公式单元格取缓存的计算结果"""
+
+    def __init__(self, zf):
+        _, strings_path = _workbook_parts(zf, "sharedStrings")
+        _, styles_path = _workbook_parts(zf, "styles")
+        self.strings = read_string_table(zf.open(strings_path)) if strings_path else []
+        styles = _read_xml(zf, styles_path) if styles_path else None
+        sheet_styles = Stylesheet.from_tree(styles) if styles is not None else None
+        self.date_formats = sheet_styles.date_formats if sheet_styles else set()
+        self.timedelta_formats = sheet_styles.timedelta_formats if sheet_styles else set()
+        pr = _read_xml(zf, "xl/workbook.xml").find(MAIN_NS + "workbookPr")
+        date1904 = pr is not None and pr.get("date1904", "").lower() in ("1", "true")
+        self.epoch = MAC_EPOCH if date1904 else WINDOWS_EPOCH
+
+    def value(self, attrs, body):
+        if not body:
+            return None
+        kind = TYPE_ATTR.search(attrs)
+        kind = kind.group(1) if kind else b"n"
+        if kind == b"inlineStr":
+            m = PLAIN_INLINE.fullmatch(body)
+            if m:
+                return _text(m.group(1))
+            node = ET.fromstring(b'<c xmlns="%s">%s</c>' % (MAIN_NS[1:-1].encode(), body)).find(MAIN_NS + "is")
+            return Text.from_tree(node).content if node is not None else None
+        m = VALUE_TAG.search(body)
+        if not m or not m.group(1):
+            return None
+        raw = m.group(1)
+        if kind == b"n":
+            value = float(raw) if b"." in raw or b"E" in raw or b"e" in raw else int(raw)
+            style = STYLE_ATTR.search(attrs)
+            style = int(style.group(1)) if style else 0
+            if style in self.date_formats:
+                try:
+                    return from_excel(value, self.epoch, timedelta=style in self.timedelta_formats)
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return value
+        if kind == b"s":
+            return self.strings[int(raw)]
+        if kind == b"b":
+            return bool(int(raw))
+        if kind == b"d":
+            return from_ISO8601(raw.decode())
+        return _text(raw)    # str(公式结果文本) / e(错误值)
+
+def iter_sheet_rows(file_path, sheet_name, cols=None, min_row=1):
+    """
+    直接读工作表 XML, 从 min_row 起逐行产出 (行号, 值列表), 值类型同 openpyxl, 公式取缓存结果。
+    cols 给出时只解析这些列(按 cols 的顺序, 缺的为 None), 其它单元格只看一眼列号;
+    为 None 时取整行(第 1 列到该行最后一个单元格)。XML 里没有的空行不产出。
+    sheet_name 为 None 时取第一个工作表。
+    """
+    slot = None if cols is None else {c: i for i, c in enumerate(cols)}
+    with zipfile.ZipFile(file_path) as zf:
+        sheets, _ = _workbook_parts(zf)
+        sheet_path = sheets[sheet_name] if sheet_name is not None else next(iter(sheets.values()))
+        decoder = CellDecoder(zf)
+        letters = {}    # 列字母 -> 列号
+
+        r = col = 0
+        current = None    # 当前行(>= min_row 时)的值
+        with zf.open(sheet_path) as src:
+            for m in _iter_cells(src):
+                attrs = m.group(1)
+                if attrs is not None:
+                    if current is not None:
+                        yield r, current
+                    ref = REF_ATTR.search(attrs)
+                    r = int(ref.group(2)) if ref else r + 1
+                    col = 0
+                    current = None if r < min_row else [] if slot is None else [None] * len(cols)
+                    continue
+                attrs = m.group(2)
+                ref = REF_ATTR.search(attrs)
+                if ref and ref.group(1):
+                    letter = ref.group(1)
+                    col = letters.get(letter)
+                    if col is None:
+                        col = letters[letter] = column_index_from_string(letter.decode())
+                else:
+                    col += 1
+                if current is None:
+                    continue
+                if slot is None:
+                    if col > len(current) + 1:
+                        current.extend([None] * (col - len(current) - 1))
+                    current.append(decoder.value(attrs, m.group(3)))
+                else:
+                    i = slot.get(col)
+                    if i is not None:
+                        current[i] = decoder.value(attrs, m.group(3))
+            if current is not None:
+                yield r, current
+
+def scan_columns(file_path, sheet_name, cols, min_row=1):
+    """iter_sheet_rows 按列收集: 从 min_row 起 cols 这些列的值, 缺的行/单元格为 None"""
+    cols = list(cols)
+    values = [[] for _ in cols]
+    last = min_row - 1
+    for r, current in iter_sheet_rows(file_path, sheet_name, cols, min_row):
+        for _ in range(r - last - 1):    # 中间缺的行
+            for out in values:
+                out.append(None)
+        for out, v in zip(values, current):
+            out.append(v)
+        last = r
+    return ColumnData(dict(zip(cols, values)), last - min_row + 1)
+
+class RowFilter:
+    """把条件文本编译成对整列数组的运算; columns 为条件用到的列号"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            m = FILTER_TOKEN.match(text, pos)
+            if not m or m.end() == pos:
+                raise ValueError(f"条件无法解析: {text[pos:pos + 20]!r}")
+            kind = m.lastgroup
+            self.tokens.append((kind, m.group(kind)))
+            pos = m.end()
+        self.pos = 0
+        self.columns = set()
+        self.fn = self._or()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"条件多出内容: {self.tokens[self.pos][1]!r}")
+        self.columns = sorted(self.columns)
+
+    def mask(self, data):
+        return np.asarray(self.fn(data), dtype=bool)
+
+    # --- 递归下降: or < and < not < 单个条件 ---
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _word(self, *words):
+        kind, val = self._peek()
+        if kind == "word" and val.lower() in words:
+            self.pos += 1
+            return val.lower()
+        return None
+
+    def _expect(self, kind, val=None):
+        k, v = self._peek()
+        if k != kind or (val is not None and v.lower() != val):
+            raise ValueError(f"条件第 {self.pos + 1} 个记号处应为 {val or kind}, 实际为 {v!r}")
+        self.pos += 1
+        return v
+
+    def _or(self):
+        fn = self._and()
+        while self._word("or"):
+            left, right = fn, self._and()
+            fn = lambda d, a=left, b=right: a(d) | b(d)
+        return fn
+
+    def _and(self):
+        fn = self._not()
+        while self._word("and"):
+            left, right = fn, self._not()
+            fn = lambda d, a=left, b=right: a(d) & b(d)
+        return fn
+
+    def _not(self):
+        if self._word("not"):
+            inner = self._not()
+            return lambda d: ~inner(d)
+        if self._peek() == ("op", "("):
+            self.pos += 1
+            fn = self._or()
+            self._expect("op", ")")
+            return fn
+        return self._condition()
+
+    def _value(self):
+        kind, val = self._peek()
+        self.pos += 1
+        if kind == "num":
+            return float(val)
+        if kind == "str":
+            return re.sub(r"""\\(["'\\])""", r"\1", val[1:-1])    # 只还原引号与反斜杠, 正则里的 \d 等保持原样
+        raise ValueError("条件不完整" if kind is None else f"应为数字或带引号的文本, 实际为 {val!r}")
+
+    def _condition(self):
+        ref = self._expect("col")[1:]
+        col = int(ref) if ref.isdigit() else column_index_from_string(ref.upper())
+        check_indices([col])
+        self.columns.add(col)
+
+        if self._word("is"):
+            negate = bool(self._word("not"))
+            self._expect("word", "empty")
+            return (lambda d: d.text(col) != "") if negate else (lambda d: d.text(col) == "")
+        if self._word("between"):
+            lo = self._value()
+            self._expect("word", "and")
+            hi = self._value()
+            view = _view_for(col, lo, hi)
+            return lambda d: (view(d) >= lo) & (view(d) <= hi)
+        if self._word("in"):
+            self._expect("op", "(")
+            items = [self._value()]
+            while self._peek() == ("op", ","):
+                self.pos += 1
+                items.append(self._value())
+            self._expect("op", ")")
+            nums = [v for v in items if isinstance(v, float)]
+            strs = [v for v in items if isinstance(v, str)]
+            return lambda d: ((np.isin(d.numeric(col), nums) if nums else False)
+                              | (np.isin(d.text(col), strs) if strs else False))
+        op = self._word(*TEXT_OPS)
+        if op:
+            val = self._value()
+            if not isinstance(val, str):
+                raise ValueError(f"{op} 后面应为带引号的文本")
+            if op == "startswith":
+                test = lambda s: s.startswith(val)
+            elif op == "endswith":
+                test = lambda s: s.endswith(val)
+            elif op == "contains":
+                test = lambda s: val in s
+            else:
+                test = re.compile(val).search
+            return lambda d: d.by_unique(col, test)
+
+        op = self._expect("op")
+        val = self._value()
+        view = _view_for(col, val)
+        if op in ("=", "=="):
+            return lambda d: view(d) == val
+        if op == "!=":
+            if isinstance(val, float):    # nan != val 为真, 空/文本单元格要排除
+                return lambda d: ~np.isnan(view(d)) & (view(d) != val)
+            return lambda d: view(d) != val
+        compare = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal}.get(op)
+        if compare is None:
+            raise ValueError(f"不支持的比较: {op}")
+        return lambda d: compare(view(d), val)
+
+def _view_for(col, *values):
+    # 与数字比较用数值视图, 与文本比较用文本视图; 两者混用时报错
+    if all(isinstance(v, float) for v in values):
+        return lambda d: d.numeric(col)
+    if all(isinstance(v, str) for v in values):
+        return lambda d: d.text(col)
+    raise ValueError("同一个条件里不能混用数字和文本")
+
+def filter_rows(file_path, sheet_name, where, header=True):
+    """
+    工作表中满足条件 where(文本或 RowFilter)的行号(递增)。
+    只读取条件用到的列(scan_columns), 读完后整列判断; header 时首行不参与判断并总是保留。
+    """
+    flt = where if isinstance(where, RowFilter) else RowFilter(where)
+    first = 2 if header else 1
+    data = scan_columns(file_path, sheet_name, flt.columns, min_row=first)
+    rows = (np.flatnonzero(flt.mask(data)) + first).tolist()
+    return [1] + rows if header else rows
+
+# ---------- 去除重复行(行指纹) ----------
+# 每行选中列的值规范化后取 16 字节 blake2b 指纹, 一遍流式读完只留下指纹与行号(每行约 24 字节),
+# 再用 np.unique 找出每个指纹第一次(或最后一次)出现的行; 不在内存里保留整行的值。
+# XML 里没有的空行按空行参与比较(与其它空行互为重复), 与复制时 openpyxl 补出的空行一致。
+FINGERPRINT_SIZE = 16
+KEEP_CHOICES = ("first", "last")
+
+def _key_text(v):
+    # 文本去首尾空白, 空白文本与空单元格相同; 数值 1 与 1.0 相同(文本 "1" 与数值 1 不同)
+    if v is None:
+        return ""
+    if isinstance(v, str):
+        v = v.strip()
+        return "s" + v if v else ""
+    if isinstance(v, bool):
+        return "b1" if v else "b0"
+    if isinstance(v, (int, float)):
+        return "n" + (str(int(v)) if isinstance(v, int) or v.is_integer() else repr(v))
+    return "o" + str(v)    # 日期/时间等
+
+def row_fingerprint(values):
+    keys = [_key_text(v) for v in values]
+    while keys and not keys[-1]:    # 行尾的空单元格不影响比较
+        keys.pop()
+    return hashlib.blake2b(repr(keys).encode("utf-8", "surrogatepass"), digest_size=FINGERPRINT_SIZE).digest()
+
+def find_duplicates(file_path, sheet_name, key_cols=None, keep="first", header=True):
+    """
+    按 key_cols(None 为整行)找重复行。header 时首行不参与比较并总是保留。
+    返回 (保留的行号, 重复的行号, 各重复行所对应的保留行号), 行号均为升序的 numpy 数组。
+    """
+    if keep not in KEEP_CHOICES:
+        raise ValueError(f"keep 须为 {'/'.join(KEEP_CHOICES)}: {keep!r}")
+    fps = bytearray()
+    rows = array.array("q")
+    blank = row_fingerprint([])
+    last = 1 if header else 0
+    for r, values in iter_sheet_rows(file_path, sheet_name, key_cols, min_row=last + 1):
+        for missing in range(last + 1, r):    # 中间缺的行按空行
+            fps += blank
+            rows.append(missing)
+        fps += row_fingerprint(values)
+        rows.append(r)
+        last = r
+    fps = np.frombuffer(fps, dtype=f"S{FINGERPRINT_SIZE}")    # 直接用缓冲区, 不再复制一份
+    rows = np.frombuffer(rows, dtype=np.int64)
+
+    if keep == "first":
+        _, kept, inverse = np.unique(fps, return_index=True, return_inverse=True)
     else:
-        print("未选择保存路径，操作已取消。")
+        _, kept, inverse = np.unique(fps[::-1], return_index=True, return_inverse=True)
+        kept, inverse = len(fps) - 1 - kept, inverse[::-1]
+    owner = kept[inverse]    # 每行所属指纹保留的那一行(下标)
+    dup = np.flatnonzero(owner != np.arange(len(fps)))
+    kept_rows = np.sort(rows[kept])
+    if header:
+        kept_rows = np.concatenate([[1], kept_rows])
+    return kept_rows, rows[dup], rows[owner[dup]]
+
+def dedupe_rows(sheet, file_path, key_cols=None, keep="first", header=True, keep_style=False,
+                cols=None, report=False, layout=None, stats=None):
+    """
+    只读表 sheet(来自 file_path)去掉重复行, 保留的行按原顺序写进 write-only 工作簿并返回;
+    cols 给出时只取这些列。report 时另加 "Duplicates" 表: 重复行号、保留的行号及比较用的各列值
+    (有表头时表头为首行的对应列, 否则为列字母)。
+    先由 find_duplicates 只扫比较列定下保留/重复的行, 再逐行读一遍, 同时写出保留的行与 Duplicates 表。
+    """
+    check_indices(cols)
+    sheet.reset_dimensions()
+    kept_rows, dup_rows, owner_rows = find_duplicates(file_path, sheet.title, key_cols, keep, header)
+    kept_rows = kept_rows.tolist()
+    kept = set(kept_rows)
+    owner_of = dict(zip(dup_rows.tolist(), owner_rows.tolist()))
+
+    new_wb = Workbook(write_only=True)
+    new_sheet = new_wb.create_sheet()
+    dup_sheet = new_wb.create_sheet("Duplicates") if report else None
+    if keep_style and layout is not None:
+        apply_layout(new_sheet, layout, kept_rows, cols)
+    if dup_sheet is not None and not header:
+        dup_sheet.append(["Row", "Kept Row"] + ([get_column_letter(c) for c in key_cols] if key_cols else []))
+
+    empty = EMPTY_CELL if keep_style else None
+    styles = StyleCache()
+    for r, row in enumerate(sheet.iter_rows(values_only=not keep_style), start=1):
+        if r in kept:
+            out = row if cols is None else _picked(row, cols, empty)
+            new_sheet.append(_styled_cells(new_sheet, out, styles) if keep_style else list(out))
+        if dup_sheet is not None and (r in owner_of or (header and r == 1)):
+            values = [c.value for c in row] if keep_style else list(row)
+            if key_cols is not None:
+                values = _picked(values, key_cols)
+            dup_sheet.append((["Row", "Kept Row"] if r not in owner_of else [r, owner_of[r]]) + values)
+    if stats is not None:
+        stats["rows"] = len(kept_rows) + len(owner_of)
+        stats["out_rows"] = len(kept_rows)
+        stats["duplicates"] = len(owner_of)
+    return new_wb
+
+# ---------- 批量模式(无界面, 多进程) ----------
+BATCH_MODES = ("row", "col", "red", "filter", "dedupe")
+BOOK_SUFFIXES = (".xlsx", ".xlsm")
+
+def parse_indices(value, columns=False):
+    """
+    "3,1,5" / [3, 1, 5] -> [3, 1, 5]; "all" / "*" / 空 -> None(全部)。
+    columns=True 时也接受列字母, 如 "C,A,E"。
+    """
+    if value is None:
+        return None
+    items = value if isinstance(value, (list, tuple)) else str(value).split(",")
+    items = [str(x).strip() for x in items if str(x).strip()]
+    if not items or (len(items) == 1 and items[0].lower() in ("all", "*")):
+        return None
+    out = []
+    for x in items:
+        if x.isdigit():
+            out.append(int(x))
+        elif columns and x.isalpha():
+            out.append(column_index_from_string(x.upper()))
+        else:
+            raise ValueError(f"无效的{'列' if columns else '行/列'}编号: {x}")
+    check_indices(out)
+    return out
+
+def expand_files(patterns):
+    """文件/通配符(支持 **) -> 去重后的工作簿路径; 跳过 Excel 的 ~$ 临时文件。匹配不到的原样保留, 由任务报错"""
+    out = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matched = sorted(glob.glob(pattern, recursive=True))
+            out.extend(p for p in matched if p.lower().endswith(BOOK_SUFFIXES)
+                       and not os.path.basename(p).startswith("~$"))
+        else:
+            out.append(pattern)
+    return list(dict.fromkeys(out))
+
+def _safe_filename(name):
+    return re.sub(r'[\\/:*?"<>|]+', '_', name).strip() or '_'
+
+def normalize_job(job):
+    """
+    任务说明(dict) -> 校验并补默认值后的任务:
+    files(文件或通配符列表), sheet(表名或从 1 开始的序号, 默认活动表), mode(row/col/red/filter/dedupe),
+    indices(row/col 模式的编号), filter_cols(red 模式判断红字的列, 任一列红色即选中),
+    where(filter 模式的条件, 见 RowFilter), header(filter/dedupe 模式首行为列名, 默认是),
+    key_cols(dedupe 模式比较的列, 默认整行), keep(dedupe 模式保留 first/last), report(dedupe 模式附重复行表),
+    cols(red/filter/dedupe 模式提取的列, 默认全部), keep_style, out_dir, name(输出文件名模板)。
+    name 可用 {stem}(源文件名) {sheet} {mode} {n}(序号), 默认 "{stem}_{mode}.xlsx"。
+    """
+    files = job.get("files") or []
+    if isinstance(files, str):
+        files = [files]
+    mode = str(job.get("mode", "")).lower()
+    if mode == "more":    # 与交互模式的叫法一致
+        mode = "red"
+    if mode not in BATCH_MODES:
+        raise ValueError(f"mode 须为 {'/'.join(BATCH_MODES)}: {job.get('mode')!r}")
+    if not files:
+        raise ValueError("任务没有指定 files")
+    out = {
+        "files": list(files),
+        "sheet": job.get("sheet"),
+        "mode": mode,
+        "indices": parse_indices(job.get("indices"), columns=mode == "col"),
+        "filter_cols": parse_indices(job.get("filter_cols"), columns=True),
+        "where": job.get("where"),
+        "header": bool(job.get("header", True)),
+        "key_cols": parse_indices(job.get("key_cols"), columns=True),
+        "keep": str(job.get("keep") or "first").lower(),
+        "report": bool(job.get("report", False)),
+        "cols": parse_indices(job.get("cols"), columns=True),
+        "keep_style": bool(job.get("keep_style", False)),
+        "out_dir": job.get("out_dir") or ".",
+        "name": job.get("name") or "{stem}_{mode}.xlsx",
+    }
+    if mode == "red" and not out["filter_cols"]:
+        raise ValueError("red 模式需要 filter_cols")
+    if mode == "filter":
+        if not out["where"]:
+            raise ValueError("filter 模式需要 where")
+        RowFilter(out["where"])    # 先编译一次, 条件写错时整批不开始
+    if mode == "dedupe" and out["keep"] not in KEEP_CHOICES:
+        raise ValueError(f"keep 须为 {'/'.join(KEEP_CHOICES)}: {out['keep']!r}")
+    return out
+
+def plan_batch(jobs):
+    """展开各任务的文件 -> [(源文件, 任务, 输出文件或 None, 错误或 None)], 输出重名的后者记为错误"""
+    tasks, taken, n = [], set(), 0
+    for job in jobs:
+        for path in expand_files(job["files"]):
+            n += 1
+            sheet = "" if job["sheet"] is None else str(job["sheet"])
+            stem = os.path.splitext(os.path.basename(path))[0]
+            name = _safe_filename(job["name"].format(stem=stem, sheet=sheet, mode=job["mode"], n=n))
+            output = os.path.abspath(os.path.join(job["out_dir"], name))
+            error = None
+            if output in taken:
+                error = f"输出文件重名: {output}"
+            elif output == os.path.abspath(path):
+                error = "输出文件与源文件相同"
+            else:
+                taken.add(output)
+            tasks.append((path, job, output, error))
+    return tasks
+
+def _open_sheet(wb, sheet):
+    # 表名优先, 否则按从 1 开始的序号; None 为活动表
+    if sheet is None:
+        return wb.active
+    if str(sheet) in wb.sheetnames:
+        return wb[str(sheet)]
+    if str(sheet).isdigit() and 1 <= int(sheet) <= len(wb.sheetnames):
+        return wb[wb.sheetnames[int(sheet) - 1]]
+    raise ValueError(f"找不到工作表: {sheet}")
 
-def main():
+def _copy_worker(file_path, job, output_file):
+    """子进程: 处理一个工作簿, 返回 (源表行数, 写出行数, 用时); red/filter 模式没有选中行时不写出, 写出行数为 0"""
+    t0 = time.perf_counter()
+    wb = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        sheet = _open_sheet(wb, job["sheet"])
+        mode, indices, cols = job["mode"], job["indices"], None
+        if mode == "red":
+            indices = scan_font_rows(file_path, sheet.title, job["filter_cols"])
+            if not indices:
+                return sheet.max_row or 0, 0, time.perf_counter() - t0
+            mode, cols = "row", job["cols"]
+        elif mode == "filter":
+            indices = filter_rows(file_path, sheet.title, job["where"], job["header"])
+            if len(indices) == int(job["header"]):
+                return sheet.max_row or 0, 0, time.perf_counter() - t0
+            mode, cols = "row", job["cols"]
+        layout = read_sheet_layout(file_path, sheet.title) if job["keep_style"] else None
+        stats = {}
+        if mode == "dedupe":
+            new_wb = dedupe_rows(sheet, file_path, job["key_cols"], job["keep"], job["header"], job["keep_style"],
+                                 cols=job["cols"], report=job["report"], layout=layout, stats=stats)
+        else:
+            new_wb = stream_rows_or_cols(sheet, indices, mode, job["keep_style"], cols=cols, layout=layout, stats=stats)
+    finally:
+        wb.close()
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    new_wb.save(output_file)
+    return stats["rows"], stats["out_rows"], time.perf_counter() - t0
+
+def run_batch(jobs, workers=None):
+    """
+    jobs 为任务说明列表(见 normalize_job)。每个源文件一个子进程任务, 单个文件失败不影响其它文件。
+    返回每个文件的结果 dict(file/output/rows/out_rows/seconds/error)。
+    """
+    t0 = time.perf_counter()
+    tasks = plan_batch([normalize_job(j) for j in jobs])
+    results = []
+    pending = [t for t in tasks if t[3] is None]
+    for path, _, output, error in tasks:
+        if error is not None:
+            results.append({"file": path, "output": None, "rows": 0, "out_rows": 0, "seconds": 0.0, "error": error})
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers or min(len(pending), os.cpu_count() or 1)) as pool:
+            futures = {pool.submit(_copy_worker, path, job, output): (path, job, output)
+                       for path, job, output, _ in pending}
+            for fut in as_completed(futures):
+                path, job, output = futures[fut]
+                res = {"file": path, "output": output, "rows": 0, "out_rows": 0, "seconds": 0.0, "error": None}
+                try:
+                    res["rows"], res["out_rows"], res["seconds"] = fut.result()
+                    if job["mode"] in ("red", "filter") and res["out_rows"] == 0:
+                        res["output"] = None
+                except Exception as e:
+                    res["output"] = None
+                    res["error"] = f"{type(e).__name__}: {e}"
+                results.append(res)
+
+    results.sort(key=lambda r: r["file"])
+    print_batch_summary(results, time.perf_counter() - t0)
+    return results
+
+def print_batch_summary(results, total_s):
+    failed = [r for r in results if r["error"]]
+    print(f"\n{'文件':<40} {'源行数':>8} {'写出行数':>8} {'用时(s)':>8}  状态")
+    for r in results:
+        if r["error"]:
+            status = f"失败: {r['error']}"
+        else:
+            status = r["output"] or "没有选中的行, 未写出"
+        print(f"{os.path.basename(r['file'])[:40]:<40} {r['rows']:>8} {r['out_rows']:>8} {r['seconds']:>8.2f}  {status}")
+    done = len(results) - len(failed)
+    rows = sum(r["rows"] for r in results if not r["error"])
+    rate = f"{done / total_s:.2f} 文件/s, {rows / total_s:,.0f} 行/s" if total_s > 0 else ""
+    print(f"\n共 {len(results)} 个文件, 成功 {done}, 失败 {len(failed)}, 总用时 {total_s:.2f}s  {rate}")
+
+def read_job_spec(path):
+    # JSON: 单个任务对象或任务列表, 键同 normalize_job
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    return spec if isinstance(spec, list) else [spec]
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="按行/列/红色字体复制工作簿内容: 不带参数时交互运行, 带 --files / --spec 时无界面批量运行")
+    ap.add_argument("--files", nargs="+", help="源工作簿, 可用通配符(如 \"in/**/*.xlsx\")")
+    ap.add_argument("--spec", help="JSON 任务文件: 一个任务或任务列表, 键同下面的参数(files/sheet/mode/indices/...)")
+    ap.add_argument("--sheet", default=None, help="表名或从 1 开始的序号, 默认活动表")
+    ap.add_argument("--mode", choices=BATCH_MODES, default="row",
+                    help="row/col 复制指定行/列, red 复制红字行, filter 复制满足 --where 的行")
+    ap.add_argument("--indices", default="all", help='row/col 模式的编号, 如 "3,1,5", col 模式也可用 "C,A,E"; 默认全部')
+    ap.add_argument("--filter-cols", default=None, help="red 模式判断红字的列, 任一列红色即选中")
+    ap.add_argument("--where", default=None, help='filter 模式的条件, 如 "$7 > 10000 and $2 startswith \'HK\'"')
+    ap.add_argument("--no-header", action="store_true", help="filter/dedupe 模式首行也参与判断(默认首行为列名, 总是保留)")
+    ap.add_argument("--key-cols", default="all", help="dedupe 模式比较的列, 如 \"A,C\"; 默认整行")
+    ap.add_argument("--keep", choices=KEEP_CHOICES, default="first", help="dedupe 模式保留第一次还是最后一次出现的行")
+    ap.add_argument("--report", action="store_true", help="dedupe 模式另附 Duplicates 表列出被去掉的行")
+    ap.add_argument("--cols", default="all", help="red/filter/dedupe 模式提取的列(按顺序), 默认全部")
+    ap.add_argument("--keep-style", action="store_true", help="保留单元格格式与列宽/行高/合并单元格")
+    ap.add_argument("--out-dir", default=".", help="输出目录, 默认当前目录")
+    ap.add_argument("--name", default="{stem}_{mode}.xlsx", help="输出文件名模板, 可用 {stem} {sheet} {mode} {n}")
+    ap.add_argument("--workers", type=int, default=None, help="进程数, 默认 CPU 核数")
+    args = ap.parse_args(argv)
+    if args.mode == "red" and args.files and not args.filter_cols:
+        ap.error("--mode red 需要 --filter-cols")
+    if args.mode == "filter" and args.files and not args.where:
+        ap.error("--mode filter 需要 --where")
+    return args
+
+def main_interactive():
     file_path = select_file()
     if not file_path:
         print("未选择文件，程序已退出。")
         return
 
-    wb = openpyxl.load_workbook(file_path)
+    # 只需单元格值(和格式), 用只读模式流式读取; 红字筛选直接读样式表与工作表 XML, 条件筛选只读用到的列
+    wb = openpyxl.load_workbook(file_path, read_only=True)
     sheet = choose_sheet(wb)
 
-    mode = input("\n请输入模式 (row, col, more): ").strip().lower()
+    mode = input("\n请输入模式 (row, col, more, filter, dedupe): ").strip().lower()
 
     if mode == "row" or mode == "col":
         try:
             index_str = input(f"请输入要复制的{mode}编号(用英文逗号分隔，如 3,1,5): ")
             
             if index_str.lower() in ("all", "*"):
-                if mode == "row":
-                    indices = list(range(1, sheet.max_row + 1))
-                else:  # mode == "col"
-                    indices = list(range(1, sheet.max_column + 1))
+                indices = None
             else:
                 indices = [int(x.strip()) for x in index_str.split(",") if x.strip().isdigit()]
 
             keep_style = input("是否保留单元格格式? (y/n): ").strip().lower() == "y"
 
-            copy_rows_or_cols(sheet, indices, mode, keep_style)
+            layout = read_sheet_layout(file_path, sheet.title) if keep_style else None
+            save_new_workbook(stream_rows_or_cols(sheet, indices, mode, keep_style, layout=layout))
 
         except Exception as e:
             print(f"发生错误: {e}")
+        finally:
+            wb.close()
         return
 
     elif mode == "more":
@@ -155,8 +1151,12 @@ def main():
             if show_col == "y":
                 display_column_headers(sheet)
 
-            filter_col = int(input("请输入用于筛选红色字体的列编号: "))
-            red_rows = find_rows_with_red_font(sheet, filter_col)
+            filter_input = input("请输入用于筛选红色字体的列编号(多列用英文逗号分隔, 任一列红色即选中): ")
+            filter_cols = [int(c.strip()) for c in filter_input.split(",") if c.strip().isdigit()]
+            if not filter_cols:
+                print("未输入有效的列编号。")
+                return
+            red_rows = scan_font_rows(file_path, sheet.title, filter_cols)
 
             if not red_rows:
                 print("未找到任何字体为红色的单元格。")
@@ -171,7 +1171,7 @@ def main():
             col_input = input("请输入要提取的列编号 (按顺序，用英文逗号分隔，如 4,1): ")
             
             if col_input.lower() in ("all", "*"):
-                selected_cols = list(range(1, sheet.max_column + 1))
+                selected_cols = None
             else:
                 selected_cols = [int(c.strip()) for c in col_input.split(",") if c.strip().isdigit()]
                 if not selected_cols:
@@ -180,14 +1180,83 @@ def main():
 
             keep_style = input("是否保留单元格格式? (y/n): ").strip().lower() == "y"
 
-            copy_selected_cells(sheet, red_rows, selected_cols, keep_style)
+            layout = read_sheet_layout(file_path, sheet.title) if keep_style else None
+            save_new_workbook(stream_rows_or_cols(sheet, red_rows, "row", keep_style, cols=selected_cols, layout=layout))
 
         except Exception as e:
             print(f"发生错误: {e}")
+        finally:
+            wb.close()
+        return
+
+    elif mode == "filter":
+        try:
+            display_column_headers(sheet)
+            print('条件示例: $7 > 10000 and $2 startswith "HK"; 也支持 between/in/contains/matches/is empty/or/not')
+            where = RowFilter(input("请输入筛选条件: ").strip())
+            header = input("首行是否为列名(不参与筛选, 总是保留)? (y/n): ").strip().lower() != "n"
+            rows = filter_rows(file_path, sheet.title, where, header)
+            if len(rows) == int(header):
+                print("没有符合条件的行。")
+                return
+            print(f"共找到 {len(rows) - int(header)} 行符合条件。")
+
+            col_input = input("请输入要提取的列编号 (按顺序，用英文逗号分隔，如 4,1; all 为全部): ")
+            selected_cols = parse_indices(col_input, columns=True)
+            keep_style = input("是否保留单元格格式? (y/n): ").strip().lower() == "y"
+
+            layout = read_sheet_layout(file_path, sheet.title) if keep_style else None
+            save_new_workbook(stream_rows_or_cols(sheet, rows, "row", keep_style, cols=selected_cols, layout=layout))
+
+        except Exception as e:
+            print(f"发生错误: {e}")
+        finally:
+            wb.close()
+        return
+
+    elif mode == "dedupe":
+        try:
+            display_column_headers(sheet)
+            key_cols = parse_indices(input("请输入用于判断重复的列编号 (如 1,3 或 A,C; all 为整行): "), columns=True)
+            keep = "last" if input("重复时保留第一次还是最后一次出现的行? (first/last): ").strip().lower() == "last" else "first"
+            header = input("首行是否为列名(不参与比较, 总是保留)? (y/n): ").strip().lower() != "n"
+            report = input("是否附加 Duplicates 表列出被去掉的行? (y/n): ").strip().lower() == "y"
+            keep_style = input("是否保留单元格格式? (y/n): ").strip().lower() == "y"
+
+            layout = read_sheet_layout(file_path, sheet.title) if keep_style else None
+            stats = {}
+            new_wb = dedupe_rows(sheet, file_path, key_cols, keep, header, keep_style,
+                                 report=report, layout=layout, stats=stats)
+            print(f"共 {stats['rows']} 行, 去掉重复行 {stats['duplicates']} 行。")
+            save_new_workbook(new_wb)
+
+        except Exception as e:
+            print(f"发生错误: {e}")
+        finally:
+            wb.close()
         return
 
     else:
+        wb.close()
         print("无效的模式输入，程序结束。")
 
+def main(argv=None):
+    args = parse_args(argv)
+    if not (args.files or args.spec):
+        main_interactive(); return
+    jobs = read_job_spec(args.spec) if args.spec else []
+    if args.files:
+        jobs.append({"files": args.files, "sheet": args.sheet, "mode": args.mode, "indices": args.indices,
+                     "filter_cols": args.filter_cols, "where": args.where, "header": not args.no_header,
+                     "key_cols": args.key_cols, "keep": args.keep, "report": args.report,
+                     "cols": args.cols, "keep_style": args.keep_style,
+                     "out_dir": args.out_dir, "name": args.name})
+    try:
+        results = run_batch(jobs, workers=args.workers)
+    except ValueError as e:
+        print(f"任务说明有误: {e}")
+        sys.exit(2)
+    sys.exit(1 if any(r["error"] for r in results) else 0)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,28 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_tool(filename: str, name: str):
+    """按文件路径导入工具脚本(文件名带空格, 不能直接 import); 注册到 sys.modules 以便 pickle"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+@pytest.fixture(scope="session")
+def ar():
+    mod = load_tool("AR Interpreter.py", "ar_interpreter")
+    mod.load_heavy_modules()
+    mod.CACHE_ENABLED = False
+    return mod
+
+@pytest.fixture(scope="session")
+def ed():
+    return load_tool("ExcelDuplicator.py", "excel_duplicator")
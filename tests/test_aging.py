@@ -0,0 +1,177 @@
+"""
+发票到期日: 文字日期只按年在前或 --date-order 指定的顺序解析, 解析不了的行数报出来, 不去猜;
+各桶边界(恰好等于上限的天数归入该桶)、未到期的发票, 以及 run_aging 的各公司工作簿与截止日对比表
+"""
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+def _days(ar, values, date_order):
+    out = ar.due_day_numbers(pd.Series(values, dtype=object), date_order)
+    return [None if d == ar._NO_DUE else date.fromordinal(date(1970, 1, 1).toordinal() + int(d)) for d in out]
+
+@pytest.mark.parametrize("date_order", ["ymd", "dmy", "mdy"])
+def test_unambiguous_values_parse_in_every_order(ar, date_order):
+    values = ["2024-03-04", "2024-3-4", " 2024/03/04 ", "2024.03.04", "2024-03-04 13:00:00",
+              datetime(2024, 3, 4, 5), date(2024, 3, 4), pd.Timestamp("2024-03-04"), 45355]
+    assert _days(ar, values, date_order) == [date(2024, 3, 4)] * len(values)
+
+@pytest.mark.parametrize("date_order, expected", [
+    ("ymd", [None, None, None]),
+    ("dmy", [date(2024, 4, 3), date(2024, 12, 31), None]),
+    ("mdy", [date(2024, 3, 4), None, date(2024, 12, 31)]),
+])
+def test_day_month_text_follows_date_order(ar, date_order, expected):
+    assert _days(ar, ["03/04/2024", "31/12/2024", "12/31/2024"], date_order) == expected
+
+def test_invalid_values_are_not_guessed(ar):
+    assert _days(ar, ["2024-02-30", "abc", "", None, np.nan, pd.NaT, 0], "dmy") == [None] * 7
+
+def test_unparsed_due_dates_are_reported(ar, tmp_path):
+    path = str(tmp_path / "invoices.xlsx")
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Company", "Customer ID", "Amount", "Due Date"])
+    ws.append(["Acme", 1, 10, "2024-03-04"])
+    ws.append(["Acme", 2, 20, "03/04/2024"])
+    ws.append(["Acme", 3, 30, "31/12/2024"])
+    ws.append(["Acme", 4, None, "later"])          # 没有金额的行不是数据行, 不报
+    wb.save(path)
+
+    with pytest.raises(ValueError, match=r"有 2 行 Due Date 解析不了"):
+        ar.load_invoices(path)
+    inv_df, _, _ = ar.load_invoices(path, date_order="dmy")
+    assert inv_df[ar._DUE_DAY].tolist() == [ar.day_number(date(2024, 3, 4)), ar.day_number(date(2024, 4, 3)),
+                                            ar.day_number(date(2024, 12, 31))]
+
+def expected_bucket(overdue: int) -> str:
+    """逐条写出的分桶规则(与 AGING_DAYS 无关)"""
+    if overdue <= 0:
+        return 'Current'
+    if overdue <= 30:
+        return '1-30'
+    if overdue <= 60:
+        return '31-60'
+    if overdue <= 90:
+        return '61-90'
+    if overdue <= 365:
+        return '91-365'
+    if overdue <= 730:
+        return '366-730'
+    return '731+'
+
+OVERDUE_DAYS = [-400, -1, 0, 1, 30, 31, 60, 61, 90, 91, 365, 366, 730, 731, 5000]
+
+def test_bucket_boundaries(ar):
+    as_of = [ar.day_number(date(2025, 3, 31)), ar.day_number(date(2024, 2, 29))]
+    due = np.array([as_of[0] - d for d in OVERDUE_DAYS], dtype=np.int64)
+    got = ar.aging_buckets(due, as_of)
+    assert got.shape == (2, len(due))
+    assert [ar.PIVOT_BUCKETS[i] for i in got[0]] == [expected_bucket(d) for d in OVERDUE_DAYS]
+    shift = as_of[1] - as_of[0]
+    assert [ar.PIVOT_BUCKETS[i] for i in got[1]] == [expected_bucket(d + shift) for d in OVERDUE_DAYS]
+
+def test_aged_master_places_amount_in_one_bucket(ar):
+    inv_df = pd.DataFrame({'Company': ["A", "A", "A"], 'Customer ID': [1, 2, 3], 'Amount': [1.5, -2.0, 0.0],
+                           ar._DUE_DAY: [0, 0, 0]})
+    aged = ar.aged_master(inv_df, np.array([0, 6, 3], dtype=np.int8), inv_df['Amount'].to_numpy())
+    assert ar._DUE_DAY not in aged.columns
+    cells = aged[ar.PIVOT_BUCKETS].to_numpy()
+    assert [list(np.flatnonzero(~np.isnan(r))) for r in cells] == [[0], [6], [3]]
+    assert cells[[0, 1, 2], [0, 6, 3]].tolist() == [1.5, -2.0, 0.0]
+
+def _write_invoices(path: str, rows: list[list]):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Invoice aging export"])
+    ws.append([])
+    ws.append(["Company", "Customer ID", "Invoice", "Amount", "Due Date"])
+    for r in rows:
+        ws.append(r)
+    ws.append([])
+    ws.append(["All Companies", None, None, 12345, None])   # 合计行没有 Customer ID, 不是数据行
+    wb.save(path)
+
+def _write_customers(path: str):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "export"
+    ws.append(["Number", "Name", "Salesman"])
+    for i in (1, 2, 3):
+        ws.append([i, f"C{i}", f"S{i % 2}"])
+    wb.save(path)
+
+def _dec(v) -> Decimal:
+    return Decimal(str(v)).quantize(Decimal("0.00001"), rounding=ROUND_HALF_UP)
+
+def test_run_aging_workbooks_and_compare(ar, tmp_path):
+    as_of = [date(2025, 3, 31), date(2025, 6, 30)]
+    rows, invoices = [], []
+    for n, overdue in enumerate(OVERDUE_DAYS * 2):
+        due = as_of[0] - timedelta(days=overdue)
+        company = ["Acme", "Beta"][n % 2]
+        cid = n % 4 + 1                            # 4 不在客户表: Unassigned
+        amount = round((n + 1) * 101.25 - 700, 2) if n % 5 else -0.000005 * n
+        cell = [datetime.combine(due, datetime.min.time()), due, due.isoformat(),
+                (due - date(1899, 12, 30)).days][n % 4]
+        rows.append([company, cid, f"INV{n}", amount, cell])
+        invoices.append((company, {1: "S1", 2: "S0", 3: "S1"}.get(cid, "Unassigned"), amount, due))
+    src = str(tmp_path / "invoices.xlsx")
+    customers = str(tmp_path / "customers.xlsx")
+    _write_invoices(src, rows)
+    _write_customers(customers)
+
+    # 期望值: 逐张发票按逾期天数分桶, Decimal 求和
+    expected = {}
+    for label, d in ((d.isoformat(), d) for d in as_of):
+        for company, salesman, amount, due in invoices:
+            bucket = expected_bucket((d - due).days)
+            for c in (bucket, 'Total'):
+                key = (label, company, salesman, c)
+                expected[key] = expected.get(key, Decimal(0)) + _dec(amount)
+
+    out_dir = str(tmp_path / "out")
+    results = ar.run_aging(src, customers, out_dir, as_of, workers=2)
+    assert not any(r['error'] for r in results)
+    assert sorted((r['company'], r['as_of']) for r in results) == \
+        [(c, d.isoformat()) for c in ("Acme", "Beta") for d in as_of]
+
+    for r in results:
+        pivot = pd.read_excel(r['output'], sheet_name='Pivot')
+        for _, row in pivot.iterrows():
+            for c in ar.PIVOT_BUCKETS + ['Total']:
+                want = expected.get((r['as_of'], r['company'], row['Salesman'], c), Decimal(0))
+                assert row[c] == float(want), (r['as_of'], r['company'], row['Salesman'], c)
+        assert r['rows'] == len(OVERDUE_DAYS)
+
+    sheets = pd.read_excel(os.path.join(out_dir, "AR Aging Compare.xlsx"), sheet_name=None)
+    labels = [d.isoformat() for d in as_of]
+    for c in ar.PIVOT_BUCKETS + ['Total']:
+        trend = sheets[f"Trend {c}"]
+        assert list(trend.columns) == ['Company', 'Salesman', *labels]
+        body, grand = trend.iloc[:-1], trend.iloc[-1]
+        for _, row in body.iterrows():
+            for label in labels:
+                want = expected.get((label, row['Company'], row['Salesman'], c), Decimal(0))
+                assert row[label] == float(want), (c, label, row['Company'], row['Salesman'])
+        assert len(body) == len({(co, s) for co, s, _, _ in invoices})
+        for label in labels:
+            want = sum((v for k, v in expected.items() if k[0] == label and k[3] == c), Decimal(0))
+            assert grand[label] == float(want), (c, label)
+
+def test_run_aging_rejects_unparsed_due_dates(ar, tmp_path):
+    src, customers = str(tmp_path / "invoices.xlsx"), str(tmp_path / "customers.xlsx")
+    _write_invoices(src, [["Acme", 1, "INV1", 10, "2025-01-31"], ["Acme", 2, "INV2", 20, "31/01/2025"]])
+    _write_customers(customers)
+    out_dir = tmp_path / "out"
+    with pytest.raises(ValueError, match="有 1 行 Due Date 解析不了"):
+        ar.run_aging(src, customers, str(out_dir), [date(2025, 3, 31)], workers=1)
+    assert not out_dir.exists()
+    results = ar.run_aging(src, customers, str(out_dir), [date(2025, 3, 31)], workers=1, date_order="dmy")
+    pivot = pd.read_excel(results[0]['output'], sheet_name='Pivot')
+    assert pivot.set_index('Salesman').loc[['S1', 'S0'], '31-60'].tolist() == [10, 20]
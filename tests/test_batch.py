@@ -0,0 +1,123 @@
+"""
+批量/趋势模式: 输出文件名重名时后者记为失败; 输出目录不存在时先创建;
+趋势表每一格都与该期总表单独生成的 Pivot 一致
+"""
+import os
+import random
+
+import pandas as pd
+from openpyxl import Workbook
+
+def write_master(path: str, rows: list[list], buckets: list[str]):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["AR Aging"])
+    ws.append(["Company", "Customer ID", "Customer Name", *buckets])
+    for r in rows:
+        ws.append(r)
+    wb.save(path)
+
+def write_customers(path: str, rows: list[list]):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "export"
+    ws.append(["Number", "Name", "Salesman"])
+    for r in rows:
+        ws.append(r)
+    wb.save(path)
+
+def test_plan_outputs_detects_collisions(ar, tmp_path):
+    planned = ar._plan_outputs(str(tmp_path), {"A/B": "A/B.xlsx", "A:B": "A:B.xlsx", "Acme": "Acme.xlsx",
+                                               "ACME": "ACME.xlsx", "Beta": "Beta.xlsx"})
+    assert planned["A/B"][1] is None and planned["Acme"][1] is None and planned["Beta"][1] is None
+    assert "重名" in planned["A:B"][1] and "重名" in planned["ACME"][1]
+    assert planned["A:B"][0] == planned["A/B"][0]
+
+def test_run_batch_reports_colliding_outputs(ar, tmp_path):
+    master, customers = str(tmp_path / "master.xlsx"), str(tmp_path / "customers.xlsx")
+    zeros = [0] * (len(ar.PIVOT_BUCKETS) - 1)
+    write_master(master, [["A/B", 1, "C1", 10, *zeros], ["A:B", 2, "C2", 20, *zeros],
+                          ["Acme", 1, "C1", 30, *zeros], ["ACME", 2, "C2", 40, *zeros],
+                          ["Beta", 3, "C3", 50, *zeros]], ar.PIVOT_BUCKETS)
+    write_customers(customers, [[1, "C1", "S1"], [2, "C2", "S2"], [3, "C3", "S1"]])
+
+    out_dir = str(tmp_path / "out")
+    results = {r['company']: r for r in ar.run_batch(master, customers, out_dir, workers=1)}
+    failed = {c for c, r in results.items() if r['error']}
+    # 公司按名称排序后先到先得: "A/B" < "A:B", "ACME" < "Acme"
+    assert failed == {"A:B", "Acme"}
+    assert all("重名" in results[c]['error'] for c in failed)
+    assert sorted(os.listdir(out_dir)) == ["ACME.xlsx", "A_B.xlsx", "Beta.xlsx"]
+
+def test_run_trend_creates_output_dir(ar, tmp_path):
+    customers = str(tmp_path / "customers.xlsx")
+    write_customers(customers, [[1, "C1", "S1"], [2, "C2", "S2"]])
+    zeros = [0] * (len(ar.PIVOT_BUCKETS) - 1)
+    masters = []
+    for period, amount in (("2025-01", 10), ("2025-02", 20)):
+        path = str(tmp_path / f"AR {period}.xlsx")
+        write_master(path, [["Acme", 1, "C1", amount, *zeros], ["Acme", 2, "C2", 5, *zeros]], ar.PIVOT_BUCKETS)
+        masters.append(path)
+
+    output = str(tmp_path / "new" / "dir" / "AR Trend.xlsx")
+    results = ar.run_trend(masters, customers, output, workers=1)
+    assert not any(r['error'] for r in results)
+    assert os.path.exists(output)
+
+def _single_period_pivots(ar, master: str, sales: pd.DataFrame) -> dict:
+    """单期总表各公司单独生成的 Pivot -> {(公司, Salesman, 桶): 值}"""
+    master_df, company_col, companies = ar.load_master(master)
+    keys = ar.company_keys(master_df[company_col])
+    out = {}
+    for company in companies:
+        pivot = ar.build_company_sheets(master_df.loc[keys == company], sales)['Pivot']
+        for _, row in pivot.iterrows():
+            for c in ar.PIVOT_BUCKETS + ['Total']:
+                out[company, row['Salesman'], c] = row[c]
+    return out
+
+def test_trend_cells_match_single_period_pivots(ar, tmp_path):
+    rnd = random.Random(3)
+    customers = str(tmp_path / "customers.xlsx")
+    write_customers(customers, [[i, f"C{i}", f"S{i % 3}"] for i in range(1, 8)])
+    sales = ar.read_default_sales(customers)
+
+    def value():
+        return rnd.choice([round(rnd.uniform(-1e4, 1e5), rnd.choice((0, 2, 5))), None, "12.345",
+                           0.000005, -0.0, rnd.randrange(-10 ** 6, 10 ** 6)])
+
+    expected, periods, masters = {}, ["2025-01", "2025-02", "2025-03"], []
+    for period in periods:
+        # 2025-02 没有 Beta: 趋势表里补 0; ID 8/9 不在客户表: Unassigned
+        names = ["Acme"] if period == "2025-02" else ["Acme", "Beta", " Beta "]
+        rows = [[rnd.choice(names), rnd.randrange(1, 10), "x", *(value() for _ in ar.PIVOT_BUCKETS)]
+                for _ in range(60)]
+        path = str(tmp_path / f"AR {period}.xlsx")
+        write_master(path, rows, ar.PIVOT_BUCKETS)
+        masters.append(path)
+        for (company, salesman, c), v in _single_period_pivots(ar, path, sales).items():
+            expected[c, company, salesman, period] = v
+
+    output = str(tmp_path / "AR Trend.xlsx")
+    assert not any(r['error'] for r in ar.run_trend(masters[::-1], customers, output, workers=2))
+    sheets = pd.read_excel(output, sheet_name=None)
+
+    for c in ar.PIVOT_BUCKETS + ['Total']:
+        trend = sheets[f"Trend {c}"]
+        assert list(trend.columns) == ['Company', 'Salesman', *periods]
+        body, grand = trend.iloc[:-1], trend.iloc[-1]
+        got = {(c, row['Company'], row['Salesman'], p): row[p] for _, row in body.iterrows() for p in periods}
+        want = {k: expected.get(k, 0.0) for k in got}
+        assert got == want, c
+        assert {k for k in expected if k[0] == c} <= set(got)
+        # 合计行: 各期所有公司 Pivot 的精确(定点)求和
+        assert grand['Company'] == 'Grand Total'
+        for p in periods:
+            total = sum(int(ar.to_fixed5(pd.Series([v]))[0][0]) for k, v in expected.items()
+                        if k[0] == c and k[3] == p)
+            assert grand[p] == ar.fixed5_to_float(pd.Series([total]).to_numpy())[0], (c, p)
+
+    by_period = sheets['By Period']
+    got = {(c, row['Company'], row['Salesman'], row['Period']): row[c]
+           for _, row in by_period.iterrows() for c in ar.PIVOT_BUCKETS + ['Total']}
+    assert got == expected
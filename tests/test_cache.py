@@ -0,0 +1,118 @@
+"""解析缓存: 路径+大小+修改时间命中; 内容变了重新解析; 只改修改时间但内容相同仍命中; 超过容量按 LRU 淘汰"""
+import itertools
+import json
+import os
+
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def cache(ar, tmp_path, monkeypatch):
+    monkeypatch.setattr(ar, "CACHE_ENABLED", True)
+    monkeypatch.setattr(ar, "CACHE_DIR", str(tmp_path / "cache"))
+    clock = itertools.count(1000)
+    monkeypatch.setattr(ar.time, "time", lambda: float(next(clock)))   # last_used 严格递增
+    return ar
+
+class Loader:
+    def __init__(self, value):
+        self.value, self.calls = value, 0
+
+    def __call__(self):
+        self.calls += 1
+        return pd.DataFrame({'v': [self.value]})
+
+def _write(path, data: bytes, mtime_ns: int):
+    path.write_bytes(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def _index(ar) -> dict:
+    with open(os.path.join(ar.CACHE_DIR, "index.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+def test_hit_and_miss_on_change(cache, tmp_path):
+    ar, src = cache, tmp_path / "a.xlsx"
+    _write(src, b"aaaa", 10 ** 18)
+    load = Loader(1)
+    assert ar.cached_read(str(src), "k", load)['v'].tolist() == [1]
+    assert ar.cached_read(str(src), "k", load)['v'].tolist() == [1]
+    assert load.calls == 1
+
+    ar.cached_read(str(src), "other", load)               # 同一文件的另一种读法单独缓存
+    assert load.calls == 2
+
+    _write(src, b"bbbb", 2 * 10 ** 18)                     # 大小相同, 内容和修改时间都变
+    assert ar.cached_read(str(src), "k", Loader(2))['v'].tolist() == [2]
+    _write(src, b"bbbbb", 2 * 10 ** 18)                    # 修改时间相同, 大小变了
+    assert ar.cached_read(str(src), "k", Loader(3))['v'].tolist() == [3]
+
+def test_touch_without_content_change_hits(cache, tmp_path):
+    ar, src = cache, tmp_path / "a.xlsx"
+    _write(src, b"same", 10 ** 18)
+    ar.cached_read(str(src), "k", Loader(1))
+    _write(src, b"same", 3 * 10 ** 18)
+    load = Loader(2)
+    assert ar.cached_read(str(src), "k", load)['v'].tolist() == [1]
+    assert load.calls == 0
+    # 新的修改时间记回索引, 下次不必再算哈希
+    assert [e["mtime_ns"] for e in _index(ar).values()] == [3 * 10 ** 18]
+
+def test_lru_eviction_under_size_cap(cache, tmp_path, monkeypatch):
+    ar = cache
+    files = []
+    for name in "abc":
+        src = tmp_path / f"{name}.xlsx"
+        _write(src, name.encode(), 10 ** 18)
+        files.append(str(src))
+    ar.cached_read(files[0], "k", Loader(0))
+    entry_bytes = next(iter(_index(ar).values()))["bytes"]
+    monkeypatch.setattr(ar, "CACHE_MAX_BYTES", entry_bytes * 2 + entry_bytes // 2)   # 只放得下两条
+
+    ar.cached_read(files[1], "k", Loader(1))
+    ar.cached_read(files[0], "k", Loader(0))               # 命中, a 成为最近使用
+    ar.cached_read(files[2], "k", Loader(2))               # 超限: 淘汰最久未用的 b
+    assert sorted(os.path.basename(e["path"]) for e in _index(ar).values()) == ["a.xlsx", "c.xlsx"]
+    assert len([f for f in os.listdir(ar.CACHE_DIR) if f.endswith(".pkl")]) == 2
+
+    load = Loader(1)
+    ar.cached_read(files[1], "k", load)
+    assert load.calls == 1
+
+def test_invalidate_and_corrupt_entry(cache, tmp_path):
+    ar, src = cache, tmp_path / "a.xlsx"
+    _write(src, b"aaaa", 10 ** 18)
+    ar.cached_read(str(src), "k", Loader(1))
+    ar.cached_read(str(src), "k2", Loader(1))
+    assert ar.invalidate_cache(str(src)) == 2
+    assert ar.cached_read(str(src), "k", Loader(2))['v'].tolist() == [2]
+
+    for e in _index(ar).values():                          # 缓存文件损坏: 当作未命中重新解析
+        (tmp_path / "cache" / e["file"]).write_bytes(b"broken")
+    assert ar.cached_read(str(src), "k", Loader(3))['v'].tolist() == [3]
+    assert ar.invalidate_cache() == 1
+
+def _read_many(ar, paths):
+    for p in paths:
+        ar.cached_read(p, "k", Loader(p))
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="子进程要继承打过补丁的模块")
+def test_concurrent_processes_keep_every_entry(cache, tmp_path):
+    """多个进程同时写索引(趋势模式): 索引文件加锁后各进程的条目都在"""
+    import multiprocessing
+    ar = cache
+    groups = []
+    for g in range(4):
+        paths = []
+        for i in range(15):
+            src = tmp_path / f"{g}_{i}.xlsx"
+            _write(src, f"{g}-{i}".encode(), 10 ** 18)
+            paths.append(str(src))
+        groups.append(paths)
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_read_many, args=(ar, paths)) for paths in groups]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+    assert len(_index(ar)) == 60
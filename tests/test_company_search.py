@@ -0,0 +1,64 @@
+"""CompanySearchIndex 与原来的线性扫描结果一致(前缀命中在前, 再是包含命中, 各自按原顺序), 含逐字输入的细筛"""
+import random
+
+import pytest
+
+ALPHABET = "aaabbcAB -.ßİç中文😀"
+
+def linear_search(names: list[str], q: str) -> tuple[list[int], int]:
+    """原 do_filter 的两次扫描(不含已去掉的 5000 条前缀上限)"""
+    lower = [s.casefold() for s in names]
+    q = q.casefold()
+    starts = [i for i, s in enumerate(lower) if s.startswith(q)]
+    contains = [i for i, s in enumerate(lower) if q in s and not s.startswith(q)]
+    return starts + contains, len(starts)
+
+def _names(rnd: random.Random, n: int) -> list[str]:
+    return ["".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 10))) for _ in range(n)]
+
+def _typing(rnd: random.Random, names: list[str]) -> list[str]:
+    """逐字输入: 取某个名字的前缀或中间一段, 夹杂删字、改大小写、另起查询"""
+    queries = []
+    for _ in range(12):
+        src = rnd.choice(names) or "ab"
+        start = 0 if rnd.random() < 0.5 else rnd.randrange(len(src))
+        text = src[start:start + rnd.randint(1, 6)]
+        if rnd.random() < 0.2:
+            text += rnd.choice(ALPHABET)           # 多半没有命中
+        typed = [text[:k] for k in range(1, len(text) + 1)]
+        if rnd.random() < 0.3:
+            typed += [typed[-1][:-1], typed[-1].upper()]
+        queries += typed + [""]
+    return queries
+
+def _check(ar, names: list[str], queries: list[str]) -> int:
+    index = ar.CompanySearchIndex(names)
+    refined = []
+    split = index._split
+    index._split = lambda q, cand: refined.append(q) or split(q, cand)   # 只有在上次结果里细筛时调用
+    for q in queries:
+        hits, n_prefix = index.search(q)
+        if q:
+            assert (hits.tolist(), n_prefix) == linear_search(names, q), q
+        else:
+            assert hits.tolist() == list(range(len(names))) and n_prefix == len(names)
+    return len(refined)
+
+@pytest.mark.parametrize("seed", range(8))
+def test_matches_linear_scan(ar, seed):
+    rnd = random.Random(seed)
+    names = _names(rnd, rnd.choice((1, 50, 2000)))
+    assert _check(ar, names, _typing(rnd, names)) > 0
+
+def test_refinement_above_and_below_reuse_threshold(ar):
+    """'a' 命中超过 20000 条: 下一个字符要重新查索引; 'ab' 之后命中少了, 在上次结果里细筛"""
+    rnd = random.Random(42)
+    names = _names(rnd, 40000)
+    assert len(linear_search(names, "a")[0]) > 20000 and len(linear_search(names, "b")[0]) > 20000
+    assert len(linear_search(names, "ab")[0]) <= 20000 and len(linear_search(names, "ba")[0]) <= 20000
+    refined = _check(ar, names, ["a", "ab", "abb", "abba", "ab", "abc", "", "b", "bA", "ba "])
+    assert refined == 4        # abb、abba、abc、"ba "; 紧跟 "a"/"b" 的 "ab"/"bA" 重新查索引
+
+def test_empty_and_short_names(ar):
+    names = ["", "a", "A", "ab", "ba", "😀", "ß", "SS", "İ"]
+    _check(ar, names, ["a", "A", "b", "ab", "😀", "ss", "s", "ß", "i", "i̇", "x", "abc"])
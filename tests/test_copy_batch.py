@@ -0,0 +1,113 @@
+"""
+ExcelDuplicator 批量模式: 一份 3 个任务的说明经 run_batch(单进程与多进程)跑完, 检查输出文件内容、
+单个文件失败(找不到/不是工作簿/找不到表/输出重名/覆盖源文件)不影响其它文件, 以及汇总行的计数。
+"""
+import os
+
+import openpyxl
+import pytest
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+def write_book(path: str, rows, red_rows=()) -> None:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    for r, row in enumerate(rows, start=1):
+        ws.append(row)
+        if r in red_rows:
+            ws.cell(row=r, column=1).font = Font(color="FFFF0000")
+    wb.save(path)
+
+def read_rows(path: str, sheet=0) -> list[list]:
+    wb = openpyxl.load_workbook(path)
+    ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+    rows = [list(r) for r in ws.iter_rows(values_only=True)]
+    wb.close()
+    return rows
+
+A_ROWS = [["Name", "Qty", "Code"], ["a", 3, "x"], ["b", 8, "y"], ["a", 3, "x"], ["c", 12, "z"]]
+B_ROWS = [["Name", "Qty", "Code"], ["d", 1, "x"], ["d", 1, "x"], ["e", 6, "y"]]
+
+@pytest.fixture
+def books(tmp_path):
+    src = tmp_path / "in"
+    os.makedirs(src / "sub")
+    write_book(str(src / "a.xlsx"), A_ROWS, red_rows=(3,))
+    write_book(str(src / "sub" / "b.xlsx"), B_ROWS)
+    (src / "broken.xlsx").write_bytes(b"not a zip")
+    write_book(str(src / "~$a.xlsx"), A_ROWS)             # Excel 临时文件, 通配时跳过
+    return src, tmp_path / "out"
+
+def jobs(src, out):
+    return [
+        {"files": [str(src / "**" / "*.xlsx")], "mode": "row", "indices": "3,1", "out_dir": str(out)},
+        {"files": [str(src / "a.xlsx"), str(src / "sub" / "b.xlsx"), str(src / "missing.xlsx")],
+         "mode": "filter", "where": "$2 > 5", "cols": "C,A", "out_dir": str(out)},
+        {"files": [str(src / "a.xlsx"), str(src / "sub" / "b.xlsx")], "mode": "dedupe", "key_cols": "A,B",
+         "report": True, "out_dir": str(out), "name": "{stem}_{mode}_{sheet}.xlsx", "sheet": "Data"},
+        {"files": [str(src / "sub" / "b.xlsx")], "mode": "more", "filter_cols": "1", "out_dir": str(out)},
+        {"files": [str(src / "a.xlsx")], "mode": "red", "filter_cols": "A", "out_dir": str(out),
+         "name": "{stem}_row.xlsx"},
+        {"files": [str(src / "sub" / "b.xlsx")], "mode": "col", "indices": "C", "sheet": "Nope",
+         "out_dir": str(out), "name": "b_nope.xlsx"},
+        {"files": [str(src / "a.xlsx")], "mode": "row", "out_dir": str(src), "name": "a.xlsx"},
+    ]
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_run_batch(ed, books, workers, capsys):
+    src, out = books
+    results = ed.run_batch(jobs(src, out), workers=workers)
+    assert len(results) == 12
+    assert [r["file"] for r in results] == sorted(r["file"] for r in results)
+
+    def result(output_name=None, file=None, error=None):
+        hits = [r for r in results if (output_name is None or r["output"] == str(out / output_name))
+                and (file is None or r["file"] == str(file)) and (error is None or error in (r["error"] or ""))]
+        assert len(hits) == 1, (output_name, file, error, results)
+        return hits[0]
+
+    # row: 按给定顺序复制第 3、1 行; 不是工作簿的文件单独失败
+    assert result("a_row.xlsx")["out_rows"] == 2
+    assert read_rows(str(out / "a_row.xlsx")) == [A_ROWS[2], A_ROWS[0]]
+    assert read_rows(str(out / "b_row.xlsx")) == [B_ROWS[2], B_ROWS[0]]
+    assert result(file=src / "broken.xlsx")["output"] is None
+    assert "BadZipFile" in result(file=src / "broken.xlsx")["error"]
+
+    # filter: 表头 + 满足条件的行, 只取 C、A 两列; 找不到的文件单独失败
+    assert read_rows(str(out / "a_filter.xlsx")) == [["Code", "Name"], ["y", "b"], ["z", "c"]]
+    assert read_rows(str(out / "b_filter.xlsx")) == [["Code", "Name"], ["y", "e"]]
+    assert result("a_filter.xlsx")["rows"] == 5 and result("a_filter.xlsx")["out_rows"] == 3
+    assert "FileNotFoundError" in result(file=src / "missing.xlsx")["error"]
+
+    # dedupe: 按 A、B 列去重并附 Duplicates 表
+    assert read_rows(str(out / "a_dedupe_Data.xlsx")) == [A_ROWS[0], A_ROWS[1], A_ROWS[2], A_ROWS[4]]
+    assert read_rows(str(out / "a_dedupe_Data.xlsx"), "Duplicates") == [["Row", "Kept Row", "Name", "Qty"],
+                                                                      [4, 2, "a", 3]]
+    assert read_rows(str(out / "b_dedupe_Data.xlsx")) == [B_ROWS[0], B_ROWS[1], B_ROWS[3]]
+    assert result("b_dedupe_Data.xlsx")["out_rows"] == 3
+
+    # red: b 没有红字行, 不写出; a 的输出名与 row 任务重名, 不运行
+    red_b = [r for r in results if r["file"] == str(src / "sub" / "b.xlsx") and r["output"] is None
+             and r["error"] is None]
+    assert len(red_b) == 1 and red_b[0]["rows"] == 4 and red_b[0]["out_rows"] == 0
+    assert not os.path.exists(out / "b_red.xlsx")
+    assert "输出文件重名" in result(error="输出文件重名")["error"]
+
+    # 找不到的表; 输出会覆盖源文件
+    assert "找不到工作表" in result(error="找不到工作表")["error"]
+    assert result(error="输出文件与源文件相同")["output"] is None
+    assert read_rows(str(src / "a.xlsx")) == A_ROWS
+    assert not os.path.exists(out / "b_nope.xlsx")
+
+    failed = [r for r in results if r["error"]]
+    assert len(failed) == 5
+    summary = capsys.readouterr().out.strip().splitlines()[-1]
+    assert summary.startswith(f"共 {len(results)} 个文件, 成功 {len(results) - len(failed)}, 失败 {len(failed)}")
+
+def test_invalid_job_stops_whole_batch(ed, books):
+    src, out = books
+    bad = jobs(src, out) + [{"files": [str(src / "a.xlsx")], "mode": "filter", "where": "$2 >"}]
+    with pytest.raises(ValueError):
+        ed.run_batch(bad, workers=1)
+    assert not os.path.exists(out)
@@ -0,0 +1,52 @@
+"""客户编号匹配: 1001 / 1001.0 / '1001' 是同一客户, 带前导零的文字编号('00123')不与 123 合并"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from test_batch import write_customers, write_master
+
+@pytest.mark.parametrize("value, key", [
+    (1001, "1001"), (np.int64(1001), "1001"), (1001.0, "1001"), ("1001", "1001"), (" 1001 ", "1001"),
+    ("1001.00", "1001"), (0, "0"), ("0", "0"), (-5, "-5"), ("-5", "-5"),
+    ("00123", "00123"), ("0123.0", "0123.0"), ("+123", "+123"), (" 007 ", "007"), ("A-01", "A-01"),
+    (12.5, "12.5"), (None, None), (np.nan, None), ("  ", None),
+])
+def test_customer_key(ar, value, key):
+    assert ar.customer_key(value) == key
+
+def test_leading_zero_ids_are_separate_customers(ar, tmp_path):
+    path = str(tmp_path / "customers.xlsx")
+    write_customers(path, [["00123", "Zero", "S1"], [123, "Plain", "S2"], ["123", "Dup", "S3"],
+                           ["0042", "Text", "S4"]])
+    sales = ar.read_default_sales(path)
+    # 123 与 '123' 仍是同一客户, 保留第一次出现; '00123' 不被吞掉
+    assert sales['Name'].tolist() == ["Zero", "Plain", "Text"]
+
+    raw_df = pd.DataFrame({'Customer ID': pd.Series(["00123", 123, 123.0, "123", "0042", 42], dtype=object)})
+    merged = ar.attach_salesman(raw_df, sales)
+    assert merged['Salesman'].tolist() == ["S1", "S2", "S2", "S2", "S4", "Unassigned"]
+
+def test_master_keeps_leading_zero_ids(ar, tmp_path):
+    path = str(tmp_path / "master.xlsx")
+    zeros = [0] * (len(ar.PIVOT_BUCKETS) - 1)
+    write_master(path, [["A", "00123", "x", 1, *zeros], ["A", 123, "y", 2, *zeros]], ar.PIVOT_BUCKETS)
+    assert ar.read_master_raw(path)['Customer ID'].tolist() == ["00123", 123]
+
+    write_master(path, [["A", 1, "x", 1, *zeros], ["A", 2, "y", 2, *zeros]], ar.PIVOT_BUCKETS)
+    assert ar.read_master_raw(path)['Customer ID'].dtype == np.int64
+
+def test_sales_index_is_restored_from_cache(ar, tmp_path, monkeypatch):
+    """缓存命中时查找索引随客户表一起读回, 不再重新排序"""
+    monkeypatch.setattr(ar, "CACHE_ENABLED", True)
+    monkeypatch.setattr(ar, "CACHE_DIR", str(tmp_path / "cache"))
+    path = str(tmp_path / "customers.xlsx")
+    write_customers(path, [[3, "C3", "S3"], ["00123", "Zero", "S1"], [1, "C1", "S2"]])
+    built = []
+    init = ar.SalesIndex.__init__
+    monkeypatch.setattr(ar.SalesIndex, "__init__", lambda self, keys: built.append(1) or init(self, keys))
+
+    raw_df = pd.DataFrame({'Customer ID': pd.Series([1, "00123", 3, 123], dtype=object)})
+    for _ in range(2):
+        sales = ar.read_default_sales(path)
+        assert ar.attach_salesman(raw_df, sales)['Salesman'].tolist() == ["S2", "S1", "S3", "Unassigned"]
+    assert len(built) == 1
@@ -0,0 +1,147 @@
+"""
+去除重复行: find_duplicates / dedupe_rows 与按规范化键分组的字典做法逐行一致
+(比较列 × 保留第一次/最后一次 × 有无表头 × 有无 Duplicates 表, 共 24 种组合),
+XML 里没有的空行按空行参与比较。
+"""
+import itertools
+import random
+from datetime import datetime
+
+import openpyxl
+import pytest
+from openpyxl import Workbook
+
+POOLS = [
+    [1, 1.0, "1", " a", "a", None, True, 2.5],
+    ["x", "x ", "", None, 2, "中文"],
+    [datetime(2025, 3, 1), 3.0, 3, "3", None],
+]
+
+def write_book(path: str, seed: int, n_rows: int = 80) -> None:
+    rnd = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Code", "Name", "When", "Note"])
+    for i in range(n_rows):
+        if rnd.random() < 0.08:
+            ws.append([])                                  # XML 里没有的空行
+            continue
+        row = [rnd.choice(pool) for pool in POOLS] + [f"n{i}" if rnd.random() < 0.3 else None]
+        if rnd.random() < 0.05:
+            row = [None] * 4                               # 有 <row> 但全空
+        ws.append(row)
+    wb.save(path)
+
+def ref_key(values) -> tuple:
+    """字典做法的比较键: 文本去首尾空白, 空文本同空单元格, 1 与 1.0 相同, 布尔与数值、文本与数值不同"""
+    out = []
+    for v in values:
+        if isinstance(v, str):
+            v = ("s", v.strip()) if v.strip() else None
+        elif isinstance(v, bool):
+            v = ("b", v)
+        elif isinstance(v, (int, float)):
+            v = ("n", float(v))
+        out.append(v)
+    while out and out[-1] is None:
+        out.pop()
+    return tuple(out)
+
+def _pick(row, cols):
+    return list(row) if cols is None else [row[c - 1] if c <= len(row) else None for c in cols]
+
+def reference(rows, key_cols, keep, header):
+    """-> (保留的行号, {重复行号: 保留行号})"""
+    groups = {}
+    first = 2 if header else 1
+    for r, row in enumerate(rows[first - 1:], start=first):
+        groups.setdefault(ref_key(_pick(row, key_cols)), []).append(r)
+    owner = {r: (g[0] if keep == "first" else g[-1]) for g in groups.values() for r in g}
+    kept = [1] * header + sorted(r for r, o in owner.items() if r == o)
+    return kept, {r: o for r, o in owner.items() if r != o}
+
+def _trim(values):
+    values = list(values)
+    while values and values[-1] is None:
+        values.pop()
+    return values
+
+@pytest.fixture(scope="module")
+def book(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("dedupe") / "book.xlsx")
+    write_book(path, seed=3)
+    wb = openpyxl.load_workbook(path)
+    rows = [list(r) for r in wb.active.iter_rows(values_only=True)]
+    wb.close()
+    return path, rows
+
+COMBOS = list(itertools.product([None, [2], [3, 1]], ["first", "last"], [True, False], [False, True]))
+
+@pytest.mark.parametrize("key_cols, keep, header, report", COMBOS)
+def test_dedupe_matches_dict_reference(ed, book, tmp_path, key_cols, keep, header, report):
+    path, rows = book
+    kept, owner_of = reference(rows, key_cols, keep, header)
+    assert len(owner_of) > 5
+
+    kept_rows, dup_rows, owner_rows = ed.find_duplicates(path, None, key_cols, keep, header)
+    assert kept_rows.tolist() == kept
+    assert dict(zip(dup_rows.tolist(), owner_rows.tolist())) == owner_of
+    assert dup_rows.tolist() == sorted(owner_of)
+
+    cols = [4, 1] if report else None
+    src = openpyxl.load_workbook(path, read_only=True)
+    stats = {}
+    try:
+        new_wb = ed.dedupe_rows(src.active, path, key_cols, keep, header, cols=cols, report=report, stats=stats)
+    finally:
+        src.close()
+    assert stats == {"rows": len(kept) + len(owner_of), "out_rows": len(kept), "duplicates": len(owner_of)}
+    out = str(tmp_path / "out.xlsx")
+    new_wb.save(out)
+    wb = openpyxl.load_workbook(out)
+    got = [_trim(r) for r in wb.worksheets[0].iter_rows(values_only=True)]
+    assert got == [_trim(_pick(rows[r - 1], cols)) for r in kept]
+    if report:
+        names = _pick(rows[0], key_cols) if header else \
+            [openpyxl.utils.get_column_letter(c) for c in key_cols or []]
+        expected = [["Row", "Kept Row"] + names] + \
+            [[r, o] + _pick(rows[r - 1], key_cols) for r, o in sorted(owner_of.items())]
+        assert [_trim(r) for r in wb["Duplicates"].iter_rows(values_only=True)] == [_trim(r) for r in expected]
+    else:
+        assert len(wb.worksheets) == 1
+    wb.close()
+
+def test_missing_rows_are_blank_rows(ed, tmp_path):
+    path = str(tmp_path / "gaps.xlsx")
+    wb = Workbook()
+    ws = wb.active
+    for row in (["Code"], ["a"], [], ["b"], [], [None], ["a"]):
+        ws.append(row)
+    wb.save(path)
+
+    kept, dups, owners = ed.find_duplicates(path, None)
+    assert kept.tolist() == [1, 2, 3, 4]
+    assert dict(zip(dups.tolist(), owners.tolist())) == {5: 3, 6: 3, 7: 2}
+    kept, dups, owners = ed.find_duplicates(path, None, keep="last")
+    assert kept.tolist() == [1, 4, 6, 7]
+    assert dict(zip(dups.tolist(), owners.tolist())) == {2: 7, 3: 6, 5: 6}
+
+    src = openpyxl.load_workbook(path, read_only=True)
+    new_wb = ed.dedupe_rows(src.active, path)
+    src.close()
+    new_wb.save(str(tmp_path / "out.xlsx"))
+    out = openpyxl.load_workbook(str(tmp_path / "out.xlsx")).active
+    assert [r[0] for r in out.iter_rows(values_only=True)] == ["Code", "a", None, "b"]
+
+def test_dedupe_reads_the_sheet_once_for_copying(ed, book, tmp_path, monkeypatch):
+    path, _ = book
+    scans = []
+    iter_sheet_rows = ed.iter_sheet_rows
+    monkeypatch.setattr(ed, "iter_sheet_rows", lambda *a, **k: scans.append(a) or iter_sheet_rows(*a, **k))
+    src = openpyxl.load_workbook(path, read_only=True)
+    reads = []
+    iter_rows = src.active.iter_rows
+    monkeypatch.setattr(src.active, "iter_rows", lambda *a, **k: reads.append(k) or iter_rows(*a, **k))
+    ed.dedupe_rows(src.active, path, [1], report=True).save(str(tmp_path / "out.xlsx"))
+    src.close()
+    assert len(scans) == 1 and len(reads) == 1
@@ -0,0 +1,54 @@
+"""export_xlsx_multi: 流式写出与 pandas ExcelWriter 写出的内容一致, 写到 .part 再替换目标"""
+import os
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+def _sheets():
+    return {
+        'Pivot': pd.DataFrame({'Salesman': ['S1', 'S2'], 'Current': [1.5, -0.0], 'Total': [1.5, np.inf]}),
+        'Empty': pd.DataFrame(),
+        'Raw': pd.DataFrame({'Customer ID': [1, 'C2', None],
+                             'Due': [datetime(2025, 1, 31, 13, 5), datetime(2024, 2, 29), None],
+                             'Day': [date(2025, 3, 1), None, date(2025, 3, 2)],
+                             'Amount': [12.25, np.nan, 3.0]}),
+    }
+
+def _cells(path):
+    wb = load_workbook(path)
+    try:
+        return {ws.title: (ws.freeze_panes,
+                           # 格式代码在 Excel 里不区分大小写(pandas 会转成大写)
+                           [[(c.value, c.number_format.lower() if isinstance(c.value, (datetime, date)) else None)
+                             for c in row] for row in ws.iter_rows()])
+                for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_export_writes_target_and_removes_part(ar, tmp_path, streaming):
+    path = str(tmp_path / "out.xlsx")
+    ar.export_xlsx_multi(_sheets(), path, streaming=streaming)
+    assert os.listdir(tmp_path) == ["out.xlsx"]
+    cells = _cells(path)
+    assert list(cells) == ['Pivot', 'Empty', 'Raw']
+    assert all(freeze == "A2" for freeze, _ in cells.values())
+
+def test_streaming_matches_pandas_writer(ar, tmp_path):
+    a, b = str(tmp_path / "stream.xlsx"), str(tmp_path / "pandas.xlsx")
+    ar.export_xlsx_multi(_sheets(), a, streaming=True)
+    ar.export_xlsx_multi(_sheets(), b, streaming=False)
+    assert _cells(a) == _cells(b)
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_failed_export_keeps_existing_file(ar, tmp_path, streaming):
+    path = tmp_path / "out.xlsx"
+    path.write_bytes(b"old")
+    with pytest.raises(RuntimeError, match="Failed to save Excel"):
+        ar.export_xlsx_multi({'Pivot': _sheets()['Pivot'], 'Bad/Name': _sheets()['Raw']}, str(path),
+                             streaming=streaming)
+    assert path.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["out.xlsx"]
@@ -0,0 +1,226 @@
+"""
+按条件筛选行: 直接读 XML 的 iter_sheet_rows / scan_columns / CellDecoder 与 openpyxl 读出的值逐格一致,
+RowFilter 编译出的整列运算与逐行的 Python 判断结果一致(优先级、not、带引号的文本、正则、空单元格、数值/文本视图)。
+"""
+import math
+import random
+import re
+import zipfile
+from datetime import datetime
+
+import numpy as np
+import pytest
+from openpyxl import Workbook, load_workbook
+
+TEXTS = ["Acme", "apple", "Apple Pie", " a b ", "中文", 'say "hi"', "x&y<z", "a.c", "12", "", "b", "éclair"]
+
+def _value(rnd: random.Random, kind: str):
+    r = rnd.random()
+    if r < 0.15:
+        return None
+    if kind == "num":
+        return rnd.choice([rnd.randrange(-5, 20), round(rnd.uniform(-10, 30), 2), 5, 5.0, "5", True, "x"])
+    if kind == "text":
+        return rnd.choice(TEXTS + [3, 3.5])
+    if kind == "date":
+        return rnd.choice([datetime(2025, 3, 1), datetime(2024, 12, 31, 8, 30), "2025-03-01 00:00:00", 7])
+    return rnd.choice([1, 0, True, False, "1", 1.0, "a" * rnd.randrange(1, 300)])
+
+def write_book(path: str, seed: int, n_rows: int = 300) -> None:
+    rnd = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Amount", "Name", "Date", "Mixed"])
+    for _ in range(n_rows):
+        if rnd.random() < 0.05:
+            ws.append([])                                  # XML 里没有的空行
+            continue
+        row = [_value(rnd, k) for k in ("num", "text", "date", "mixed")]
+        if rnd.random() < 0.05:
+            row += [None, None, "far"]                     # 超出表头的单元格
+        ws.append(row)
+    wb.save(path)
+
+INLINE_CELL = re.compile(rb'<c ([^>]*?)t="inlineStr"([^>]*)><is><t([^>]*)>(.*?)</t></is></c>', re.S)
+
+def to_shared_strings(path: str) -> None:
+    """openpyxl 写的是行内文本, Excel 写的是共享字符串表: 把文本单元格改成 t="s" 并补上 sharedStrings.xml"""
+    with zipfile.ZipFile(path) as zf:
+        parts = {name: zf.read(name) for name in zf.namelist()}
+    strings = []
+
+    def shared(m):
+        strings.append(b"<si><t%s>%s</t></si>" % (m.group(3), m.group(4)))
+        return b'<c %st="s"%s><v>%d</v></c>' % (m.group(1), m.group(2), len(strings) - 1)
+
+    sheet = "xl/worksheets/sheet1.xml"
+    parts[sheet] = INLINE_CELL.sub(shared, parts[sheet])
+    parts["xl/sharedStrings.xml"] = (
+        b'<?xml version="1.0" encoding="UTF-8"?><sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+        b' count="%d" uniqueCount="%d">%s</sst>' % (len(strings), len(strings), b"".join(strings)))
+    rels = "xl/_rels/workbook.xml.rels"
+    parts[rels] = parts[rels].replace(b"</Relationships>", (
+        b'<Relationship Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"'
+        b' Target="sharedStrings.xml" Id="rIdStrings" /></Relationships>'))
+    parts["[Content_Types].xml"] = parts["[Content_Types].xml"].replace(b"</Types>", (
+        b'<Override PartName="/xl/sharedStrings.xml"'
+        b' ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml" /></Types>'))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in parts.items():
+            zf.writestr(name, data)
+
+def openpyxl_rows(path: str) -> list[list]:
+    wb = load_workbook(path)
+    rows = [list(r) for r in wb.active.iter_rows(values_only=True)]
+    wb.close()
+    return rows
+
+def _trim(values):
+    values = list(values)
+    while values and values[-1] is None:
+        values.pop()
+    return values
+
+@pytest.fixture(scope="module")
+def book(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("filter") / "book.xlsx")
+    write_book(path, seed=7)
+    to_shared_strings(path)
+    return path, openpyxl_rows(path)
+
+# ---------- 直接读 XML ----------
+@pytest.mark.parametrize("shared", [False, True])
+@pytest.mark.parametrize("seed", range(3))
+def test_iter_sheet_rows_matches_openpyxl(ed, tmp_path, seed, shared):
+    path = str(tmp_path / "book.xlsx")
+    write_book(path, seed, n_rows=120)
+    if shared:
+        to_shared_strings(path)
+        with zipfile.ZipFile(path) as zf:
+            assert b"<is>" not in zf.read("xl/worksheets/sheet1.xml")
+    expected = openpyxl_rows(path)
+    got = dict(ed.iter_sheet_rows(path, None))
+    for r, row in enumerate(expected, start=1):
+        assert _trim(got.get(r, [])) == _trim(row), r
+        for g, e in zip(got.get(r, []), row):
+            assert type(g) is type(e), (r, g, e)
+
+    cols = [3, 1, 7, 2]
+    got = dict(ed.iter_sheet_rows(path, "Sheet", cols, min_row=3))
+    assert min(got) >= 3
+    for r, row in enumerate(expected[2:], start=3):
+        want = [row[c - 1] if c <= len(row) else None for c in cols]
+        assert got.get(r, [None] * len(cols)) == want, r
+
+def test_scan_columns_fills_missing_rows(ed, book):
+    path, expected = book
+    data = ed.scan_columns(path, None, [2, 4], min_row=2)
+    assert data.n == len(expected) - 1
+    assert data.values[2] == [row[1] for row in expected[1:]]
+    assert data.values[4] == [row[3] for row in expected[1:]]
+    # 文本视图不按最长的一格定宽
+    assert data.text(4).dtype == object
+    assert data.text(4).tolist() == ["" if row[3] is None else str(row[3]) for row in expected[1:]]
+
+@pytest.fixture(scope="module")
+def decoder(ed, book):
+    with zipfile.ZipFile(book[0]) as zf:
+        return ed.CellDecoder(zf)
+
+@pytest.mark.parametrize("attrs, body, value", [
+    (b'r="A1"', b"<v>42</v>", 42),
+    (b'r="A1" t="n"', b"<v>-1.5E3</v>", -1500.0),
+    (b'r="A1"', b"<v>0.25</v>", 0.25),
+    (b'r="A1"', b"<v></v>", None),
+    (b'r="A1"', None, None),
+    (b'r="A1" t="b"', b"<v>0</v>", False),
+    (b'r="A1" t="b"', b"<v>1</v>", True),
+    (b'r="A1" t="str"', b"<f>A2&amp;B2</f><v>a&amp;b</v>", "a&b"),
+    (b'r="A1" t="e"', b"<f>1/0</f><v>#DIV/0!</v>", "#DIV/0!"),
+    (b'r="A1"', b"<f>1+1</f><v>2</v>", 2),
+    (b'r="A1" t="d"', b"<v>2025-03-01T08:30:00</v>", datetime(2025, 3, 1, 8, 30)),
+    (b'r="A1" t="inlineStr"', b"<is><t>x &lt; y</t></is>", "x < y"),
+    (b'r="A1" t="inlineStr"', b'<is><t xml:space="preserve"> pad </t></is>', " pad "),
+    (b'r="A1" t="inlineStr"', b"<is><r><t>rich</t></r><r><rPr><b/></rPr><t> text</t></r></is>", "rich text"),
+])
+def test_cell_decoder(decoder, attrs, body, value):
+    got = decoder.value(attrs, body)
+    assert got == value and type(got) is type(value)
+
+def test_cell_decoder_shared_strings_and_dates(decoder):
+    assert decoder.value(b't="s"', b"<v>0</v>") == decoder.strings[0]
+    style = min(decoder.date_formats)
+    assert decoder.value(b's="%d"' % style, b"<v>45717</v>") == datetime(2025, 3, 1)
+    assert decoder.value(b's="%d"' % style, b"<v>45717.5</v>") == datetime(2025, 3, 1, 12)
+
+# ---------- 条件 ----------
+def num(v) -> float:
+    return float(v) if type(v) in (int, float) else math.nan
+
+def txt(v) -> str:
+    return "" if v is None else str(v)
+
+CASES = [
+    ("$1 > 10", lambda a, b, c, d: num(a) > 10),
+    ("$1 = 5", lambda a, b, c, d: num(a) == 5),
+    ("$1 == 5", lambda a, b, c, d: num(a) == 5),
+    ("$1 != 5", lambda a, b, c, d: not math.isnan(num(a)) and num(a) != 5),
+    ("not $1 != 5", lambda a, b, c, d: not (not math.isnan(num(a)) and num(a) != 5)),
+    ("$1 <= -1.5e0", lambda a, b, c, d: num(a) <= -1.5),
+    ("$1 between -3 and 7.5", lambda a, b, c, d: -3 <= num(a) <= 7.5),
+    ("$1 in (1, 2, 5)", lambda a, b, c, d: num(a) in (1, 2, 5)),
+    ('$1 = "5"', lambda a, b, c, d: txt(a) == "5"),
+    ('$B startswith "a"', lambda a, b, c, d: txt(b).startswith("a")),
+    ('$b endswith "e"', lambda a, b, c, d: txt(b).endswith("e")),
+    ('$2 contains " "', lambda a, b, c, d: " " in txt(b)),
+    (r'$2 matches "^\d"', lambda a, b, c, d: txt(b)[:1].isdigit()),
+    (r'$2 matches "^a\.c$"', lambda a, b, c, d: txt(b) == "a.c"),
+    ('$2 matches "(?i)^apple"', lambda a, b, c, d: txt(b).lower().startswith("apple")),
+    (r'$2 = "say \"hi\""', lambda a, b, c, d: txt(b) == 'say "hi"'),
+    ("$2 = 'x&y<z'", lambda a, b, c, d: txt(b) == "x&y<z"),
+    ("$2 = 'and'", lambda a, b, c, d: txt(b) == "and"),
+    ('$2 != "Acme"', lambda a, b, c, d: txt(b) != "Acme"),
+    ('$2 < "b"', lambda a, b, c, d: txt(b) < "b"),
+    ('$2 between "A" and "az"', lambda a, b, c, d: "A" <= txt(b) <= "az"),
+    ('$2 in ("Acme", 3, "中文")', lambda a, b, c, d: txt(b) in ("Acme", "中文") or num(b) == 3),
+    ("$2 is empty", lambda a, b, c, d: txt(b) == ""),
+    ("$C is not empty", lambda a, b, c, d: txt(c) != ""),
+    ('$3 = "2025-03-01 00:00:00"', lambda a, b, c, d: txt(c) == "2025-03-01 00:00:00"),
+    ("$4 = 1", lambda a, b, c, d: num(d) == 1),
+    ('$4 = "True"', lambda a, b, c, d: txt(d) == "True"),
+    ('$1 > 10 or $2 = "Acme" and not $3 is empty',
+     lambda a, b, c, d: num(a) > 10 or (txt(b) == "Acme" and txt(c) != "")),
+    ('($1 > 10 or $2 = "Acme") and $3 is not empty',
+     lambda a, b, c, d: (num(a) > 10 or txt(b) == "Acme") and txt(c) != ""),
+    ('not $1 > 10 and $2 startswith "A"', lambda a, b, c, d: not num(a) > 10 and txt(b).startswith("A")),
+    ('not ($1 > 10 and $2 startswith "A")', lambda a, b, c, d: not (num(a) > 10 and txt(b).startswith("A"))),
+    ("not not $1 < 0", lambda a, b, c, d: num(a) < 0),
+    ('NOT $1 >= 3 OR $D IS EMPTY', lambda a, b, c, d: not num(a) >= 3 or txt(d) == ""),
+    ("$1 > 0 and $1 < 10 or $4 = 0 and $2 is empty",
+     lambda a, b, c, d: (0 < num(a) < 10) or (num(d) == 0 and txt(b) == "")),
+]
+
+@pytest.mark.parametrize("where, predicate", CASES, ids=[c[0] for c in CASES])
+def test_filter_matches_python_predicate(ed, book, where, predicate):
+    path, rows = book
+    expected = [1] + [r for r, row in enumerate(rows[1:], start=2) if predicate(*(row + [None] * 4)[:4])]
+    assert ed.filter_rows(path, None, where) == expected
+
+def test_filter_without_header(ed, book):
+    path, rows = book
+    expected = [r for r, row in enumerate(rows, start=1) if txt(row[1]).startswith("A")]
+    assert ed.filter_rows(path, None, '$2 startswith "A"', header=False) == expected
+
+def test_long_cell_does_not_widen_text_view(ed):
+    data = ed.ColumnData({1: ["x" * 100_000] + ["y"] * 999}, 1000)
+    flt = ed.RowFilter('$1 startswith "y" or $1 matches "^x+$"')
+    assert flt.mask(data).all()
+    assert data.text(1).nbytes == 1000 * np.dtype(object).itemsize
+
+@pytest.mark.parametrize("where", [
+    "$1 >", "$1 = 5 and", "$1 startswith 5", '$1 between 1 and "a"', "($1 > 1", "$1 = 1 )",
+    "$0 = 1", "$1 ~ 2", "1 = $1", '$1 in ()', "$1 is blank",
+])
+def test_invalid_conditions(ed, where):
+    with pytest.raises(ValueError):
+        ed.RowFilter(where)
@@ -0,0 +1,187 @@
+"""
+定点数(×10^5 int64)路径与原 Decimal 路径(to_dec5 / sum_dec)的差分测试:
+随机值 + 边界值(None/NaN、数字文本、非法文本、-0.0、.000005 进位、超大数与溢出),
+Pivot / 各小计表 / Raw 逐格比较, 连 -0.0 的符号位也要一致。
+"""
+import random
+from decimal import InvalidOperation, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+import pytest
+
+EDGE_VALUES = [
+    None, np.nan, float("nan"), 0, 0.0, -0.0, "-0", "0.000004", "-0.000004",
+    0.000005, -0.000005, 0.000015, 1.000005, -2.000005, 0.123455, 2.675, 1.005, 1e-9,
+    "123.45", " 12 ", "1e3", "-7.000005", "0.00000500000001",
+    1, -1, 2 ** 53 - 1, 2 ** 53 + 1, 2 ** 62, -(2 ** 62), np.int64(42), np.float32(0.1),
+    1e15 + 0.5, 123456789012.000005,
+]
+# 单个合法但接近 28 位精度上限的值(组合计很容易超限, 单独测)
+HUGE_VALUES = [9.99e22, -9.99e22, 99999999999999999999999, "12345678901234567890.123455", 2 ** 70]
+
+def _random_value(rnd: random.Random):
+    r = rnd.random()
+    if r < 0.15:
+        return rnd.choice(EDGE_VALUES)
+    if r < 0.25:
+        return None
+    if r < 0.75:
+        return round(rnd.uniform(-1e6, 1e7), rnd.choice((0, 2, 5, 6, 7)))
+    if r < 0.85:
+        return rnd.randrange(-10 ** 6, 10 ** 9)
+    if r < 0.95:
+        return f"{rnd.uniform(-1e4, 1e5):.{rnd.choice((2, 5, 6))}f}"
+    return rnd.choice((1, -1)) * rnd.randrange(1, 100) * 10 ** rnd.randrange(5, 18) + rnd.random()
+
+def _frame(ar, n: int, seed: int, values=None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """raw_df(一家公司的数据行) 与 default_sales_df; 桶列是 object/float/int 混合"""
+    rnd = random.Random(seed)
+    ids = [rnd.randrange(1, 40) for _ in range(n)]
+    cols = {
+        'Company': ["Alpha Ltd"] * n,
+        'Customer ID': ids,
+        'Customer Name': [f"Customer {i}" for i in ids],
+    }
+    for j, bucket in enumerate(ar.PIVOT_BUCKETS):
+        if values is not None:
+            col = [values[(i + j) % len(values)] for i in range(n)]
+        elif j == 1:
+            col = [round(rnd.uniform(-1e5, 1e5), 2) for _ in range(n)]     # 纯 float 列
+        elif j == 2:
+            col = [rnd.randrange(-10 ** 9, 10 ** 9) for _ in range(n)]     # 纯 int 列
+        else:
+            col = [_random_value(rnd) for _ in range(n)]
+        cols[bucket] = pd.Series(col, dtype=None if values is None and j in (1, 2) else object)
+    raw_df = pd.DataFrame(cols)
+    sales = pd.DataFrame({'Number': list(range(1, 30)), 'Name': [f"Customer {i}" for i in range(1, 30)],
+                          'Salesman': [f"Sales {i % 4}" for i in range(1, 30)]})
+    return raw_df, sales
+
+def decimal_sheets(ar, raw_df: pd.DataFrame, default_sales_df: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """原实现: 逐格 to_dec5, groupby(...).apply(sum_dec), 逐行 Decimal 求 Total, 再转 float"""
+    merged = ar.attach_salesman(raw_df, default_sales_df)
+    merged = ar.df_to_dec5(merged.astype({b: object for b in ar.PIVOT_BUCKETS}), ar.PIVOT_BUCKETS)
+    gb = merged.groupby('Salesman', dropna=False)
+    pivot = pd.DataFrame({b: gb[b].apply(ar.sum_dec) for b in ar.PIVOT_BUCKETS}).reset_index()
+    pivot['Total'] = pivot[ar.PIVOT_BUCKETS].apply(
+        lambda row: sum(row).quantize(ar.DEC5, rounding=ROUND_HALF_UP), axis=1)
+    for c in ar.PIVOT_BUCKETS + ['Total']:
+        pivot[c] = pivot[c].apply(float)
+    return {'Pivot': pivot, 'Raw': merged}
+
+def _same_floats(got, expected) -> bool:
+    got, expected = np.asarray(got, dtype=np.float64), np.asarray(expected, dtype=np.float64)
+    return bool(np.array_equal(got, expected) and np.array_equal(np.signbit(got), np.signbit(expected)))
+
+def _assert_rollup_exact(ar, table: pd.DataFrame, merged_dec: pd.DataFrame, keys: list[str]):
+    """小计表每一行(明细/Subtotal/Grand Total)都与对应原始行的 Decimal 求和逐位一致"""
+    for _, row in table.iterrows():
+        mask = np.ones(len(merged_dec), dtype=bool)
+        for k in keys:
+            if row[k] in ('Subtotal', 'Grand Total'):
+                break
+            mask &= (merged_dec[k] == row[k]).to_numpy()
+        sums = [ar.sum_dec(merged_dec.loc[mask, b]) for b in ar.PIVOT_BUCKETS]
+        total = sum(sums).quantize(ar.DEC5, rounding=ROUND_HALF_UP)
+        assert _same_floats(row[ar.PIVOT_BUCKETS + ['Total']].to_numpy(dtype=np.float64),
+                            [float(v) for v in sums + [total]]), row.to_dict()
+
+@pytest.mark.parametrize("seed", range(6))
+def test_sheets_match_decimal_path(ar, seed):
+    raw_df, sales = _frame(ar, 400, seed)
+    got = ar.build_company_sheets(raw_df, sales)
+    expected = decimal_sheets(ar, raw_df, sales)
+
+    pivot, ref = got['Pivot'], expected['Pivot']
+    assert pivot['Salesman'].tolist() == ref['Salesman'].tolist()
+    for c in ar.PIVOT_BUCKETS + ['Total']:
+        assert _same_floats(pivot[c], ref[c]), c
+    for b in ar.PIVOT_BUCKETS:
+        assert _same_floats(got['Raw'][b], expected['Raw'][b].apply(float)), b
+    for name, levels in ar.rollup_sheet_levels(got['Raw'].columns, 'Company').items():
+        if levels[0] == ['Company']:
+            assert name not in got          # 只有一家公司: 按公司分层的表跳过
+            continue
+        keys = [k for level in levels for k in level]
+        _assert_rollup_exact(ar, got[name], expected['Raw'], keys)
+
+def test_company_rollup_with_several_companies(ar):
+    raw_df, sales = _frame(ar, 200, 8)
+    raw_df['Company'] = ["Alpha Ltd", "Beta Ltd"] * 100
+    got = ar.build_company_sheets(raw_df, sales)
+    expected = decimal_sheets(ar, raw_df, sales)
+    _assert_rollup_exact(ar, got['By Company'], expected['Raw'], ['Company', 'Salesman'])
+
+def test_edge_values_elementwise(ar):
+    """每个边界值单独换算: 定点整数 = to_dec5 × 10^5, 负零标记 = Decimal 的 -0"""
+    for native in (False, True):
+        for v in EDGE_VALUES + HUGE_VALUES:
+            if native and (v is None or isinstance(v, str)):
+                continue
+            # native: 整列同一类型(float64/int64 列); 否则为 object 列
+            arr = np.array([v, v]) if native else np.array([v, 1.5], dtype=object)
+            k, neg_zero = ar.to_fixed5(arr)
+            q = ar.to_dec5(v)
+            assert int(k[0]) == int(q.scaleb(5)), repr(v)
+            assert bool(neg_zero[0]) == (q.is_signed() and q.is_zero()), repr(v)
+            back = ar.fixed5_to_float(k, neg_zero)[0]
+            assert _same_floats([back], [float(q)]), repr(v)
+
+def test_all_edge_values_in_sheets(ar):
+    raw_df, sales = _frame(ar, len(EDGE_VALUES) * 3, 99, values=EDGE_VALUES)
+    got = ar.build_company_sheets(raw_df, sales)
+    expected = decimal_sheets(ar, raw_df, sales)
+    for c in ar.PIVOT_BUCKETS + ['Total']:
+        assert _same_floats(got['Pivot'][c], expected['Pivot'][c]), c
+    for b in ar.PIVOT_BUCKETS:
+        assert _same_floats(got['Raw'][b], expected['Raw'][b].apply(float)), b
+
+def test_negative_zero_sums(ar):
+    """全是 -0 的组: Decimal 求和从 +0 起算, 结果为 +0.0; Raw 里仍保留 -0.0"""
+    raw_df, sales = _frame(ar, 6, 1, values=[-0.0, "-0", "-0.000004"])
+    got = ar.build_company_sheets(raw_df, sales)
+    expected = decimal_sheets(ar, raw_df, sales)
+    for c in ar.PIVOT_BUCKETS + ['Total']:
+        assert _same_floats(got['Pivot'][c], expected['Pivot'][c]), c
+    assert np.signbit(got['Raw'][ar.PIVOT_BUCKETS[0]]).any()
+
+@pytest.mark.parametrize("bad", ["abc", "1,234", True, "nan?", 1e23, 10 ** 23, "-1e23"])
+def test_invalid_and_out_of_range_values_raise(ar, bad):
+    """非法文本 / 超出 28 位精度的值: 两条路径都抛 InvalidOperation"""
+    with pytest.raises(InvalidOperation):
+        ar.to_dec5(bad)
+    with pytest.raises(InvalidOperation):
+        ar.to_fixed5(np.array([1.0, bad], dtype=object))
+    raw_df, sales = _frame(ar, 5, 2, values=[1.25, bad])
+    with pytest.raises(InvalidOperation):
+        ar.build_company_sheets(raw_df, sales)
+
+def test_int64_overflow_uses_exact_python_ints(ar):
+    """单值在范围内但求和超出 int64: 结果仍与 Decimal 逐位一致"""
+    raw_df, sales = _frame(ar, 8, 3, values=[1.15e20, 4.4e19 + 1, "12345678901234567.123455", -5e19, None])
+    raw_df['Customer ID'] = 1                                 # 全落在同一组, 合计 ×10^5 远超 int64
+    got = ar.build_company_sheets(raw_df, sales)
+    expected = decimal_sheets(ar, raw_df, sales)
+    for c in ar.PIVOT_BUCKETS + ['Total']:
+        assert _same_floats(got['Pivot'][c], expected['Pivot'][c]), c
+
+def test_sum_beyond_decimal_precision_raises(ar):
+    """单值合法但组合计 ≥ 10^23: 原 sum_dec 的 quantize 抛错, 定点路径也抛错"""
+    raw_df, sales = _frame(ar, 4, 4, values=[6e22])
+    raw_df['Customer ID'] = 1
+    with pytest.raises(InvalidOperation):
+        decimal_sheets(ar, raw_df, sales)
+    with pytest.raises(InvalidOperation):
+        ar.build_company_sheets(raw_df, sales)
+
+def test_group_fixed5_matches_sum_dec(ar):
+    rnd = random.Random(7)
+    values = [_random_value(rnd) for _ in range(2000)]
+    k, _ = ar.to_fixed5(np.array(values, dtype=object))
+    groups = np.array([rnd.randrange(5) for _ in values])
+    fixed = pd.DataFrame({'g': groups, 'v': k})
+    out = ar.group_fixed5(fixed, ['g'], ['v'])
+    for g, total in out['v'].items():
+        dec = [ar.to_dec5(v) for v, gg in zip(values, groups) if gg == g]
+        assert int(total) == int(ar.sum_dec(pd.Series(dec, dtype=object)).scaleb(5))
@@ -0,0 +1,130 @@
+"""
+按字体颜色筛选行: scan_font_rows(直接读样式表与工作表 XML)与改动前逐格读 cell.font 的做法对照。
+旧做法只认 rgb 写法的 FF0000, 主题色/索引色/带 tint 的红色只有新做法认得; 其余(rgb 红色、共享样式、
+带样式的空单元格、其它列的红字)两者结果一致。
+"""
+import random
+import zipfile
+import xml.etree.ElementTree as ET
+
+import openpyxl
+import pytest
+from openpyxl import Workbook
+from openpyxl.styles import Font
+from openpyxl.styles.colors import Color
+from openpyxl.writer.theme import theme_xml
+
+def legacy_red_rows(sheet, target_col):
+    """改动前的 find_rows_with_red_font: 整本载入后逐格读字体颜色"""
+    red_rows = []
+    for row in range(1, sheet.max_row + 1):
+        font_color = sheet.cell(row=row, column=target_col).font.color
+        if font_color is None:
+            continue
+        rgb = None
+        if hasattr(font_color, 'rgb') and isinstance(font_color.rgb, str):
+            rgb = font_color.rgb.upper()
+        elif getattr(font_color, 'type', None) == 'rgb' and isinstance(font_color.value, str):
+            rgb = font_color.value.upper()
+        if rgb in ("FF0000", "FFFF0000"):
+            red_rows.append(row)
+    return red_rows
+
+# 主题: accent2(5 号)为纯红, accent6(9 号)为 800000, 调亮 1/3 后正好是 FF0000
+THEME = theme_xml.replace('val="C0504D"', 'val="FF0000"').replace('val="F79646"', 'val="800000"')
+
+# (字体, 是否红色, 旧做法是否认得)
+KINDS = {
+    "rgb": (Font(color="FFFF0000"), True, True),
+    "rgb-bold": (Font(bold=True, size=14, color="FFFF0000"), True, True),
+    "rgb-alpha": (Font(color="00FF0000"), True, False),
+    "dark-red": (Font(color="FFC00000"), False, False),
+    "near-red": (Font(color="FFFE0000"), False, False),
+    "theme-red": (Font(color=Color(theme=5)), True, False),
+    "theme-blue": (Font(color=Color(theme=4)), False, False),
+    "theme-tint-red": (Font(color=Color(theme=9, tint=1 / 3)), True, False),
+    "theme-red-darker": (Font(color=Color(theme=5, tint=-0.25)), False, False),
+    "indexed-red": (Font(color=Color(indexed=2)), True, False),
+    "indexed-red-10": (Font(color=Color(indexed=10)), True, False),
+    "indexed-blue": (Font(color=Color(indexed=4)), False, False),
+    "no-color": (Font(italic=True), False, False),
+    "default": (None, False, False),
+}
+
+def write_book(path: str, seed: int, n_rows: int = 120, n_cols: int = 4):
+    """-> {(行, 列): 样式类别}; 少数行整行不写(XML 里没有), 部分单元格只有样式没有值"""
+    rnd = random.Random(seed)
+    wb = Workbook()
+    wb.loaded_theme = THEME.encode()
+    ws = wb.active
+    kinds = {}
+    for r in range(1, n_rows + 1):
+        if rnd.random() < 0.05:
+            continue
+        for c in range(1, n_cols + 1):
+            if rnd.random() < 0.2:
+                continue                                   # 没有单元格
+            kind = rnd.choice(list(KINDS))
+            cell = ws.cell(row=r, column=c, value=rnd.choice([None, "x", r * c, 1.5]))
+            font = KINDS[kind][0]
+            if font is not None:
+                cell.font = font
+            kinds[r, c] = kind
+    wb.save(path)
+    return kinds
+
+@pytest.mark.parametrize("seed", range(4))
+def test_scan_font_rows_against_legacy(ed, tmp_path, seed):
+    path = str(tmp_path / "red.xlsx")
+    kinds = write_book(path, seed)
+    ws = openpyxl.load_workbook(path).active
+    for col in range(1, 5):
+        red = sorted(r for (r, c), k in kinds.items() if c == col and KINDS[k][1])
+        seen = sorted(r for (r, c), k in kinds.items() if c == col and KINDS[k][2])
+        assert ed.scan_font_rows(path, None, [col]) == red
+        assert legacy_red_rows(ws, col) == seen
+        assert set(seen) < set(red)
+
+    red = {c: {r for (r, cc), k in kinds.items() if cc == c and KINDS[k][1]} for c in (1, 3)}
+    assert ed.scan_font_rows(path, "Sheet", [3, 1]) == sorted(red[1] | red[3])
+    assert ed.scan_font_rows(path, None, [1, 3], require_all=True) == sorted(red[1] & red[3])
+    # 自定义判定: 每个通道与 FF0000 相差不超过 2, 多出 FE0000
+    near = {r for (r, c), k in kinds.items() if c == 2 and (k == "near-red" or KINDS[k][1])}
+    assert ed.scan_font_rows(path, None, [2], ed.rgb_near("FF0000", 2)) == sorted(near)
+
+def test_style_font_colors_shares_one_entry_per_style(ed, tmp_path):
+    path = str(tmp_path / "red.xlsx")
+    kinds = write_book(path, seed=9)
+    with zipfile.ZipFile(path) as zf:
+        _, theme = ed._workbook_parts(zf)
+        colors = ed.style_font_colors(zf, theme)
+        styles = ET.fromstring(zf.read("xl/styles.xml"))
+    xfs = styles.find(ed.MAIN_NS + "cellXfs")
+    assert len(colors) == len(xfs) < len(kinds)             # 同样式的单元格共用 cellXfs 里的一项
+    assert colors[0] == "000000"                          # 默认字体为主题色 1(dk1)
+    assert colors.count("FF0000") == sum(1 for _, red, _ in KINDS.values() if red)
+
+THEME_COLORS = ["FFFFFF", "000000", "EEECE1", "1F497D", "4F81BD", "FF0000"]
+INDEXED = ["00000000", "00FFFFFF", "00FF0000"]
+
+@pytest.mark.parametrize("attrs, rgb", [
+    ({"rgb": "FFFF0000"}, "FF0000"),
+    ({"rgb": "ff0000"}, "FF0000"),
+    ({"rgb": "#00ff00"}, "00FF00"),
+    ({"rgb": "F00"}, None),
+    ({"theme": "5"}, "FF0000"),
+    ({"theme": "1"}, "000000"),
+    ({"theme": "11"}, None),
+    ({"indexed": "2"}, "FF0000"),
+    ({"indexed": "64"}, None),
+    ({"auto": "1"}, None),
+    ({"rgb": "FF800000", "tint": "0.3333333333333333"}, "FF0000"),
+    ({"rgb": "FFFF0000", "tint": "-0.5"}, "800000"),
+    ({"rgb": "FF000000", "tint": "0.5"}, "808080"),
+    ({"theme": "5", "tint": "0"}, "FF0000"),
+])
+def test_resolve_color(ed, attrs, rgb):
+    assert ed.resolve_color(ET.Element("color", attrs), THEME_COLORS, INDEXED) == rgb
+
+def test_resolve_color_missing_element(ed):
+    assert ed.resolve_color(None, THEME_COLORS, INDEXED) is None
@@ -0,0 +1,160 @@
+"""
+增量汇总(IncrementalPivot)与全量重算(build_company_sheets)逐表逐格一致:
+新增/删除/改动/重排/重复行, 表头变化, 客户表变化, 以及状态存盘后再读回。
+"""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from test_batch import write_customers
+
+CUSTOMERS = [[i, f"Customer {i}", f"Sales {i % 3}"] for i in range(1, 12)]
+
+def _write(path: str, header: list, rows: list[list]):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["AR Aging"])
+    ws.append(header)
+    for r in rows:
+        ws.append(r)
+    wb.save(path)
+
+def _rows(ar, n: int, seed: int) -> list[list]:
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        cid = rnd.randrange(1, 15)                        # 12-14 不在客户表里: Unassigned
+        amounts = [rnd.choice([None, 0, -0.0, round(rnd.uniform(-1e4, 1e5), 2), rnd.randrange(1000),
+                               "12.345675"]) for _ in ar.PIVOT_BUCKETS]
+        amounts[0] = round(rnd.uniform(1, 1e4), 5)        # 每行至少一个数字, 都是数据行
+        rows.append([rnd.choice(["Acme", "Beta", "Gamma"]), cid, f"Customer {cid}", *amounts])
+    return rows
+
+def _assert_same_sheets(got: dict, expected: dict):
+    assert list(got) == list(expected)
+    for name in got:
+        x, y = got[name].reset_index(drop=True), expected[name].reset_index(drop=True)
+        assert list(x.columns) == list(y.columns), name
+        assert len(x) == len(y), name
+        for c in x.columns:
+            a, b = x[c].to_numpy(dtype=object), y[c].to_numpy(dtype=object)
+            for i, (u, v) in enumerate(zip(a, b)):
+                if pd.isna(u) and pd.isna(v):
+                    continue
+                assert u == v, (name, c, i, u, v)
+                if isinstance(u, float):
+                    assert np.signbit(u) == np.signbit(v), (name, c, i, u, v)
+
+class Runner:
+    """每次写出新一版总表/客户表, 增量更新后与全量重算逐家公司比对"""
+
+    def __init__(self, ar, tmp_path):
+        self.ar, self.tmp_path, self.n = ar, tmp_path, 0
+        self.state = str(tmp_path / "state.pkl")
+
+    def run(self, header: list, rows: list[list], customers: list[list] = CUSTOMERS, reload: bool = False) -> dict:
+        ar = self.ar
+        self.n += 1
+        master, customer = str(self.tmp_path / f"m{self.n}.xlsx"), str(self.tmp_path / f"c{self.n}.xlsx")
+        _write(master, header, rows)
+        write_customers(customer, customers)
+        master_df, company_col, companies, sales = ar.load_inputs(master, customer)
+
+        if reload or not hasattr(self, "inc"):
+            self.inc = ar.IncrementalPivot(self.state)
+            self.inc.load()
+        stats = self.inc.update(master_df, company_col, sales)
+        self.inc.save()
+
+        groups = dict(tuple(master_df.groupby(ar.company_keys(master_df[company_col]), sort=False, observed=True)))
+        assert sorted(groups) == sorted(companies)
+        for company in companies:
+            expected = ar.build_company_sheets(groups[company], sales, company_col=company_col)
+            _assert_same_sheets(self.inc.company_sheets(company, sales), expected)
+        return stats
+
+@pytest.fixture
+def header(ar):
+    return ["Company", "Customer ID", "Customer Name", *ar.PIVOT_BUCKETS]
+
+@pytest.fixture
+def runner(ar, tmp_path):
+    return Runner(ar, tmp_path)
+
+def test_first_run_is_full_rebuild(ar, runner, header):
+    stats = runner.run(header, _rows(ar, 60, 0))
+    assert stats['mode'] == 'full' and stats['added'] == 60
+
+def test_row_edits(ar, runner, header):
+    rows = _rows(ar, 80, 1)
+    runner.run(header, rows)
+
+    rows = rows + _rows(ar, 10, 2)                                          # 新增
+    stats = runner.run(header, rows)
+    assert (stats['mode'], stats['added'], stats['removed'], stats['unchanged']) == ('incremental', 10, 0, 80)
+
+    del rows[5:20]                                                          # 删除
+    stats = runner.run(header, rows)
+    assert (stats['added'], stats['removed'], stats['unchanged']) == (0, 15, 75)
+
+    rows = [list(r) for r in rows]
+    rows[0][3], rows[7][0], rows[9][1] = 999.99, "Delta", 13                # 改金额/换公司/换客户
+    stats = runner.run(header, rows)
+    assert (stats['added'], stats['removed'], stats['unchanged']) == (3, 3, 72)
+
+    random.Random(3).shuffle(rows)                                          # 重排
+    stats = runner.run(header, rows)
+    assert (stats['added'], stats['removed'], stats['unchanged']) == (0, 0, 75)
+
+def test_duplicated_rows(ar, runner, header):
+    rows = _rows(ar, 30, 4)
+    runner.run(header, rows)
+
+    rows = rows + [rows[0], rows[0], rows[4]]                               # 与已有行完全相同
+    stats = runner.run(header, rows)
+    assert (stats['added'], stats['removed']) == (3, 0)
+
+    del rows[0]                                                             # 三份里去掉一份
+    stats = runner.run(header, rows)
+    assert (stats['added'], stats['removed'], stats['unchanged']) == (0, 1, 32)
+
+def test_removed_company(ar, runner, header):
+    rows = _rows(ar, 40, 5)
+    runner.run(header, rows)
+    stats = runner.run(header, [r for r in rows if r[0] != "Beta"])
+    assert stats['mode'] == 'incremental'
+    assert "Beta" not in runner.inc._row_pos
+
+@pytest.mark.parametrize("change", ["extra_column", "dropped_column", "renamed_bucket_order"])
+def test_header_change_rebuilds(ar, runner, header, change):
+    rows = _rows(ar, 40, 6)
+    runner.run(header, rows)
+    if change == "extra_column":
+        new_header, new_rows = header + ["Region"], [r + ["North"] for r in rows]
+    elif change == "dropped_column":
+        new_header, new_rows = [h for h in header if h != "Customer Name"], [r[:2] + r[3:] for r in rows]
+    else:
+        new_header = header[:3] + header[3:][::-1]
+        new_rows = [r[:3] + r[3:][::-1] for r in rows]
+    stats = runner.run(new_header, new_rows)
+    assert stats['mode'] == 'full' and "表头" in stats['reason']
+
+def test_customer_change_rebuilds(ar, runner, header):
+    rows = _rows(ar, 40, 7)
+    runner.run(header, rows)
+    customers = [[n, name, "Sales 9" if n == 2 else s] for n, name, s in CUSTOMERS] + [[13, "Customer 13", "Sales 1"]]
+    stats = runner.run(header, rows, customers=customers)
+    assert stats['mode'] == 'full' and "客户表" in stats['reason']
+    stats = runner.run(header, rows + _rows(ar, 5, 8), customers=customers)
+    assert stats['mode'] == 'incremental' and stats['added'] == 5
+
+def test_state_reloaded_from_disk(ar, runner, header):
+    rows = _rows(ar, 50, 9)
+    runner.run(header, rows)
+    rows = [list(r) for r in rows[10:]] + _rows(ar, 10, 10)
+    rows[0][4] = -0.0
+    stats = runner.run(header, rows, reload=True)
+    assert (stats['mode'], stats['added'], stats['removed']) == ('incremental', 10 + 1, 10 + 1)
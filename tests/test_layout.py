@@ -0,0 +1,133 @@
+"""
+保留格式: StyleCache 复制出的样式、apply_layout 带上的列宽/行高/合并单元格与源表一致。
+普通工作簿(sheet_layout)与只读 + write-only 流式复制(read_sheet_layout)两条路都查;
+合并区域只在其行列都被选中、在目标里仍连续且同序时保留。
+"""
+import copy
+import random
+
+import openpyxl
+import pytest
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+STYLES = [
+    {"font": Font(color="FFFF0000", bold=True)},
+    {"fill": PatternFill("solid", fgColor="FFDDEEFF")},
+    {"border": Border(left=Side(style="thin"), top=Side(style="double"))},
+    {"alignment": Alignment(horizontal="right", vertical="top")},
+    {"number_format": "#,##0.00"},
+    {"font": Font(italic=True, size=9), "number_format": "yyyy-mm-dd"},
+]
+MERGES = ["A1:C1", "B3:B5", "D2:E3", "A7:B8", "F9:F9"]
+
+def write_book(path: str, seed: int = 0, n_rows: int = 10, n_cols: int = 6) -> None:
+    rnd = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    for r in range(1, n_rows + 1):
+        for c in range(1, n_cols + 1):
+            cell = ws.cell(row=r, column=c, value=rnd.choice([None, r * 10 + c, f"t{r}{c}"]))
+            if rnd.random() < 0.6:
+                for attr, style in rnd.choice(STYLES).items():
+                    setattr(cell, attr, style)
+    for c, width in ((1, 8.5), (2, 20), (4, 13.25), (5, 13.25), (6, 30)):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(c)].width = width
+    for r, height in ((1, 30), (3, 18.75), (4, 40), (8, 9)):
+        ws.row_dimensions[r].height = height
+    for rng in MERGES:
+        ws.merge_cells(rng)
+    wb.save(path)
+
+def expected_merges(row_map, col_map, n_rows=10, n_cols=6):
+    """源合并区域 -> 目标区域: 区域的每行(列)在目标里第一次出现的位置须连续递增"""
+    def span(lo, hi, mapping, n):
+        mapping = list(range(1, n + 1)) if mapping is None else list(mapping)
+        if any(x not in mapping for x in range(lo, hi + 1)):
+            return None
+        pos = [mapping.index(x) + 1 for x in range(lo, hi + 1)]
+        return (pos[0], pos[-1]) if pos == list(range(pos[0], pos[0] + len(pos))) else None
+
+    out = set()
+    for rng in MERGES:
+        min_col, min_row, max_col, max_row = openpyxl.utils.range_boundaries(rng)
+        rows, cols = span(min_row, max_row, row_map, n_rows), span(min_col, max_col, col_map, n_cols)
+        if rows and cols:
+            out.add((rows[0], cols[0], rows[1], cols[1]))
+    return out
+
+def assert_same_style(got, src):
+    for attr in ("font", "fill", "border", "alignment"):      # 单元格上的是 StyleProxy, 取出样式本身再比较
+        assert copy.copy(getattr(got, attr)) == copy.copy(getattr(src, attr)), (attr, got.coordinate)
+    assert got.number_format == src.number_format
+
+def check_copy(ed, out_path, src, layout, row_map, col_map):
+    got = openpyxl.load_workbook(out_path).active
+    rows = list(range(1, src.max_row + 1)) if row_map is None else row_map
+    cols = list(range(1, src.max_column + 1)) if col_map is None else col_map
+    for i, r in enumerate(rows, start=1):
+        for j, c in enumerate(cols, start=1):
+            assert got.cell(i, j).value == src.cell(r, c).value
+            if not isinstance(src.cell(r, c), openpyxl.cell.cell.MergedCell):
+                assert_same_style(got.cell(i, j), src.cell(r, c))
+    out = ed.sheet_layout(got)
+    assert out["widths"] == {j: layout["widths"][c] for j, c in enumerate(cols, start=1) if c in layout["widths"]}
+    assert out["heights"] == {i: layout["heights"][r] for i, r in enumerate(rows, start=1) if r in layout["heights"]}
+    assert set(out["merged"]) == expected_merges(row_map, col_map)
+
+@pytest.fixture
+def book(tmp_path):
+    path = str(tmp_path / "src.xlsx")
+    write_book(path)
+    return path
+
+MAPS = [
+    (None, None),
+    ([1, 2, 3, 4, 5], [1, 2, 3]),
+    ([3, 4, 5, 1], [2, 1, 3]),
+    ([2, 3, 4, 5, 7, 8], [4, 5, 6]),
+    ([5, 4, 3, 8, 7], [6, 5, 4, 2]),
+    ([1, 1, 3, 4, 5], [1, 2, 2, 3]),
+]
+
+def test_read_sheet_layout_matches_openpyxl(ed, book):
+    src = openpyxl.load_workbook(book).active
+    xml, full = ed.read_sheet_layout(book, None), ed.sheet_layout(src)
+    assert xml["widths"] == full["widths"] and xml["heights"] == full["heights"]
+    assert sorted(xml["merged"]) == sorted(full["merged"]) and len(full["merged"]) == len(MERGES)
+
+@pytest.mark.parametrize("row_map, col_map", MAPS)
+def test_style_cache_and_layout_full_workbook(ed, book, tmp_path, row_map, col_map):
+    src = openpyxl.load_workbook(book).active
+    rows = list(range(1, src.max_row + 1)) if row_map is None else row_map
+    cols = list(range(1, src.max_column + 1)) if col_map is None else col_map
+    new_wb = Workbook()
+    new_sheet = new_wb.active
+    styles = ed.StyleCache()
+    for i, r in enumerate(rows, start=1):
+        for j, c in enumerate(cols, start=1):
+            styles.apply(src.cell(r, c), new_sheet.cell(row=i, column=j, value=src.cell(r, c).value))
+    layout = ed.sheet_layout(src)
+    ed.apply_layout(new_sheet, layout, row_map, col_map)
+    # 每种样式组合只登记一次
+    assert len(styles.styles) == len({tuple(src.cell(r, c)._style) for r in rows for c in cols
+                                      if src.cell(r, c).has_style})
+    out = str(tmp_path / "out.xlsx")
+    new_wb.save(out)
+    check_copy(ed, out, src, layout, row_map, col_map)
+
+@pytest.mark.parametrize("row_map, col_map", MAPS)
+def test_style_cache_and_layout_streamed(ed, book, tmp_path, row_map, col_map):
+    src = openpyxl.load_workbook(book).active
+    layout = ed.read_sheet_layout(book, None)
+    wb = openpyxl.load_workbook(book, read_only=True)
+    try:
+        if row_map is None:    # 只选列
+            new_wb = ed.stream_rows_or_cols(wb.active, col_map, "col", True, layout=layout)
+        else:
+            new_wb = ed.stream_rows_or_cols(wb.active, row_map, "row", True, cols=col_map, layout=layout)
+    finally:
+        wb.close()
+    out = str(tmp_path / "out.xlsx")
+    new_wb.save(out)
+    check_copy(ed, out, src, layout, row_map, col_map)
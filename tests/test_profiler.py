@@ -0,0 +1,37 @@
+"""StageProfiler: 嵌套阶段不截断外层的 cProfile, 外层的 tracemalloc 峰值包含内层之前/之中的分配"""
+import json
+import pstats
+import tracemalloc
+
+def outer_work():
+    return sum(range(20000))
+
+def test_nested_stages_keep_outer_numbers(ar, tmp_path):
+    was_tracing = tracemalloc.is_tracing()
+    prof = ar.StageProfiler(enabled=True, cprofile=True)
+    try:
+        with prof.stage("outer"):
+            outer_work()
+            big = bytearray(8 * 1024 * 1024)       # 外层在内层开始前的峰值
+            del big
+            with prof.stage("inner"):
+                small = bytearray(1024 * 1024)
+                del small
+            outer_work()
+        with prof.stage("second"):
+            pass
+        report = json.loads(open(prof.write(str(tmp_path / "out.xlsx")), encoding="utf-8").read())
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    stages = {r["stage"]: r for r in report["stages"]}
+    assert list(stages) == ["outer", "inner", "second"]
+    assert stages["outer"]["tracemalloc_growth_mb"] >= 8
+    assert 1 <= stages["inner"]["tracemalloc_growth_mb"] < 8
+    assert stages["second"]["tracemalloc_growth_mb"] < 1
+
+    # 只有最外层的阶段记 cProfile; 外层的两次 outer_work 都要记到
+    assert report["cprofile"]["stage"] == "outer"
+    calls = {func[2]: stat[1] for func, stat in pstats.Stats(report["cprofile"]["path"]).stats.items()}
+    assert calls["outer_work"] == 2
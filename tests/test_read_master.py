@@ -0,0 +1,121 @@
+"""
+分块读取总表(read_master_raw)与整表一次交给 TextParser 的结果逐格一致(含每格的 Python 类型):
+随机的数字/数字文本/文字/布尔/超大整数/日期混合列, 说明区、空行、合计行、超出表头的单元格。
+"""
+import random
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook, load_workbook
+from pandas.io.parsers import TextParser
+
+def whole_sheet_read(ar, path: str, row_filter=None) -> pd.DataFrame:
+    """改动前的读法: 整表的行先全部转成列表, 一次交给 TextParser, 之后再筛行"""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    ws = wb.worksheets[0]
+    ws.reset_dimensions()
+    data = [ar._convert_row(r) for r in ws.iter_rows(values_only=True)]
+    wb.close()
+    start = next((i for i, v in enumerate(data) if ar._is_header_row(v)), 0)
+    data = data[start:]
+    while data and not any(v != "" for v in data[-1]):
+        data.pop()
+    if not data:
+        return pd.DataFrame()
+    width = max(len(v) for v in data)
+    data = [v + [""] * (width - len(v)) for v in data]
+    df = TextParser(data, header=0, skip_blank_lines=False, dtype={'Customer ID': object}).read()
+    if 'Customer ID' in df.columns:
+        df['Customer ID'] = df['Customer ID'].infer_objects()
+    if row_filter is not None:
+        df = df.loc[row_filter(df)].reset_index(drop=True)
+    return df
+
+def _cell(rnd: random.Random, kind: str):
+    r = rnd.random()
+    if r < 0.1 and kind != "int":
+        return None
+    if kind == "text":
+        return rnd.choice(["Acme", "Beta Ltd", " Gamma ", "公司", "NA", "0042"])
+    if kind == "id":
+        return rnd.choice([rnd.randrange(1, 50), rnd.randrange(1, 50), "00123", "C7", 12.5, "45"])
+    if kind == "int":
+        return rnd.randrange(-1000, 1000)
+    value = rnd.choice([round(rnd.uniform(-1e5, 1e5), 2), rnd.randrange(1000), 0.0, -0.0])
+    if r > 0.97:
+        return {"numstr": "12.345675", "text": "-", "bool": True, "big": 10 ** 20,
+                "date": datetime(2024, 3, 4), "nastr": "N/A"}.get(kind, value)
+    return value
+
+def write_sheet(ar, path: str, seed: int) -> None:
+    rnd = random.Random(seed)
+    kinds = [rnd.choice(["float", "int", "numstr", "text", "bool", "big", "date", "nastr"])
+             for _ in ar.PIVOT_BUCKETS]
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["AR Aging", None, "printed", 2024])
+    ws.append([])
+    ws.append(["Company", "Customer ID", "Customer Name", *ar.PIVOT_BUCKETS, "Remark", None])
+    for _ in range(rnd.randrange(20, 120)):
+        r = rnd.random()
+        if r < 0.05:
+            ws.append([])                                                  # 中间的空行
+        elif r < 0.1:
+            ws.append(["Total", None, None, *[rnd.choice([1.5, 2, "n/a", "Total", True]) for _ in kinds]])
+        else:
+            row = [_cell(rnd, "text"), _cell(rnd, "id"), _cell(rnd, "text"), *[_cell(rnd, k) for k in kinds],
+                   _cell(rnd, "text")]
+            if rnd.random() < 0.03:
+                row += [None, rnd.choice(["stray", 7])]                   # 超出表头的单元格
+            ws.append(row)
+    for _ in range(rnd.randrange(3)):
+        ws.append([])
+    wb.save(path)
+
+def _assert_identical(got: pd.DataFrame, expected: pd.DataFrame):
+    assert list(got.columns) == list(expected.columns)
+    assert got.dtypes.tolist() == expected.dtypes.tolist()
+    for c in got.columns:
+        g, e = got[c].tolist(), expected[c].tolist()
+        assert [type(v) for v in g] == [type(v) for v in e], c
+        assert [None if pd.isna(v) else v for v in g] == [None if pd.isna(v) else v for v in e], c
+
+@pytest.mark.parametrize("chunk_rows", [1, 7, 10 ** 6])
+@pytest.mark.parametrize("seed", range(12))
+def test_chunked_read_matches_whole_sheet(ar, tmp_path, monkeypatch, seed, chunk_rows):
+    path = str(tmp_path / "master.xlsx")
+    write_sheet(ar, path, seed)
+    monkeypatch.setattr(ar, "READ_CHUNK_ROWS", chunk_rows)
+    _assert_identical(ar.read_master_raw(path), whole_sheet_read(ar, path))
+    _assert_identical(ar.read_master_raw(path, row_filter=ar._data_rows_or_all),
+                      whole_sheet_read(ar, path, row_filter=ar._data_rows_or_all))
+
+def test_header_only_and_empty_sheets(ar, tmp_path, monkeypatch):
+    monkeypatch.setattr(ar, "READ_CHUNK_ROWS", 2)
+    path = str(tmp_path / "master.xlsx")
+    wb = Workbook()
+    wb.active.append(["Company", "Customer ID", *ar.PIVOT_BUCKETS])
+    wb.save(path)
+    _assert_identical(ar.read_master_raw(path), whole_sheet_read(ar, path))
+    Workbook().save(path)
+    assert ar.read_master_raw(path).empty and whole_sheet_read(ar, path).empty
+
+@pytest.mark.parametrize("dropped, dtype", [(7, "int64"), (7.5, "float64"), ("Total", "object"), (True, "int64"),
+                                            (None, "float64")])
+def test_dropped_rows_still_decide_dtype(ar, tmp_path, monkeypatch, dropped, dtype):
+    """被筛掉的合计行里的值也参与类型推断: 整数列遇到 7.5 或空格变 float64, 遇到文字变 object"""
+    monkeypatch.setattr(ar, "READ_CHUNK_ROWS", 2)
+    path = str(tmp_path / "master.xlsx")
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Company", "Customer ID", *ar.PIVOT_BUCKETS])
+    zeros = [0] * (len(ar.PIVOT_BUCKETS) - 1)
+    for i in range(5):
+        ws.append(["Acme", i + 1, 10 * i, *zeros])
+    ws.append(["Total", None, dropped, *zeros])
+    ws.append(["Acme", 9, 1, *zeros])
+    wb.save(path)
+    got = ar.read_master_raw(path, row_filter=ar._data_rows_or_all)
+    _assert_identical(got, whole_sheet_read(ar, path, row_filter=ar._data_rows_or_all))
+    assert str(got[ar.PIVOT_BUCKETS[0]].dtype) == dtype and len(got) == 6
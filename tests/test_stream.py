@@ -0,0 +1,91 @@
+"""
+只读流式复制 stream_rows_or_cols 的结果与源表逐格一致(值与格式), 包括 <dimension> 过期(比实际小)的文件。
+"""
+import copy
+import random
+import re
+import zipfile
+from datetime import datetime
+
+import openpyxl
+import pytest
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+STYLES = [
+    {"font": Font(color="FFFF0000")},
+    {"font": Font(bold=True, italic=True)},
+    {"fill": PatternFill("solid", fgColor="FFFFFF00")},
+    {"border": Border(bottom=Side(style="thin"))},
+    {"alignment": Alignment(horizontal="center", wrap_text=True)},
+    {"number_format": "0.00%"},
+]
+
+def write_book(path: str, seed: int, n_rows: int = 40, n_cols: int = 6) -> None:
+    rnd = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    for r in range(1, n_rows + 1):
+        if rnd.random() < 0.08:
+            continue                                       # XML 里没有的空行
+        for c in range(1, rnd.randrange(2, n_cols + 1) + 1):
+            value = rnd.choice([None, rnd.randrange(100), round(rnd.uniform(-5, 5), 3), "text",
+                                "中文", datetime(2025, 1, r % 28 + 1), True])
+            cell = ws.cell(row=r, column=c, value=value)
+            if rnd.random() < 0.3:
+                for attr, style in rnd.choice(STYLES).items():
+                    setattr(cell, attr, style)
+    wb.save(path)
+
+def make_stale(path: str) -> None:
+    """把 <dimension> 改成只有 A1:B2, 按它读的只读表会截掉其余的行和列"""
+    with zipfile.ZipFile(path) as zf:
+        parts = {name: zf.read(name) for name in zf.namelist()}
+    sheet = "xl/worksheets/sheet1.xml"
+    parts[sheet], n = re.subn(rb'<dimension ref="[^"]*"', b'<dimension ref="A1:B2"', parts[sheet])
+    assert n == 1
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in parts.items():
+            zf.writestr(name, data)
+
+def assert_same_cell(got, src, keep_style):
+    assert got.value == src.value, (got.coordinate, src.coordinate)
+    if keep_style:
+        for attr in ("font", "fill", "border", "alignment"):    # 单元格上的是 StyleProxy, 取出样式本身再比较
+            assert copy.copy(getattr(got, attr)) == copy.copy(getattr(src, attr)), (attr, got.coordinate)
+        assert got.number_format == src.number_format
+
+CASES = [
+    (None, "row"), ([1, 5, 6, 20, 40], "row"), ([7, 1, 30, 7, 3, 55], "row"),
+    (None, "col"), ([3, 1, 6], "col"), ([2, 9, 2], "col"),
+]
+
+@pytest.mark.parametrize("stale", [False, True])
+@pytest.mark.parametrize("keep_style", [False, True])
+@pytest.mark.parametrize("indices, mode", CASES)
+def test_stream_copy_matches_source(ed, tmp_path, indices, mode, keep_style, stale):
+    path = str(tmp_path / "src.xlsx")
+    write_book(path, seed=len(str(indices)) + (mode == "col"))
+    if stale:
+        make_stale(path)
+    src = openpyxl.load_workbook(path).active
+    n_rows, n_cols = src.max_row, src.max_column
+    assert n_rows > 30 and n_cols > 4
+
+    wb = openpyxl.load_workbook(path, read_only=True)
+    stats = {}
+    try:
+        new_wb = ed.stream_rows_or_cols(wb.active, indices, mode, keep_style, stats=stats)
+    finally:
+        wb.close()
+    out = str(tmp_path / "out.xlsx")
+    new_wb.save(out)
+    got = openpyxl.load_workbook(out).active
+
+    rows = indices if mode == "row" and indices is not None else range(1, n_rows + 1)
+    cols = indices if mode == "col" and indices is not None else range(1, n_cols + 1)
+    assert stats["out_rows"] == len(rows)
+    assert got.max_row <= len(rows) and got.max_column <= len(cols)
+    for i, r in enumerate(rows, start=1):
+        for j, c in enumerate(cols, start=1):
+            assert_same_cell(got.cell(i, j), src.cell(r, c), keep_style)